@@ -4,21 +4,36 @@ import warnings
 warnings.filterwarnings("ignore", message=".*EXPERIMENTAL.*InMemoryCredentialService.*")
 warnings.filterwarnings("ignore", message=".*EXPERIMENTAL.*BaseCredentialService.*")
 
+import yaml
 from google.adk.agents import SequentialAgent
 from .agents.script_agent import script_agent
 from .agents.tts_agent import tts_agent
 from .agents.jsonize_agent import jsonize_agent
 from .agents.spatial_plan_agent import spatial_plan_agent
 from .agents.asmr_agent import asmr_agent
+from .checkpoint import with_checkpoint
+from .telemetry import with_run_telemetry, with_telemetry
 
-root_agent = SequentialAgent(
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+sub_agents = [
+    script_agent,
+    tts_agent,
+    jsonize_agent,
+    spatial_plan_agent,
+    asmr_agent,
+]
+
+# 各ステージの出力を入力ハッシュごとの実行ディレクトリに保存し、失敗したステージから再開できるようにする
+if config.get("checkpoint", {}).get("enabled", True):
+    sub_agents = [with_checkpoint(agent) for agent in sub_agents]
+
+# ステージ毎の処理時間・LLMトークン数を計測し、run 終了時に書き出す
+sub_agents = [with_telemetry(agent) for agent in sub_agents]
+
+root_agent = with_run_telemetry(SequentialAgent(
     name="asmr_gen_seq",
     description="Generate a full ASMR experience from a situation.",
-    sub_agents=[
-        script_agent,
-        tts_agent,
-        jsonize_agent,
-        spatial_plan_agent,
-        asmr_agent,
-    ],
-)
+    sub_agents=sub_agents,
+))
@@ -1,16 +1,42 @@
 import os
 import re
+from typing import Optional
+
 import yaml
 from google.adk.agents import LlmAgent
+from google.adk.agents.callback_context import CallbackContext
 from google.adk.agents.readonly_context import ReadonlyContext
 from google.adk.utils.instructions_utils import inject_session_state
+from google.genai import types
 from ..tools.binaural_renderer import BinauralRenderer
+from ..tools.render_pool import BinauralRendererAsync
 
 # Load configuration
 with open("config.yaml", "r") as f:
     config = yaml.safe_load(f)
 
 ASMR_AGENT_MODEL = config["models"]["asmr_agent"]
+BINAURAL_OUTPUT_DIR = "asmr_gen_adk/output/binaural_audio"
+# Offloading keeps the event loop responsive for other sessions while rendering
+RENDER_TOOL = BinauralRendererAsync if config.get("render", {}).get("offload", True) else BinauralRenderer
+
+def clean_spatial_plan_json(spatial_plan_json: str) -> str:
+    """Removes markdown formatting around the spatial plan JSON."""
+    # Use regex to find the JSON block, allowing for surrounding text/whitespace
+    match = re.search(r'```(json)?\s*([\s\S]*?)\s*```', spatial_plan_json)
+    if match:
+        return match.group(2).strip()
+    return spatial_plan_json
+
+def binaural_output_path_for(wav_path: str) -> str:
+    """Defines the output path for the final binaural audio."""
+    return os.path.join(BINAURAL_OUTPUT_DIR, f"binaural_{os.path.basename(wav_path)}")
+
+def _defer_render(callback_context: CallbackContext) -> Optional[types.Content]:
+    """Skips in-process rendering when the caller (e.g. the job server) renders elsewhere."""
+    if not callback_context.state.get("defer_render"):
+        return None
+    return types.Content(role="model", parts=[types.Part(text="Rendering deferred.")])
 
 async def _build_instruction(readonly_ctx: ReadonlyContext) -> str:
     """Constructs the prompt for the ASMR agent."""
@@ -18,16 +44,9 @@ async def _build_instruction(readonly_ctx: ReadonlyContext) -> str:
     spatial_plan_json = await inject_session_state("{spatial_plan_json}", readonly_ctx)
 
     # Clean up the spatial plan JSON by removing markdown formatting
-    # Use regex to find the JSON block, allowing for surrounding text/whitespace
-    match = re.search(r'```(json)?\s*([\s\S]*?)\s*```', spatial_plan_json)
-    if match:
-        spatial_plan_json = match.group(2).strip()
-
+    spatial_plan_json = clean_spatial_plan_json(spatial_plan_json)
 
-    # Define the output path for the final binaural audio
-    output_dir = "asmr_gen_adk/output/binaural_audio"
-    base_name = os.path.basename(wav_path)
-    binaural_output_path = os.path.join(output_dir, f"binaural_{base_name}")
+    binaural_output_path = binaural_output_path_for(wav_path)
 
     return f"""You are the final audio processing engineer. Your task is to render the binaural ASMR audio using the provided mono audio file and the spatial plan.
 
@@ -35,7 +54,7 @@ async def _build_instruction(readonly_ctx: ReadonlyContext) -> str:
 2. **Spatial Plan JSON:** `{spatial_plan_json}`
 3. **Output Path:** `{binaural_output_path}`
 
-Use the `BinauralRenderer` tool to perform the rendering. Call the tool with: `BinauralRenderer(mono_audio_path='{wav_path}', spatial_plan_json='''{spatial_plan_json}''', output_path='{binaural_output_path}')`
+Use the `{RENDER_TOOL.__name__}` tool to perform the rendering. Call the tool with: `{RENDER_TOOL.__name__}(mono_audio_path='{wav_path}', spatial_plan_json='''{spatial_plan_json}''', output_path='{binaural_output_path}')`
 
 Upon completion, output only the path to the final binaural audio file.
 """
@@ -45,6 +64,7 @@ asmr_agent = LlmAgent(
     model=ASMR_AGENT_MODEL,
     description="Renders a mono audio file into a binaural ASMR WAV file.",
     instruction=_build_instruction,
-    tools=[BinauralRenderer],
+    tools=[RENDER_TOOL],
+    before_agent_callback=_defer_render,
     output_key="binaural_output_path",
 )
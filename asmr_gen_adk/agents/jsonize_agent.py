@@ -1,11 +1,40 @@
+import logging
+import os
+from typing import Optional
+
 import yaml
 from google.adk.agents import LlmAgent
+from google.adk.agents.callback_context import CallbackContext
 from google.adk.agents.readonly_context import ReadonlyContext
 from google.adk.utils.instructions_utils import inject_session_state
+from google.genai import types
+from ..checkpoint import extract_audio_path
+from ..tools.audio_align import align_script_to_wav
 
 with open("config.yaml", "r") as f:
     config = yaml.safe_load(f)
 
+def _local_alignment(callback_context: CallbackContext) -> Optional[types.Content]:
+    """
+    Fast path: aligns the script to the TTS audio locally with energy-based pause detection.
+    Returns None (falling back to the LLM) when the alignment is ambiguous.
+    """
+    if not config.get("alignment", {}).get("local_fast_path", True):
+        return None
+    script_text = callback_context.state.get("script_text")
+    wav_path = extract_audio_path(callback_context.state.get("wav_path"))
+    if not script_text or not wav_path or not os.path.exists(wav_path):
+        return None
+    try:
+        timed_script_json = align_script_to_wav(wav_path, script_text)
+    except Exception as e:
+        logging.warning(f"Local alignment failed, falling back to LLM: {e}")
+        return None
+    if timed_script_json is None:
+        return None
+    callback_context.state["timed_script_json"] = timed_script_json
+    return types.Content(role="model", parts=[types.Part(text=timed_script_json)])
+
 async def _build_instruction(readonly_ctx: ReadonlyContext) -> str:
     """Constructs the prompt for the Jsonize agent."""
     script_text = await inject_session_state("{script_text}", readonly_ctx)
@@ -58,5 +87,6 @@ jsonize_agent = LlmAgent(
     model=config["models"]["jsonize_agent"], # Requires a multi-modal model
     description="Creates a timed, structured JSON script from text and audio.",
     instruction=_build_instruction,
+    before_agent_callback=_local_alignment,
     output_key="timed_script_json",
 )
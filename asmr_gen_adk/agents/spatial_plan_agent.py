@@ -1,12 +1,38 @@
 import json
+import logging
+from typing import Optional
+
 import yaml
 from google.adk.agents import LlmAgent
+from google.adk.agents.callback_context import CallbackContext
 from google.adk.agents.readonly_context import ReadonlyContext
 from google.adk.utils.instructions_utils import inject_session_state
+from google.genai import types
+from ..tools.spatial_planner import build_spatial_plan_json
 
 with open("config.yaml", "r") as f:
     config = yaml.safe_load(f)
 
+def _procedural_plan(callback_context: CallbackContext) -> Optional[types.Content]:
+    """
+    Fast path: builds the keyframes deterministically from the script's bracketed cues.
+    Returns None (falling back to the LLM) when the script carries no spatial cues.
+    """
+    if not config.get("spatial_plan", {}).get("procedural_fast_path", True):
+        return None
+    timed_script_json = callback_context.state.get("timed_script_json")
+    if not timed_script_json:
+        return None
+    try:
+        spatial_plan_json = build_spatial_plan_json(timed_script_json)
+    except (ValueError, TypeError, AttributeError) as e:
+        logging.warning(f"Procedural spatial planning failed, falling back to LLM: {e}")
+        return None
+    if spatial_plan_json is None:
+        return None
+    callback_context.state["spatial_plan_json"] = spatial_plan_json
+    return types.Content(role="model", parts=[types.Part(text=spatial_plan_json)])
+
 async def _build_instruction(readonly_ctx: ReadonlyContext) -> str:
     """Constructs the prompt for the spatial plan agent."""
     script_json = await inject_session_state("{timed_script_json}", readonly_ctx)
@@ -45,5 +71,6 @@ spatial_plan_agent = LlmAgent(
     model=config["models"]["spatial_plan_agent"],
     description="Creates a spatial audio plan from a script and audio file.",
     instruction=_build_instruction,
+    before_agent_callback=_procedural_plan,
     output_key="spatial_plan_json",
 )
\ No newline at end of file
@@ -0,0 +1,385 @@
+"""
+レンダリングエンジンのベンチマーク
+
+3つのレンダリング実装を、音声の長さ × 入力サンプルレート × 空間プランの密度 の組み合わせで実行し、
+処理時間（wall）、リアルタイムファクター（RTF = 処理秒数 / 音声秒数）、ピークメモリを計測する。
+
+- binaural_renderer: render_file（make_asmr_audio + 読み書き）
+- asmr_spatialize:   asmr_spatialize.process
+- wav_to_asmr:       wav_to_asmr.process_wav_to_asmr
+
+ピークメモリを正しく測るため、各ケースは新しいプロセス（spawn）で実行する。
+結果はベースライン（JSON）と比較し、処理時間またはピークメモリが閾値を超えて悪化したケースを報告する。
+
+使い方:
+    python -m asmr_gen_adk.benchmark --quick
+    python -m asmr_gen_adk.benchmark --engines binaural_renderer --durations 10 600 --update-baseline
+    python -m asmr_gen_adk.benchmark --compare-native --durations 60 --sample-rates 24000
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import soundfile as sf
+import yaml
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_benchmark_config = config.get("benchmark", {})
+BASELINE_PATH = _benchmark_config.get("baseline_path", "benchmarks/baseline.json")
+RESULTS_DIR = _benchmark_config.get("results_dir", "asmr_gen_adk/output/benchmarks")
+REGRESSION_THRESHOLD = _benchmark_config.get("regression_threshold", 0.2)
+
+ENGINES = ["binaural_renderer", "asmr_spatialize", "wav_to_asmr"]
+DURATIONS = [10, 60, 600, 3600]  # 10秒〜60分
+SAMPLE_RATES = [24000, 48000]
+DENSITIES = ["static", "slow_sweep", "dense"]
+HRTF_SOURCES = ["default", "synthetic", "dummy"]
+# 悪化を判定する指標
+COMPARED_METRICS = ["wall_sec", "peak_rss_bytes"]
+
+
+@dataclass
+class BenchmarkCase:
+    engine: str
+    duration_sec: float
+    sample_rate: int
+    density: str
+
+    @property
+    def case_id(self) -> str:
+        return f"{self.engine}/{self.duration_sec:g}s/{self.sample_rate}Hz/{self.density}"
+
+
+def build_matrix(engines=None, durations=None, sample_rates=None, densities=None) -> List[BenchmarkCase]:
+    return [
+        BenchmarkCase(engine, float(duration), int(sr), density)
+        for engine, duration, sr, density in itertools.product(
+            engines or ENGINES, durations or DURATIONS, sample_rates or SAMPLE_RATES, densities or DENSITIES
+        )
+    ]
+
+
+# --- 入力の生成 ---
+
+def make_plan(density: str, duration_sec: float) -> List[Dict[str, Any]]:
+    """
+    static: キーフレーム1つ（移動なし）
+    slow_sweep: 10秒毎に左右へゆっくり往復（3°/s）
+    dense: 0.25秒毎にランダムなキーフレーム（固定シードで再現可能）
+    """
+    if density == "static":
+        return [{"time": 0.0, "azimuth": 30, "elevation": 0, "distance": 0.2, "reverb_mix": 0.02}]
+    if density == "slow_sweep":
+        times = np.arange(0.0, duration_sec + 10.0, 10.0)
+        azimuths = np.where(np.arange(len(times)) % 2 == 0, -15.0, 15.0)
+        return [
+            {"time": float(t), "azimuth": float(a), "elevation": 0, "distance": 0.2, "reverb_mix": 0.02}
+            for t, a in zip(times, azimuths)
+        ]
+    if density == "dense":
+        rng = np.random.default_rng(0)
+        times = np.arange(0.0, duration_sec + 0.25, 0.25)
+        return [
+            {
+                "time": float(t),
+                "azimuth": float(rng.uniform(-90, 90)),
+                "elevation": 0,
+                "distance": float(rng.uniform(0.1, 0.3)),
+                "reverb_mix": float(rng.uniform(0.0, 0.03)),
+            }
+            for t in times
+        ]
+    raise ValueError(f"Unknown plan density: {density}")
+
+
+def write_test_signal(path: str, duration_sec: float, sample_rate: int, chunk_sec: float = 60.0) -> None:
+    """音節程度の周期で振幅変調したノイズ（無音区間あり）を、長尺でもメモリを使わないよう分割して書き出す。"""
+    rng = np.random.default_rng(0)
+    total = int(round(duration_sec * sample_rate))
+    chunk = int(chunk_sec * sample_rate)
+    with sf.SoundFile(path, "w", samplerate=sample_rate, channels=1, subtype="PCM_16") as f:
+        for start in range(0, total, chunk):
+            n = min(chunk, total - start)
+            t = (start + np.arange(n)) / sample_rate
+            envelope = np.clip(np.sin(2 * np.pi * 4.0 * t), 0.0, None) * (np.sin(2 * np.pi * 0.2 * t) > -0.5)
+            f.write((rng.uniform(-0.2, 0.2, n) * envelope).astype(np.float32))
+
+
+# --- 各ケースの実行（子プロセス） ---
+
+def _use_hrtf_source(source: str) -> None:
+    """HRTFの読み込み元を切り替える。"synthetic"（球頭モデル）や "dummy" ならネットワークなしで実行できる。"""
+    from .tools import binaural_renderer
+
+    binaural_renderer.HRTF_SOURCE = source
+
+
+def _load_engine(engine: str) -> Callable[[str, str, str], Any]:
+    """(input_wav, plan_path, output_wav) を受け取る実行関数を返す。import のコストは計測に含めない。"""
+    if engine == "binaural_renderer":
+        from .tools.binaural_renderer import render_file
+
+        def run(input_wav, plan_path, output_wav):
+            with open(plan_path, "r", encoding="utf-8") as f:
+                return render_file(input_wav, f.read(), output_wav)
+        return run
+    if engine == "asmr_spatialize":
+        from .tools.asmr_spatialize import process
+
+        return process
+    if engine == "wav_to_asmr":
+        from .tools.wav_to_asmr import process_wav_to_asmr
+
+        return lambda input_wav, plan_path, output_wav: process_wav_to_asmr(input_wav, output_wav, plan_path)
+    raise ValueError(f"Unknown engine: {engine}")
+
+
+def _case_worker(engine, input_wav, plan_path, output_wav, hrtf_source, conn) -> None:
+    from .telemetry import peak_rss_bytes
+
+    try:
+        run = _load_engine(engine)
+        if hrtf_source:
+            _use_hrtf_source(hrtf_source)
+        rss_before = peak_rss_bytes()
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        run(input_wav, plan_path, output_wav)
+        conn.send({
+            "status": "ok",
+            "wall_sec": time.perf_counter() - start,
+            "cpu_sec": time.process_time() - cpu_start,
+            "peak_rss_bytes": peak_rss_bytes(),
+            "rss_growth_bytes": peak_rss_bytes() - rss_before,
+        })
+    except Exception as e:
+        conn.send({"status": "error", "error": f"{type(e).__name__}: {e}"})
+    finally:
+        conn.close()
+
+
+def run_case(case: BenchmarkCase, workdir: str, hrtf_source: Optional[str] = None) -> Dict[str, Any]:
+    """1ケースを新しいプロセスで実行し、計測結果を返す。入力WAVは workdir 内で使い回す。"""
+    input_wav = os.path.join(workdir, f"input_{case.duration_sec:g}s_{case.sample_rate}.wav")
+    if not os.path.exists(input_wav):
+        write_test_signal(input_wav, case.duration_sec, case.sample_rate)
+    plan_path = os.path.join(workdir, f"plan_{case.density}_{case.duration_sec:g}s.json")
+    if not os.path.exists(plan_path):
+        with open(plan_path, "w", encoding="utf-8") as f:
+            json.dump(make_plan(case.density, case.duration_sec), f)
+    output_wav = os.path.join(workdir, "output.wav")
+
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(
+        target=_case_worker, args=(case.engine, input_wav, plan_path, output_wav, hrtf_source, child_conn)
+    )
+    process.start()
+    child_conn.close()
+    try:
+        measured = parent_conn.recv()
+    except EOFError:
+        measured = {"status": "error", "error": "Benchmark process exited unexpectedly."}
+    process.join()
+    if process.exitcode != 0 and measured["status"] == "ok":
+        measured = {"status": "error", "error": f"Benchmark process exited with code {process.exitcode}."}
+
+    result = {"case_id": case.case_id, **asdict(case), **measured}
+    if measured["status"] == "ok":
+        result["real_time_factor"] = measured["wall_sec"] / case.duration_sec
+    if os.path.exists(output_wav):
+        os.remove(output_wav)
+    return result
+
+
+# --- ベースラインとの比較 ---
+
+def load_baseline(path: str = None) -> Dict[str, Dict[str, Any]]:
+    path = path or BASELINE_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("cases", {})
+
+
+def save_baseline(results: List[Dict[str, Any]], path: str = None) -> None:
+    """成功したケースをベースラインとして保存する（既存の他ケースは残す）。"""
+    path = path or BASELINE_PATH
+    cases = load_baseline(path)
+    for result in results:
+        if result["status"] == "ok":
+            cases[result["case_id"]] = {metric: result[metric] for metric in COMPARED_METRICS + ["real_time_factor"]}
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"host": platform.node(), "python": platform.python_version(), "cases": cases}, f, indent=2, sort_keys=True)
+
+
+def find_regressions(results: List[Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+                     threshold: float = None) -> List[Dict[str, Any]]:
+    """ベースラインより threshold（割合）を超えて悪化した指標を列挙する。"""
+    threshold = REGRESSION_THRESHOLD if threshold is None else threshold
+    regressions = []
+    for result in results:
+        base = baseline.get(result["case_id"])
+        if result["status"] != "ok" or not base:
+            continue
+        for metric in COMPARED_METRICS:
+            if not base.get(metric):
+                continue
+            ratio = result[metric] / base[metric]
+            if ratio > 1.0 + threshold:
+                regressions.append({
+                    "case_id": result["case_id"], "metric": metric,
+                    "baseline": base[metric], "current": result[metric], "ratio": ratio,
+                })
+    return regressions
+
+
+def format_report(results: List[Dict[str, Any]], regressions: List[Dict[str, Any]]) -> str:
+    lines = [f"{'case':<48} {'wall[s]':>9} {'RTF':>8} {'peak RSS[MiB]':>14}"]
+    for r in results:
+        if r["status"] == "ok":
+            lines.append(
+                f"{r['case_id']:<48} {r['wall_sec']:>9.2f} {r['real_time_factor']:>8.4f} "
+                f"{r['peak_rss_bytes'] / 2**20:>14.1f}"
+            )
+        else:
+            lines.append(f"{r['case_id']:<48} ERROR {r['error']}")
+    for g in regressions:
+        lines.append(
+            f"REGRESSION {g['case_id']} {g['metric']}: {g['baseline']:.4g} -> {g['current']:.4g} (x{g['ratio']:.2f})"
+        )
+    return "\n".join(lines)
+
+
+# --- ネイティブレートとの比較 ---
+
+def _log_spectral_distance(reference: np.ndarray, test: np.ndarray, sample_rate: int,
+                           band=(100.0, 10000.0), n_fft: int = 2048) -> float:
+    """2つのステレオ信号の対数スペクトル距離 [dB]（band 内、フレームごとのRMSの平均）。"""
+    from scipy.signal import stft
+
+    _, _, ref = stft(reference.T, sample_rate, nperseg=n_fft)
+    _, _, out = stft(test.T, sample_rate, nperseg=n_fft)
+    freqs = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    in_band = (freqs >= band[0]) & (freqs <= band[1])
+    ref_db = 20 * np.log10(np.abs(ref[:, in_band]) + 1e-9)
+    out_db = 20 * np.log10(np.abs(out[:, in_band]) + 1e-9)
+    # 無音のフレームは比べない
+    active = np.max(ref_db, axis=1) > np.max(ref_db) - 60
+    return float(np.mean(np.sqrt(np.mean((ref_db - out_db) ** 2, axis=1))[active]))
+
+
+def compare_native_rate(duration_sec: float = 60.0, sample_rate: int = 24000, density: str = "slow_sweep",
+                        hrtf_source: Optional[str] = None, repeats: int = 3) -> Dict[str, Any]:
+    """
+    TTSと同じ低いレートの入力を、現在の経路（入力を TARGET_FS に変換してレンダリング）と
+    ネイティブレート（HRTFを入力のレートに変換してレンダリングし、出力だけを TARGET_FS に変換）で
+    レンダリングし、処理時間と音質の差を返す。音質は現在の経路の出力を基準にした
+    SNR と対数スペクトル距離（100Hz〜10kHz）。HRTFの読み込み・変換は計測に含めない。
+    """
+    from .tools import binaural_renderer
+
+    if hrtf_source:
+        _use_hrtf_source(hrtf_source)
+    with tempfile.TemporaryDirectory() as tmp:
+        input_wav = os.path.join(tmp, "input.wav")
+        write_test_signal(input_wav, duration_sec, sample_rate)
+        audio, _ = sf.read(input_wav)
+    plan = make_plan(density, duration_sec)
+
+    outputs, wall = {}, {}
+    for name, native in (("resample_input", False), ("native_rate", True)):
+        # 1回目でHRTFを読み込む（変換結果はキャッシュされる）
+        binaural_renderer.make_asmr_audio(audio[:sample_rate], sample_rate, plan, normalize=False, native_rate=native)
+        times = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            outputs[name], output_fs = binaural_renderer.make_asmr_audio(audio, sample_rate, plan, normalize=False,
+                                                                         native_rate=native)
+            times.append(time.perf_counter() - start)
+        wall[name] = min(times)
+
+    reference, native_output = outputs["resample_input"], outputs["native_rate"]
+    n = min(len(reference), len(native_output))
+    reference, native_output = reference[:n], native_output[:n]
+    error = native_output - reference
+    return {
+        "duration_sec": duration_sec,
+        "input_sample_rate": sample_rate,
+        "output_sample_rate": output_fs,
+        "resample_input_wall_sec": wall["resample_input"],
+        "native_rate_wall_sec": wall["native_rate"],
+        "speedup": wall["resample_input"] / wall["native_rate"],
+        "snr_db": float(10 * np.log10(np.sum(reference ** 2) / max(np.sum(error ** 2), 1e-30))),
+        "log_spectral_distance_db": _log_spectral_distance(reference, native_output, output_fs),
+    }
+
+
+def run_benchmarks(cases: List[BenchmarkCase], hrtf_source: Optional[str] = None,
+                   workdir: Optional[str] = None) -> List[Dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for case in cases:
+            logging.info(f"Benchmark: {case.case_id}")
+            results.append(run_case(case, tmp, hrtf_source=hrtf_source))
+    return results
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    p = argparse.ArgumentParser(description="Benchmark the rendering engines and compare against a baseline.")
+    p.add_argument("--engines", nargs="+", choices=ENGINES, default=ENGINES)
+    p.add_argument("--durations", nargs="+", type=float, default=DURATIONS, help="Audio durations in seconds")
+    p.add_argument("--sample-rates", nargs="+", type=int, default=SAMPLE_RATES, help="Input sample rates")
+    p.add_argument("--densities", nargs="+", choices=DENSITIES, default=DENSITIES)
+    p.add_argument("--quick", action="store_true", help="Only 10 s inputs")
+    p.add_argument("--hrtf-source", choices=HRTF_SOURCES, default=None,
+                   help="HRTF set (default: hrtf.source in config.yaml; synthetic/dummy need no download)")
+    p.add_argument("--dummy-hrtf", action="store_true", help="Same as --hrtf-source dummy")
+    p.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON path")
+    p.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="Allowed slowdown ratio (0.2 = +20%%)")
+    p.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    p.add_argument("--workdir", default=None, help="Directory for generated inputs (default: system temp)")
+    p.add_argument("--compare-native", action="store_true",
+                   help="Compare native-rate rendering against resampling the input (uses the first duration and sample rate)")
+    args = p.parse_args()
+    hrtf_source = "dummy" if args.dummy_hrtf else args.hrtf_source
+
+    if args.compare_native:
+        duration = 10 if args.quick else args.durations[0]
+        print(json.dumps(compare_native_rate(duration, args.sample_rates[0], hrtf_source=hrtf_source), indent=2))
+        return
+
+    cases = build_matrix(args.engines, [10] if args.quick else args.durations, args.sample_rates, args.densities)
+    results = run_benchmarks(cases, hrtf_source=hrtf_source, workdir=args.workdir)
+    regressions = find_regressions(results, load_baseline(args.baseline), args.threshold)
+    print(format_report(results, regressions))
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    results_path = os.path.join(RESULTS_DIR, f"benchmark_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(results_path, "w", encoding="utf-8") as f:
+        json.dump({"results": results, "regressions": regressions}, f, indent=2)
+    print(f"Results: {results_path}")
+
+    if args.update_baseline:
+        save_baseline(results, args.baseline)
+        print(f"Baseline updated: {args.baseline}")
+    elif regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import hashlib
+import inspect
+import logging
+import os
+import re
+import shutil
+from typing import Optional
+
+import yaml
+from google.adk.agents import BaseAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.genai import types
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+CHECKPOINT_DIR = config.get("checkpoint", {}).get("dir", "asmr_gen_adk/output/runs")
+
+# パイプライン順のステージ出力キー
+STAGE_KEYS = [
+    "script_text",
+    "wav_path",
+    "timed_script_json",
+    "spatial_plan_json",
+    "binaural_output_path",
+]
+# 値がファイルパスのキー（参照先の音声も実行ディレクトリにコピーして保持する）
+AUDIO_KEYS = {"wav_path", "binaural_output_path"}
+# セッション状態のキー: この実行のID（保存先）と、それを決めた呼び出し（invocation）のID、
+# 再開する以前の実行のID（利用者が明示的に指定し、1回の呼び出しで使い切る）
+RUN_ID_KEY = "checkpoint_run_id"
+RUN_INVOCATION_KEY = "checkpoint_invocation_id"
+RESUME_KEY = "resume_run_id"
+
+
+def input_hash_for(user_input: str) -> str:
+    """入力（シチュエーション）のハッシュ。同じ入力の実行ディレクトリをまとめる。"""
+    return hashlib.sha256(user_input.strip().encode("utf-8")).hexdigest()[:16]
+
+
+def run_dir_for(callback_context: CallbackContext) -> str:
+    """
+    実行ディレクトリ（<入力のハッシュ>/<実行ID>）。実行IDは通常は呼び出し（invocation）ごとに新しく、
+    同じ入力の同時実行や再実行が互いの出力を読み書きすることはない。
+    セッション状態に resume_run_id があればその実行のディレクトリを使い、保存済みのステージから再開する。
+    実行IDは呼び出しの最初のステージで決めて checkpoint_run_id に残し、resume_run_id は消す
+    （同じセッションの次の呼び出しは新しい実行になる）。
+    """
+    user_content = callback_context.user_content
+    parts = user_content.parts if user_content and user_content.parts else []
+    user_input = "".join(part.text or "" for part in parts)
+    state = callback_context.state
+    if state.get(RUN_INVOCATION_KEY) == callback_context.invocation_id and state.get(RUN_ID_KEY):
+        run_id = state[RUN_ID_KEY]
+    else:
+        run_id = str(state.get(RESUME_KEY) or callback_context.invocation_id)
+        if not re.fullmatch(r"[\w-]+", run_id):
+            raise ValueError(f"Invalid checkpoint run id: {run_id!r}")
+        if state.get(RESUME_KEY) is not None:
+            state[RESUME_KEY] = None
+        state[RUN_ID_KEY] = run_id
+        state[RUN_INVOCATION_KEY] = callback_context.invocation_id
+    return os.path.join(CHECKPOINT_DIR, input_hash_for(user_input), run_id)
+
+
+def extract_audio_path(text: str) -> Optional[str]:
+    """エージェントの応答（引用符やMarkdownを含み得る）から音声ファイルのパスを取り出す。"""
+    match = re.search(r"[^\s`'\"]+\.wav", text or "")
+    return match.group(0) if match else None
+
+
+def _checkpoint_file(run_dir: str, key: str) -> str:
+    return os.path.join(run_dir, f"{key}.txt")
+
+
+def load_stage(run_dir: str, key: str) -> Optional[str]:
+    """保存済みのステージ出力を返す。未保存、または参照先の音声が失われていれば None。"""
+    path = _checkpoint_file(run_dir, key)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        value = f.read()
+    if key in AUDIO_KEYS and not os.path.exists(value):
+        return None
+    return value
+
+
+def save_stage(run_dir: str, key: str, value: str) -> str:
+    """
+    ステージ出力を実行ディレクトリに保存し、保存した値を返す。
+    このステージを再実行した場合、後続ステージの出力は古くなるため削除する。
+    """
+    os.makedirs(run_dir, exist_ok=True)
+    if key in AUDIO_KEYS:
+        source = extract_audio_path(value)
+        if source is None or not os.path.exists(source):
+            raise FileNotFoundError(f"Audio for `{key}` not found: {value!r}")
+        value = os.path.join(run_dir, f"{key}_{os.path.basename(source)}")
+        if os.path.abspath(source) != os.path.abspath(value):
+            shutil.copyfile(source, value)
+    with open(_checkpoint_file(run_dir, key), "w", encoding="utf-8") as f:
+        f.write(value)
+    for later_key in STAGE_KEYS[STAGE_KEYS.index(key) + 1:]:
+        if os.path.exists(_checkpoint_file(run_dir, later_key)):
+            os.remove(_checkpoint_file(run_dir, later_key))
+    return value
+
+
+def with_checkpoint(agent: BaseAgent, key: Optional[str] = None) -> BaseAgent:
+    """
+    エージェントにステージ単位のチェックポイントを付与する。
+    実行前に保存済みの出力があればそれをセッション状態に復元してステージを飛ばし、
+    実行後（高速パスで完了した場合も含む）は出力を実行ディレクトリに保存する。
+    保存済みの出力があるのは resume_run_id で以前の実行を指定した場合だけ（run_dir_for を参照）。
+    保存した実行のIDはセッション状態の checkpoint_run_id に残る。
+    """
+    key = key or agent.output_key
+    fast_paths = agent.canonical_before_agent_callbacks
+    after_callbacks = agent.canonical_after_agent_callbacks
+
+    def _persist(callback_context: CallbackContext) -> None:
+        value = callback_context.state.get(key)
+        if not value:
+            return
+        run_dir = run_dir_for(callback_context)
+        try:
+            value = save_stage(run_dir, key, value)
+        except (OSError, FileNotFoundError) as e:
+            logging.warning(f"Checkpoint for `{key}` not saved: {e}")
+            return
+        callback_context.state[key] = value
+
+    async def _restore_or_run(callback_context: CallbackContext) -> Optional[types.Content]:
+        value = load_stage(run_dir_for(callback_context), key)
+        if value is not None:
+            logging.info(f"Resuming `{agent.name}` from checkpoint.")
+            callback_context.state[key] = value
+            return types.Content(role="model", parts=[types.Part(text=value)])
+        for callback in fast_paths:
+            content = callback(callback_context=callback_context)
+            if inspect.isawaitable(content):
+                content = await content
+            if content:
+                _persist(callback_context)
+                return content
+        return None
+
+    async def _save(callback_context: CallbackContext) -> Optional[types.Content]:
+        _persist(callback_context)
+        for callback in after_callbacks:
+            content = callback(callback_context=callback_context)
+            if inspect.isawaitable(content):
+                content = await content
+            if content:
+                return content
+        return None
+
+    agent.before_agent_callback = _restore_or_run
+    agent.after_agent_callback = _save
+    return agent
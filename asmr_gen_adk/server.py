@@ -0,0 +1,306 @@
+"""
+ASMR生成ジョブサーバー
+
+- 脚本・TTS・アライメント・空間プランの各ステージ（I/O待ちが中心）は、
+  ADKセッションとして asyncio 上で多数並行に実行する
+- CPU負荷の高いバイノーラルレンダリングは上限付きのプロセスプールに渡す
+- レンダリング待ちの深さに上限を設け、溢れた場合は新規ジョブを拒否する（バックプレッシャー）
+
+使い方:
+    python -m asmr_gen_adk.server --port 8080
+    curl -X POST localhost:8080/jobs -H 'Content-Type: application/json' -d '{"situation": "..."}'
+    curl localhost:8080/jobs/<job_id>
+    curl localhost:8080/stats
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Optional
+
+import yaml
+from google.adk.agents import BaseAgent
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from .agents.asmr_agent import binaural_output_path_for, clean_spatial_plan_json
+from .checkpoint import RESUME_KEY, RUN_ID_KEY, extract_audio_path
+from .tools.binaural_renderer import BinauralRenderer
+from .tools.render_pool import RenderPool
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+APP_NAME = "asmr_gen_server"
+
+# ジョブの状態
+QUEUED = "queued"
+GENERATING = "generating"
+WAITING_RENDER = "waiting_render"
+RENDERING = "rendering"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """未完了ジョブが上限に達しており、新規ジョブを受け付けられない。"""
+
+
+@dataclass
+class Job:
+    job_id: str
+    situation: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    generated_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    binaural_output_path: Optional[str] = None
+    error: Optional[str] = None
+    # チェックポイントの実行ID（失敗したジョブは resume_run_id に渡して再開できる）
+    run_id: Optional[str] = None
+    resume_run_id: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class JobServer:
+    """
+    生成リクエストを受け付け、ADKセッションを並行実行し、レンダリングをプロセスプールに渡す。
+    agent と render_fn を差し替えれば、モデルを呼ばずにエンドツーエンドで試験できる。
+    """
+
+    def __init__(
+        self,
+        agent: Optional[BaseAgent] = None,
+        render_fn: Callable[[str, str, str], Dict[str, str]] = BinauralRenderer,
+        max_sessions: int = 8,
+        render_workers: int = 2,
+        max_render_queue: int = 4,
+        max_pending_jobs: int = 64,
+        max_finished_jobs: int = 1000,
+    ):
+        if agent is None:
+            from .agent import root_agent
+            agent = root_agent
+        self.agent = agent
+        self.render_fn = render_fn
+        self.render_workers = render_workers
+        self.max_pending_jobs = max_pending_jobs
+        self.max_finished_jobs = max_finished_jobs
+        # 未完了のジョブと、終了したジョブのうち新しい max_finished_jobs 件（古いものから捨てる）
+        self.jobs: Dict[str, Job] = {}
+        self._finished: deque = deque()
+        # 状態ごとのジョブ数（終了は累計）と、完了ジョブのレイテンシの合計。stats() はジョブを走査しない
+        self._counts = {status: 0 for status in (QUEUED, GENERATING, WAITING_RENDER, RENDERING, DONE, FAILED)}
+        self._latency_sum = 0.0
+        self._session_service = InMemorySessionService()
+        self._runner = Runner(agent=agent, app_name=APP_NAME, session_service=self._session_service)
+        self._session_slots = asyncio.Semaphore(max_sessions)
+        # 満杯のときは生成済みジョブの put が待たされ、上流の生成も自然に減速する
+        self._render_queue: asyncio.Queue = asyncio.Queue(maxsize=max_render_queue)
+        self._pool: Optional[RenderPool] = None
+        self._tasks: set = set()
+        self._render_tasks: list = []
+        self._started_at = time.time()
+
+    async def start(self) -> None:
+        self._pool = RenderPool(workers=self.render_workers)
+        self._started_at = time.time()
+        self._render_tasks = [
+            asyncio.create_task(self._render_loop()) for _ in range(self.render_workers)
+        ]
+
+    async def stop(self) -> None:
+        for task in list(self._tasks) + self._render_tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._render_tasks, return_exceptions=True)
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def pending_jobs(self) -> int:
+        return sum(count for status, count in self._counts.items() if status not in (DONE, FAILED))
+
+    def submit(self, situation: str, resume_run_id: Optional[str] = None) -> Job:
+        """
+        ジョブを登録して即座に返す。未完了ジョブが上限なら QueueFullError。
+        resume_run_id に以前のジョブの run_id を渡すと、その保存済みステージから再開する。
+        """
+        if self.pending_jobs() >= self.max_pending_jobs:
+            raise QueueFullError(f"{self.pending_jobs()} jobs pending (limit {self.max_pending_jobs})")
+        job = Job(job_id=uuid.uuid4().hex, situation=situation, resume_run_id=resume_run_id)
+        self.jobs[job.job_id] = job
+        self._counts[QUEUED] += 1
+        task = asyncio.create_task(self._generate(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def wait(self, job_id: str, poll_sec: float = 0.05) -> Job:
+        job = self.jobs[job_id]
+        while job.status not in (DONE, FAILED):
+            await asyncio.sleep(poll_sec)
+        return job
+
+    async def _generate(self, job: Job) -> None:
+        try:
+            async with self._session_slots:
+                self._set_status(job, GENERATING)
+                job.started_at = time.time()
+                state = await self._run_session(job)
+            job.generated_at = time.time()
+            # チェックポイントから最終出力が復元された場合はレンダリング不要
+            if state.get("binaural_output_path"):
+                job.binaural_output_path = state["binaural_output_path"]
+                self._finish(job, DONE)
+                return
+            wav_path = extract_audio_path(state.get("wav_path"))
+            spatial_plan_json = clean_spatial_plan_json(state.get("spatial_plan_json") or "")
+            if wav_path is None or not spatial_plan_json:
+                raise ValueError("Pipeline finished without `wav_path` or `spatial_plan_json`")
+            self._set_status(job, WAITING_RENDER)
+            await self._render_queue.put((job, wav_path, spatial_plan_json))
+        except Exception as e:
+            logging.error(f"Job {job.job_id} failed during generation: {e}", exc_info=True)
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    async def _run_session(self, job: Job) -> Dict[str, Any]:
+        state = {"defer_render": True}
+        if job.resume_run_id:
+            state[RESUME_KEY] = job.resume_run_id
+        session = await self._session_service.create_session(
+            app_name=APP_NAME, user_id=job.job_id, state=state
+        )
+        message = types.Content(role="user", parts=[types.Part(text=job.situation)])
+        try:
+            async for _ in self._runner.run_async(
+                user_id=job.job_id, session_id=session.id, new_message=message
+            ):
+                pass
+        finally:
+            # 途中で失敗しても、保存済みのステージを再開できるよう実行IDを残す
+            session = await self._session_service.get_session(
+                app_name=APP_NAME, user_id=job.job_id, session_id=session.id
+            )
+            job.run_id = session.state.get(RUN_ID_KEY)
+        return dict(session.state)
+
+    async def _render_loop(self) -> None:
+        while True:
+            job, wav_path, spatial_plan_json = await self._render_queue.get()
+            try:
+                self._set_status(job, RENDERING)
+                output_path = binaural_output_path_for(wav_path)
+                result = await self._pool.run(self.render_fn, wav_path, spatial_plan_json, output_path)
+                if "error" in result:
+                    raise RuntimeError(result["error"])
+                job.binaural_output_path = result["binaural_output_path"]
+                self._finish(job, DONE)
+            except Exception as e:
+                logging.error(f"Job {job.job_id} failed during rendering: {e}")
+                job.error = str(e)
+                self._finish(job, FAILED)
+            finally:
+                self._render_queue.task_done()
+
+    def _set_status(self, job: Job, status: str) -> None:
+        self._counts[job.status] -= 1
+        self._counts[status] += 1
+        job.status = status
+
+    def _finish(self, job: Job, status: str) -> None:
+        self._set_status(job, status)
+        job.finished_at = time.time()
+        if status == DONE:
+            self._latency_sum += job.finished_at - job.created_at
+        self._finished.append(job.job_id)
+        while len(self._finished) > self.max_finished_jobs:
+            self.jobs.pop(self._finished.popleft(), None)
+
+    def stats(self) -> Dict[str, Any]:
+        """ジョブ数（終了したジョブは累計）・キュー深さ・スループット（完了ジョブ/分）を返す。"""
+        elapsed = max(time.time() - self._started_at, 1e-9)
+        done = self._counts[DONE]
+        return {
+            "jobs": dict(self._counts),
+            "retained_jobs": len(self.jobs),
+            "render_queue_depth": self._render_queue.qsize(),
+            "render_queue_limit": self._render_queue.maxsize,
+            "throughput_jobs_per_min": done / elapsed * 60.0,
+            "mean_latency_sec": self._latency_sum / done if done else None,
+            "uptime_sec": elapsed,
+        }
+
+
+def create_app(server: JobServer):
+    """JobServer をHTTPで公開する FastAPI アプリを作る。"""
+    from fastapi import FastAPI, HTTPException
+    from pydantic import BaseModel
+
+    class JobRequest(BaseModel):
+        situation: str
+        resume_run_id: Optional[str] = None
+
+    @asynccontextmanager
+    async def lifespan(app):
+        await server.start()
+        yield
+        await server.stop()
+
+    app = FastAPI(title="ASMR-GEN job server", lifespan=lifespan)
+
+    @app.post("/jobs", status_code=202)
+    async def create_job(request: JobRequest):
+        try:
+            return server.submit(request.situation, request.resume_run_id).to_dict()
+        except QueueFullError as e:
+            raise HTTPException(status_code=429, detail=str(e))
+
+    @app.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        if job_id not in server.jobs:
+            raise HTTPException(status_code=404, detail="job not found")
+        return server.jobs[job_id].to_dict()
+
+    @app.get("/stats")
+    async def get_stats():
+        return server.stats()
+
+    return app
+
+
+def main():
+    server_config = config.get("server", {})
+    p = argparse.ArgumentParser(description="Run the ASMR-GEN job server.")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--max-sessions", type=int, default=server_config.get("max_sessions", 8))
+    p.add_argument("--render-workers", type=int, default=server_config.get("render_workers", 2))
+    p.add_argument("--max-render-queue", type=int, default=server_config.get("max_render_queue", 4))
+    p.add_argument("--max-pending-jobs", type=int, default=server_config.get("max_pending_jobs", 64))
+    p.add_argument("--max-finished-jobs", type=int, default=server_config.get("max_finished_jobs", 1000))
+    args = p.parse_args()
+
+    import uvicorn
+
+    server = JobServer(
+        max_sessions=args.max_sessions,
+        render_workers=args.render_workers,
+        max_render_queue=args.max_render_queue,
+        max_pending_jobs=args.max_pending_jobs,
+        max_finished_jobs=args.max_finished_jobs,
+    )
+    uvicorn.run(create_app(server), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,379 @@
+"""
+パイプラインのテレメトリ
+
+生成1回（run）ごとに、各ステージの処理時間、LLMのレイテンシとトークン数、
+TTSの実時間比、レンダリング各工程の処理時間とリアルタイムファクター（RTF）、ピークRSSを記録し、
+JSON Lines と Prometheus テキストファイルに書き出す。
+
+- ADKのエージェント/モデルのコールバック（with_telemetry）でステージ単位の計測を行う
+- ツールやレンダラーは current_telemetry() で実行中のrunに記録する（未計測時は何もしない）
+- Prometheus ファイルは、書き出しごとに新しい記録だけを集計値（metrics.prom.state.json）に加えて作り直す。
+  集計値はファイルロックの下で更新するため、レンダリング用ワーカープロセスの記録も同じ出力にまとまる
+"""
+
+import contextvars
+import fcntl
+import inspect
+import json
+import logging
+import os
+import resource
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+import yaml
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_telemetry_config = config.get("telemetry", {})
+TELEMETRY_ENABLED = _telemetry_config.get("enabled", True)
+JSONL_PATH = _telemetry_config.get("jsonl_path", "asmr_gen_adk/output/telemetry/telemetry.jsonl")
+PROMETHEUS_PATH = _telemetry_config.get("prometheus_path", "asmr_gen_adk/output/telemetry/metrics.prom")
+# この秒数以上記録の無い run は、終了コールバックが呼ばれなかった（例外で中断した）ものとして書き出して破棄する
+STALE_RUN_SEC = _telemetry_config.get("stale_run_sec", 3600)
+
+
+def peak_rss_bytes() -> int:
+    """このプロセスのピーク常駐メモリ（Linux の ru_maxrss は KiB、macOS はバイト）。"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return int(peak if sys.platform == "darwin" else peak * 1024)
+
+
+class Telemetry:
+    """1回の生成（またはレンダリング）分の計測記録。enabled=False なら何も記録しない。"""
+
+    def __init__(self, run_id: Optional[str] = None, enabled: bool = True):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.enabled = enabled
+        self.records: List[Dict[str, Any]] = []
+        self.started_at = time.perf_counter()
+        self.last_active = self.started_at
+
+    def record(self, stage: str, kind: str = "span", **fields) -> None:
+        if not self.enabled:
+            return
+        self.last_active = time.perf_counter()
+        self.records.append({"run_id": self.run_id, "ts": time.time(), "stage": stage, "kind": kind, **fields})
+
+    @contextmanager
+    def span(self, stage: str, **fields):
+        """with ブロックの経過時間を duration_sec として記録する。"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, duration_sec=time.perf_counter() - start, **fields)
+
+    def summary(self, audio_sec: Optional[float] = None) -> Dict[str, Any]:
+        wall_sec = time.perf_counter() - self.started_at
+        return {
+            "wall_sec": wall_sec,
+            "audio_sec": audio_sec,
+            "real_time_factor": wall_sec / audio_sec if audio_sec else None,
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+
+    def flush(self, audio_sec: Optional[float] = None, **fields) -> None:
+        """run の集計行を加えて JSON Lines に追記し、Prometheus ファイルを更新する。"""
+        if not self.enabled:
+            return
+        self.record("run", kind="run", **self.summary(audio_sec), **fields)
+        records, self.records = self.records, []
+        os.makedirs(os.path.dirname(JSONL_PATH), exist_ok=True)
+        with _locked(JSONL_PATH + ".lock"):
+            # 集計値が無ければ、追記前の JSON Lines から作り直す
+            aggregates = _load_aggregates(_state_path(PROMETHEUS_PATH), JSONL_PATH)
+            with open(JSONL_PATH, "a", encoding="utf-8") as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            _aggregate(aggregates, records)
+            try:
+                _write_prometheus(aggregates, PROMETHEUS_PATH)
+            except OSError as e:
+                logging.warning(f"Failed to write Prometheus metrics: {e}")
+
+
+_DISABLED = Telemetry(run_id="disabled", enabled=False)
+_current: contextvars.ContextVar[Telemetry] = contextvars.ContextVar("asmr_telemetry", default=_DISABLED)
+
+
+def current_telemetry() -> Telemetry:
+    return _current.get()
+
+
+@contextmanager
+def telemetry_run(run_id: Optional[str] = None, audio_sec: Optional[float] = None):
+    """ADKの外（CLIやワーカー）で1回分の計測を行う。終了時に書き出す。"""
+    telemetry = Telemetry(run_id, enabled=TELEMETRY_ENABLED)
+    token = _current.set(telemetry)
+    try:
+        yield telemetry
+    finally:
+        _current.reset(token)
+        telemetry.flush(audio_sec)
+
+
+# --- Prometheus export ---
+
+@contextmanager
+def _locked(lock_path: str):
+    """プロセス間の排他ロック（JSON Lines への追記と集計値の更新を揃える）。"""
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _state_path(prometheus_path: str) -> str:
+    return prometheus_path + ".state.json"
+
+
+def _empty_aggregates() -> Dict[str, Any]:
+    return {
+        "durations": {},  # stage -> [合計秒数, 回数]
+        "tokens": {},  # stage -> {"in": 数, "out": 数}
+        "last": {},  # gauge -> {stage: 最後の値}
+        "runs": 0,
+        "abandoned_runs": 0,
+        "peak_rss": 0,
+        # HRTFキャッシュ（tools/hrtf_cache.py）の参照結果・追い出し数と、最後に記録された大きさ
+        "hrtf_lookups": {"hit": 0, "miss": 0},
+        "hrtf_evictions": 0,
+        "hrtf_cache_bytes": None,
+    }
+
+
+def _aggregate(aggregates: Dict[str, Any], records: List[Dict[str, Any]]) -> None:
+    """記録を集計値に加える。"""
+    for record in records:
+        stage = record["stage"]
+        if record["kind"] == "run":
+            aggregates["abandoned_runs" if record.get("status") == "abandoned" else "runs"] += 1
+            aggregates["peak_rss"] = max(aggregates["peak_rss"], record.get("peak_rss_bytes") or 0)
+            continue
+        if record["kind"] == "hrtf_cache":
+            aggregates["hrtf_lookups"]["hit" if record["hit"] else "miss"] += 1
+            aggregates["hrtf_evictions"] += record.get("evicted", 0)
+            aggregates["hrtf_cache_bytes"] = record.get("bytes")
+            continue
+        if record.get("duration_sec") is not None:
+            total = aggregates["durations"].setdefault(stage, [0.0, 0])
+            total[0] += record["duration_sec"]
+            total[1] += 1
+        for direction in ("in", "out"):
+            if f"tokens_{direction}" in record:
+                tokens = aggregates["tokens"].setdefault(stage, {"in": 0, "out": 0})
+                tokens[direction] += record[f"tokens_{direction}"] or 0
+        for gauge in ("real_time_factor", "audio_sec_per_wall_sec"):
+            if record.get(gauge) is not None:
+                aggregates["last"].setdefault(gauge, {})[stage] = record[gauge]
+
+
+def _load_aggregates(state_path: str, jsonl_path: str) -> Dict[str, Any]:
+    """保存済みの集計値。無い（または壊れている）場合は JSON Lines 全体から集計する。"""
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    aggregates = _empty_aggregates()
+    if os.path.exists(jsonl_path):
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            _aggregate(aggregates, [json.loads(line) for line in f if line.strip()])
+    return aggregates
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels.items()) + "}"
+
+
+def _prometheus_text(aggregates: Dict[str, Any]) -> str:
+    lines = [
+        "# HELP asmr_stage_duration_seconds Wall time spent in each pipeline stage or render step.",
+        "# TYPE asmr_stage_duration_seconds summary",
+    ]
+    for stage, (total, count) in sorted(aggregates["durations"].items()):
+        lines.append(f"asmr_stage_duration_seconds_sum{_labels(stage=stage)} {total:.6f}")
+        lines.append(f"asmr_stage_duration_seconds_count{_labels(stage=stage)} {count}")
+    lines += ["# HELP asmr_llm_tokens_total LLM tokens per stage.", "# TYPE asmr_llm_tokens_total counter"]
+    for stage, tokens in sorted(aggregates["tokens"].items()):
+        for direction in ("in", "out"):
+            lines.append(f"asmr_llm_tokens_total{_labels(stage=stage, direction=direction)} {tokens[direction]}")
+    for gauge, help_text in (
+        ("real_time_factor", "Processing time per second of audio (last run)."),
+        ("audio_sec_per_wall_sec", "Seconds of audio produced per wall second (last run)."),
+    ):
+        lines += [f"# HELP asmr_{gauge} {help_text}", f"# TYPE asmr_{gauge} gauge"]
+        for stage, value in sorted(aggregates["last"].get(gauge, {}).items()):
+            lines.append(f"asmr_{gauge}{_labels(stage=stage)} {value:.6f}")
+    lines += [
+        "# HELP asmr_runs_total Completed runs.", "# TYPE asmr_runs_total counter",
+        f"asmr_runs_total {aggregates['runs']}",
+        "# HELP asmr_runs_abandoned_total Runs that ended without their finishing callback (errors).",
+        "# TYPE asmr_runs_abandoned_total counter", f"asmr_runs_abandoned_total {aggregates['abandoned_runs']}",
+        "# HELP asmr_peak_rss_bytes Highest peak RSS reported by any run.", "# TYPE asmr_peak_rss_bytes gauge",
+        f"asmr_peak_rss_bytes {aggregates['peak_rss']}",
+    ]
+    hrtf_lookups = aggregates["hrtf_lookups"]
+    if any(hrtf_lookups.values()):
+        lines += ["# HELP asmr_hrtf_cache_lookups_total HRTF set cache lookups by result.",
+                  "# TYPE asmr_hrtf_cache_lookups_total counter"]
+        for result in ("hit", "miss"):
+            lines.append(f"asmr_hrtf_cache_lookups_total{_labels(result=result)} {hrtf_lookups[result]}")
+        lines += ["# HELP asmr_hrtf_cache_evictions_total HRTF sets evicted to stay under the size limit.",
+                  "# TYPE asmr_hrtf_cache_evictions_total counter",
+                  f"asmr_hrtf_cache_evictions_total {aggregates['hrtf_evictions']}",
+                  "# HELP asmr_hrtf_cache_bytes Size of the cached HRTF sets (last lookup).",
+                  "# TYPE asmr_hrtf_cache_bytes gauge", f"asmr_hrtf_cache_bytes {aggregates['hrtf_cache_bytes']}"]
+    return "\n".join(lines) + "\n"
+
+
+def _replace_text(path: str, text: str) -> None:
+    # 収集側が書きかけのファイルを読まないよう、一時ファイル（プロセスごと）から置き換える
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _write_prometheus(aggregates: Dict[str, Any], prometheus_path: str) -> None:
+    """集計値を保存し、Prometheus の textfile collector 形式で書き出す。"""
+    os.makedirs(os.path.dirname(prometheus_path), exist_ok=True)
+    _replace_text(_state_path(prometheus_path), json.dumps(aggregates))
+    _replace_text(prometheus_path, _prometheus_text(aggregates))
+
+
+def export_prometheus(jsonl_path: str, prometheus_path: str) -> None:
+    """JSON Lines の全記録から集計し直して書き出す（集計値の作り直し用）。"""
+    aggregates = _empty_aggregates()
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        _aggregate(aggregates, [json.loads(line) for line in f if line.strip()])
+    _write_prometheus(aggregates, prometheus_path)
+
+
+# --- ADK callbacks ---
+
+_runs: Dict[str, Telemetry] = {}
+_started: Dict[tuple, float] = {}
+
+
+def _prune_stale_runs() -> None:
+    """終了コールバックが呼ばれなかった（例外で中断した）run を書き出して破棄する。"""
+    now = time.perf_counter()
+    for invocation_id, telemetry in list(_runs.items()):
+        if now - telemetry.last_active > STALE_RUN_SEC:
+            del _runs[invocation_id]
+            telemetry.flush(status="abandoned")
+    for key in [key for key in _started if key[0] not in _runs]:
+        del _started[key]
+
+
+def _run_for(callback_context: CallbackContext) -> Telemetry:
+    invocation_id = callback_context.invocation_id
+    if invocation_id not in _runs:
+        _prune_stale_runs()
+        _runs[invocation_id] = Telemetry(invocation_id, enabled=TELEMETRY_ENABLED)
+    telemetry = _runs[invocation_id]
+    telemetry.last_active = time.perf_counter()
+    # 同じタスク内で呼ばれるツール（TTSなど）からも記録できるようにする
+    _current.set(telemetry)
+    return telemetry
+
+
+def _run_started(callback_context: CallbackContext) -> None:
+    _run_for(callback_context)
+
+
+def _run_finished(callback_context: CallbackContext) -> None:
+    telemetry = _runs.pop(callback_context.invocation_id, None)
+    for key in [key for key in _started if key[0] == callback_context.invocation_id]:
+        del _started[key]
+    if telemetry is None:
+        return
+    audio_sec = next(
+        (r["audio_sec"] for r in telemetry.records if r["stage"] == "tts" and r.get("audio_sec")), None
+    )
+    telemetry.flush(audio_sec)
+
+
+def _stage_started(callback_context: CallbackContext) -> None:
+    _run_for(callback_context)
+    _started[(callback_context.invocation_id, callback_context.agent_name)] = time.perf_counter()
+
+
+def _stage_finished(callback_context: CallbackContext) -> None:
+    start = _started.pop((callback_context.invocation_id, callback_context.agent_name), None)
+    if start is not None:
+        _run_for(callback_context).record(
+            f"agent.{callback_context.agent_name}", duration_sec=time.perf_counter() - start
+        )
+
+
+def _model_started(callback_context: CallbackContext, llm_request) -> None:
+    _started[(callback_context.invocation_id, callback_context.agent_name, "llm")] = time.perf_counter()
+
+
+def _model_finished(callback_context: CallbackContext, llm_response) -> None:
+    # ストリーミング時の途中応答は数えない
+    if getattr(llm_response, "partial", False):
+        return
+    start = _started.pop((callback_context.invocation_id, callback_context.agent_name, "llm"), None)
+    usage = llm_response.usage_metadata
+    _run_for(callback_context).record(
+        f"llm.{callback_context.agent_name}",
+        kind="llm",
+        duration_sec=time.perf_counter() - start if start is not None else None,
+        tokens_in=usage.prompt_token_count if usage else None,
+        tokens_out=usage.candidates_token_count if usage else None,
+    )
+
+
+def with_telemetry(agent: BaseAgent) -> BaseAgent:
+    """ステージ（エージェント）とLLM呼び出しの計測コールバックを既存のコールバックの前に追加する。"""
+    if not TELEMETRY_ENABLED:
+        return agent
+    before_callbacks = agent.canonical_before_agent_callbacks
+
+    async def _stage_started_or_skipped(callback_context: CallbackContext):
+        # 既存のコールバックがステージを飛ばす（チェックポイントからの復元など）か例外を出すと
+        # 終了側のコールバックは呼ばれないため、ここで計測を閉じる
+        _stage_started(callback_context)
+        try:
+            for callback in before_callbacks:
+                content = callback(callback_context=callback_context)
+                if inspect.isawaitable(content):
+                    content = await content
+                if content:
+                    _stage_finished(callback_context)
+                    return content
+        except Exception:
+            _stage_finished(callback_context)
+            raise
+        return None
+
+    agent.before_agent_callback = _stage_started_or_skipped
+    agent.after_agent_callback = [_stage_finished, *agent.canonical_after_agent_callbacks]
+    if isinstance(agent, LlmAgent):
+        agent.before_model_callback = [_model_started, *agent.canonical_before_model_callbacks]
+        agent.after_model_callback = [_model_finished, *agent.canonical_after_model_callbacks]
+    return agent
+
+
+def with_run_telemetry(agent: BaseAgent) -> BaseAgent:
+    """ルートエージェントに、run 全体の開始・書き出しのコールバックを付与する。"""
+    if not TELEMETRY_ENABLED:
+        return agent
+    agent.before_agent_callback = [_run_started, *agent.canonical_before_agent_callbacks]
+    agent.after_agent_callback = [*agent.canonical_after_agent_callbacks, _run_finished]
+    return agent
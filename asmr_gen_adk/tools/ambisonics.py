@@ -0,0 +1,94 @@
+"""
+Ambisonics バス
+
+音源ごとにHRIRを畳み込む代わりに、各音源を球面調和関数（SH）のゲインで高次Ambisonicsのバスに
+エンコードし、バス全体をSH領域のHRTFフィルタで1回だけバイノーラルにデコードする。
+デコードのコストは音源数によらず一定で、音源ごとの処理はゲインの掛け算だけになる。
+
+- SHは実数・N3D・ACN順（spaudiopy.sph.sh_matrix と同じ規約）
+- SH領域のHRTFフィルタは、遷移周波数までは最小二乗、それより上は振幅のみの最小二乗（MagLS）で求める。
+  低次ではITDの再現が高域で破綻するため、高域は位相を捨てて振幅特性を優先する
+- フィルタはレンダラーがHRTFセットごとに求め、HRTFのLRUキャッシュ（hrtf_cache）に入れる
+"""
+
+from typing import Optional
+
+import numpy as np
+import scipy.special
+import spaudiopy as spa
+import yaml
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+# "direct": 音源ごとにHRIRを畳み込む / "ambisonic": Ambisonicsバスにエンコードして1回だけデコードする
+SPATIAL_MODE = config.get("render", {}).get("spatial_mode", "direct")
+
+_ambisonics_config = config.get("ambisonics", {})
+AMBISONIC_ORDER = _ambisonics_config.get("order", 3)
+# MagLS に切り替える周波数。未指定なら次数 × 600Hz（N > kr の目安）
+TRANSITION_HZ = _ambisonics_config.get("magls_transition_hz")
+# SH領域フィルタのFFT長の下限
+MIN_FILTER_LENGTH = 1024
+
+
+def num_channels(order: int) -> int:
+    return (order + 1) ** 2
+
+
+def sh_matrix(order: int, azi, zen) -> np.ndarray:
+    """
+    実数SH行列 (方向数, (order + 1) ** 2)。azi は方位角、zen は天頂角（ラジアン）。
+    新しい SciPy では spaudiopy が使う scipy.special.sph_harm が削除されているため、その場合は sph_harm_y で同じ値を求める。
+    """
+    azi = np.atleast_1d(np.asarray(azi, dtype=np.float64))
+    zen = np.atleast_1d(np.asarray(zen, dtype=np.float64))
+    if hasattr(scipy.special, "sph_harm"):
+        return spa.sph.sh_matrix(order, azi, zen, "real")
+    Ymn = np.zeros((len(azi), num_channels(order)))
+    idx = 0
+    for n in range(order + 1):
+        for m in range(-n, n + 1):
+            Y = scipy.special.sph_harm_y(n, abs(m), zen, azi)
+            if m == 0:
+                Ymn[:, idx] = np.real(Y)
+            elif m < 0:
+                Ymn[:, idx] = np.sqrt(2) * (-1) ** abs(m) * np.imag(Y)
+            else:
+                Ymn[:, idx] = np.sqrt(2) * (-1) ** abs(m) * np.real(Y)
+            idx += 1
+    return Ymn
+
+
+def encoder_gains(azimuth: float, elevation: float, order: int = AMBISONIC_ORDER) -> np.ndarray:
+    """方位角・仰角（度、レンダラーの規約）の音源をエンコードするSHゲイン ((order + 1) ** 2,)。"""
+    return sh_matrix(order, np.deg2rad(-azimuth), np.deg2rad(90 - elevation))[0]
+
+
+def sh_binaural_filters(hrtf, order: int = AMBISONIC_ORDER, transition_hz: Optional[float] = None) -> np.ndarray:
+    """
+    SH領域のバイノーラルデコードフィルタ (2, (order + 1) ** 2, L)。
+    encoder_gains(方向) @ filters[ear] がその方向のHRIRの近似になる。
+    """
+    if transition_hz is None:
+        transition_hz = TRANSITION_HZ if TRANSITION_HZ is not None else order * 600.0
+    nfft = max(MIN_FILTER_LENGTH, hrtf.left.shape[1])
+    freqs = np.fft.rfftfreq(nfft, 1 / hrtf.fs)
+    # 位相の進みを求めるため、最小二乗の区間は少なくとも2ビン残す
+    k_trans = max(int(np.searchsorted(freqs, transition_hz)), 2)
+    Y = sh_matrix(order, hrtf.azi, hrtf.zen)
+    Y_pinv = np.linalg.pinv(Y)
+
+    filters = np.zeros((2, num_channels(order), nfft))
+    for ear, hrirs in enumerate((hrtf.left, hrtf.right)):
+        H = np.fft.rfft(hrirs, nfft, axis=1)
+        H_nm = np.zeros((num_channels(order), len(freqs)), dtype=np.complex128)
+        H_nm[:, :k_trans] = Y_pinv @ H[:, :k_trans]
+        if k_trans < len(freqs):
+            # 遷移周波数より上は、1つ前の周波数でデコードした位相に全方向平均の位相の進みを足して振幅だけを合わせる
+            step = np.angle(np.sum(H[:, k_trans - 1] * np.conj(H[:, k_trans - 2])))
+            for k in range(k_trans, len(freqs)):
+                phase = np.angle(Y @ H_nm[:, k - 1]) + step
+                H_nm[:, k] = Y_pinv @ (np.abs(H[:, k]) * np.exp(1j * phase))
+        filters[ear] = np.fft.irfft(H_nm, nfft, axis=1)
+    return filters
@@ -17,6 +17,8 @@ import soundfile as sf
 import librosa
 from pedalboard import Pedalboard, Reverb, LowpassFilter, HighpassFilter
 
+from .audio_analysis import saved_analysis
+
 # -----------------------------
 # Data model
 # -----------------------------
@@ -245,7 +247,13 @@ def process(
         audio_mono = librosa.resample(audio_mono, orig_sr=sr, target_sr=target_sr, res_type="soxr_hq")
         sr = target_sr
 
-    audio_mono, _ = librosa.effects.trim(audio_mono, top_db=trim_silence_db)
+    # TTS後に保存した解析結果があれば、無音の範囲はそのRMSから求める
+    analysis = saved_analysis(input_wav)
+    if analysis is not None:
+        start, end = analysis.trim_bounds(top_db=trim_silence_db, sample_rate=sr)
+        audio_mono = audio_mono[start:end]
+    else:
+        audio_mono, _ = librosa.effects.trim(audio_mono, top_db=trim_silence_db)
 
     # 3) プランのロード & カーブ生成
     plan = load_spatial_plan(plan_json)
@@ -0,0 +1,187 @@
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .audio_analysis import (
+    MIN_PAUSE_SEC,
+    MIN_SPEECH_SEC,
+    SILENCE_THRESHOLD_DB,
+    frame_rms_db,
+    load_analysis,
+    speech_regions,
+)
+
+# 文の長さ（文字数）から期待される長さに対する実測の許容比率
+MAX_DURATION_RATIO = 3.0
+
+# jsonize_agent の話者ラベル。台詞は主人公、ナレーション（状況説明）は situation explainer
+DEFAULT_SPEAKER = "main character"
+NARRATOR_SPEAKER = "situation explainer"
+
+# ナレーションの行の印: 行頭の「ナレーション：」「【状況説明】」など（印は読み上げの文字数に含めない）
+_NARRATION_LABELS = r"ナレーション|ナレーター|語り|地の文|状況説明|narration|narrator"
+_NARRATION_PATTERN = re.compile(
+    rf"^\s*(?:【\s*(?:{_NARRATION_LABELS})\s*】|(?:{_NARRATION_LABELS})\s*[:：])\s*", re.IGNORECASE
+)
+
+# 脚本中の演出指示: [右耳元で囁く] / (吐息) / （衣擦れ）
+_CUE_PATTERN = re.compile(r"\[[^\]]*\]|\([^)]*\)|（[^）]*）")
+# 文末: 句点・感嘆符・疑問符、および連続する三点リーダ
+_SENTENCE_END_PATTERN = re.compile(r"(?<=[。！？!?])|(?<=…)(?!…)|(?<=\.\.\.)(?!\.)")
+_SILENT_CHARS = re.compile(r"[\s、。，,．.！？!?…ー〜~「」『』\-]")
+
+
+def detect_speech_regions(
+    audio: np.ndarray,
+    sample_rate: int,
+    threshold_db: float = SILENCE_THRESHOLD_DB,
+    min_pause_sec: float = MIN_PAUSE_SEC,
+    min_speech_sec: float = MIN_SPEECH_SEC,
+) -> np.ndarray:
+    """エネルギーベースのVADで発話区間を検出し、(K, 2) の [開始, 終了] 秒配列を返す。"""
+    voiced = frame_rms_db(audio, sample_rate) > threshold_db
+    return speech_regions(voiced, sample_rate, len(audio), min_pause_sec, min_speech_sec)
+
+
+def split_script_with_speakers(script_text: str) -> List[Tuple[str, str]]:
+    """
+    脚本を読み上げ単位（文）と話者の組に分割する。演出指示だけの行は次の文に付ける。
+    ナレーションの印で始まる行の文は NARRATOR_SPEAKER（印は取り除く）、それ以外は DEFAULT_SPEAKER。
+    """
+    sentences = []
+    pending_cue = ""
+    for line in script_text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        narration = _NARRATION_PATTERN.match(line)
+        speaker = NARRATOR_SPEAKER if narration else DEFAULT_SPEAKER
+        if narration:
+            line = line[narration.end():]
+        for piece in _SENTENCE_END_PATTERN.split(line):
+            piece = piece.strip()
+            if not piece:
+                continue
+            if _spoken_length(piece) == 0:
+                pending_cue += piece
+                continue
+            sentences.append((pending_cue + piece, speaker))
+            pending_cue = ""
+    if pending_cue and sentences:
+        sentence, speaker = sentences[-1]
+        sentences[-1] = (sentence + pending_cue, speaker)
+    return sentences
+
+
+def split_script(script_text: str) -> List[str]:
+    """脚本を読み上げ単位（文）に分割する。"""
+    return [sentence for sentence, _ in split_script_with_speakers(script_text)]
+
+
+def _spoken_length(sentence: str) -> int:
+    """演出指示と記号を除いた、実際に読み上げられる文字数。"""
+    return len(_SILENT_CHARS.sub("", _CUE_PATTERN.sub("", sentence)))
+
+
+def _assign_regions(durations: np.ndarray, weights: np.ndarray) -> Optional[List[int]]:
+    """
+    連続する発話区間を文に割り当てる。
+    区間の並びを文の数だけのグループに区切り、各グループの長さの比率が
+    文字数の比率に最も近くなる区切りを動的計画法で求める。
+    返り値は各文の最初の区間インデックス。
+    """
+    n_regions, n_sentences = len(durations), len(weights)
+    if n_regions < n_sentences or n_sentences == 0:
+        return None
+    share = weights / weights.sum()
+    cum = np.concatenate([[0.0], np.cumsum(durations)]) / durations.sum()
+
+    # cost[j, i]: 文 0..j-1 を区間 0..i-1 に割り当てた最小誤差
+    cost = np.full((n_sentences + 1, n_regions + 1), np.inf)
+    back = np.zeros((n_sentences + 1, n_regions + 1), dtype=int)
+    cost[0, 0] = 0.0
+    for j in range(1, n_sentences + 1):
+        # 文 j-1 は区間 k..i-1 を担当する（k < i）
+        lo, hi = j, n_regions - (n_sentences - j)
+        for i in range(lo, hi + 1):
+            k = np.arange(j - 1, i)
+            candidates = cost[j - 1, k] + (cum[i] - cum[k] - share[j - 1]) ** 2
+            best = int(np.argmin(candidates))
+            cost[j, i] = candidates[best]
+            back[j, i] = k[best]
+
+    starts = []
+    i = n_regions
+    for j in range(n_sentences, 0, -1):
+        i = back[j, i]
+        starts.append(int(i))
+    return starts[::-1]
+
+
+def align_script_to_audio(
+    audio: np.ndarray,
+    sample_rate: int,
+    script_text: str,
+    speaker: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    発話区間と脚本の文を対応付け、jsonize_agent と同じ形式の
+    {"scene_elements": [...]} を返す。対応付けが曖昧な場合は None。
+    speaker を渡すと全ての文をその話者にする（省略時はナレーションの印から文ごとに決める）。
+    """
+    return align_script_to_regions(detect_speech_regions(audio, sample_rate), script_text, speaker)
+
+
+def align_script_to_regions(
+    regions: np.ndarray,
+    script_text: str,
+    speaker: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """検出済みの発話区間（(K, 2) の [開始, 終了] 秒）と脚本の文を対応付ける。"""
+    attributed = split_script_with_speakers(script_text)
+    sentences = [sentence for sentence, _ in attributed]
+    if not sentences or len(regions) < len(sentences):
+        logging.info(
+            f"Local alignment ambiguous: {len(regions)} speech regions for {len(sentences)} sentences."
+        )
+        return None
+
+    weights = np.array([_spoken_length(s) for s in sentences], dtype=np.float64)
+    durations = regions[:, 1] - regions[:, 0]
+    starts = _assign_regions(durations, weights)
+    if starts is None:
+        return None
+    bounds = starts + [len(regions)]
+
+    # 割り当てた長さが文字数から見て極端にずれていれば曖昧とみなす
+    total_speech = durations.sum()
+    expected = weights / weights.sum() * total_speech
+    actual = np.array([durations[bounds[j]:bounds[j + 1]].sum() for j in range(len(sentences))])
+    ratio = actual / expected
+    if np.any(ratio > MAX_DURATION_RATIO) or np.any(ratio < 1.0 / MAX_DURATION_RATIO):
+        logging.info(f"Local alignment ambiguous: duration ratios {np.round(ratio, 2).tolist()}.")
+        return None
+
+    scene_elements = []
+    for j, (sentence, sentence_speaker) in enumerate(attributed):
+        scene_elements.append({
+            "speaker": speaker or sentence_speaker,
+            "script": sentence,
+            "start_time": round(float(regions[bounds[j], 0]), 3),
+            "end_time": round(float(regions[bounds[j + 1] - 1, 1]), 3),
+        })
+    return {"scene_elements": scene_elements}
+
+
+def align_script_to_wav(wav_path: str, script_text: str) -> Optional[str]:
+    """
+    WAVファイルと脚本からタイムスタンプ付きJSON文字列を生成する。曖昧なら None。
+    発話区間はTTSの後に保存した解析結果（audio_analysis.py）から読み、音声は読み込まない。
+    """
+    timed_script = align_script_to_regions(np.asarray(load_analysis(wav_path).regions), script_text)
+    if timed_script is None:
+        return None
+    return json.dumps(timed_script, ensure_ascii=False, indent=2)
@@ -0,0 +1,270 @@
+"""
+TTS音声の解析結果（フレーム毎の特徴量）の共有
+
+無音のトリミング、発話区間と間（ポーズ）の検出、RMS など、複数の工程が同じ音声から同じ特徴量を求めている。
+ここではTTSの直後に1回だけフレーム毎の特徴量をまとめて求め、WAVの隣に <名前>.analysis.npz として保存する。
+後の工程はこのファイルをメモリマップで読む（配列をコピーせず、必要な部分だけがページインされる）。
+保存するのはパイプラインが作ったTTS音声についてだけで、それ以外のWAV（利用者の入力など）は
+読み込み時にメモリ上で解析し、隣にファイルを作らない。
+
+- フレームは audio_align の発話区間検出と同じ（32ms の窓を 10ms ずつずらす、中心合わせなし）
+- rms / rms_db: フレーム毎のRMS（線形）と、最大のフレームを基準にした dB
+- onset: メルスペクトルの正の差分（スペクトルフラックス）によるオンセット強度
+- voiced: 発話とみなすフレーム（rms_db が SILENCE_THRESHOLD_DB を超える）
+- silent: 信号がほぼ無いフレーム（RMS が SILENT_FLOOR_DBFS 未満）
+- regions / pauses: 発話区間と、その間の無音区間（[開始, 終了] 秒）
+- 保存時のWAVの大きさと更新時刻を記録し、WAVが変わっていれば読み込み時に解析し直す
+- 無音のトリミング（wav_to_asmr / asmr_spatialize）は保存済みの解析結果がある時だけそれを使い、
+  無ければ従来どおり librosa.effects.trim で求める（トリミングのためだけに全特徴量は求めない）
+
+npz は非圧縮で保存する（圧縮するとメモリマップできない）。
+"""
+
+import logging
+import os
+import struct
+import zipfile
+from typing import Dict, Optional, Tuple
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from ..telemetry import current_telemetry
+
+# 発話区間検出のフレーム設定（秒単位で指定し、サンプルレートに合わせて換算）
+FRAME_SEC = 0.032
+HOP_SEC = 0.010
+# ピーク基準でこれより静かなフレームを無音とみなす
+SILENCE_THRESHOLD_DB = -40.0
+# これより短い無音は句読点内の息継ぎとみなして発話区間を結合する
+MIN_PAUSE_SEC = 0.25
+# これより短い発話区間はノイズとして捨てる
+MIN_SPEECH_SEC = 0.08
+# RMS（dBFS）がこれ未満のフレームは信号が無いとみなす
+SILENT_FLOOR_DBFS = -90.0
+# オンセット強度のメルバンド数
+ONSET_N_MELS = 40
+# 保存形式を変えたら上げる（古いファイルは読み込み時に作り直す）
+ANALYSIS_VERSION = 1
+
+
+def _frame_sizes(sample_rate: int) -> Tuple[int, int]:
+    return max(1, int(round(FRAME_SEC * sample_rate))), max(1, int(round(HOP_SEC * sample_rate)))
+
+
+def _mono_float(audio: np.ndarray, min_length: int = 0) -> np.ndarray:
+    if audio.ndim > 1:
+        audio = np.mean(audio, axis=1)
+    audio = audio.astype(np.float32, copy=False)
+    if len(audio) < min_length:
+        audio = np.pad(audio, (0, min_length - len(audio)))
+    return audio
+
+
+def frame_rms(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    """フレーム毎のRMS（線形、ベクトル化）。"""
+    frame, hop = _frame_sizes(sample_rate)
+    frames = np.lib.stride_tricks.sliding_window_view(_mono_float(audio, frame), frame)[::hop]
+    return np.sqrt(np.mean(frames.astype(np.float64) ** 2, axis=1))
+
+
+def _relative_db(rms: np.ndarray) -> np.ndarray:
+    peak = np.max(rms) if len(rms) else 0.0
+    if peak <= 0:
+        return np.full(len(rms), -np.inf)
+    return 20.0 * np.log10(np.maximum(rms, 1e-12) / peak)
+
+
+def frame_rms_db(audio: np.ndarray, sample_rate: int) -> np.ndarray:
+    """フレーム毎のRMSをピーク基準のdBで返す（ベクトル化）。"""
+    return _relative_db(frame_rms(audio, sample_rate))
+
+
+def speech_regions(voiced: np.ndarray, sample_rate: int, num_samples: int, min_pause_sec: float = MIN_PAUSE_SEC,
+                   min_speech_sec: float = MIN_SPEECH_SEC) -> np.ndarray:
+    """フレーム毎の有声フラグから、(K, 2) の [開始, 終了] 秒の発話区間を求める。"""
+    frame, hop = _frame_sizes(sample_rate)
+    hop_sec, frame_sec = hop / sample_rate, frame / sample_rate
+    if not np.any(voiced):
+        return np.zeros((0, 2))
+
+    # 有声フレームの連続区間の境界を差分で求める
+    edges = np.diff(np.concatenate([[0], voiced.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1) * hop_sec
+    ends = np.flatnonzero(edges == -1) * hop_sec + (frame_sec - hop_sec)
+
+    # 短い無音を挟む区間を結合
+    gaps = starts[1:] - ends[:-1]
+    keep = np.concatenate([[True], gaps >= min_pause_sec])
+    group = np.cumsum(keep) - 1
+    merged_starts = starts[keep]
+    merged_ends = np.zeros(len(merged_starts))
+    np.maximum.at(merged_ends, group, ends)
+
+    regions = np.stack([merged_starts, merged_ends], axis=1)
+    regions[:, 1] = np.minimum(regions[:, 1], num_samples / sample_rate)
+    return regions[(regions[:, 1] - regions[:, 0]) >= min_speech_sec]
+
+
+def _onset_strength(audio: np.ndarray, sample_rate: int, n_frames: int) -> np.ndarray:
+    """RMSと同じフレームのオンセット強度（メルスペクトルのフラックス）。"""
+    frame, hop = _frame_sizes(sample_rate)
+    mel = librosa.feature.melspectrogram(y=_mono_float(audio, frame), sr=sample_rate, n_fft=frame, hop_length=hop,
+                                         center=False, n_mels=ONSET_N_MELS)
+    onset = librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sample_rate, center=False)
+    return onset[:n_frames].astype(np.float32)
+
+
+class AudioAnalysis:
+    """1つのTTS音声のフレーム毎の特徴量。配列はメモリマップ（読み込み時）か通常の配列（解析直後）。"""
+
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.sample_rate = int(arrays["sample_rate"])
+        self.num_samples = int(arrays["num_samples"])
+        self.hop = int(arrays["hop"])
+        self.frame = int(arrays["frame"])
+        self.rms = arrays["rms"]
+        self.rms_db = arrays["rms_db"]
+        self.onset = arrays["onset"]
+        self.voiced = arrays["voiced"]
+        self.silent = arrays["silent"]
+        self.regions = arrays["regions"]
+        self.pauses = arrays["pauses"]
+        self._meta = {key: arrays[key] for key in ("version", "source_size", "source_mtime_ns") if key in arrays}
+
+    @property
+    def duration(self) -> float:
+        return self.num_samples / self.sample_rate
+
+    @property
+    def times(self) -> np.ndarray:
+        """各フレームの開始時刻（秒）。"""
+        return np.arange(len(self.rms)) * self.hop / self.sample_rate
+
+    def trim_bounds(self, top_db: float = 60.0, sample_rate: Optional[int] = None) -> Tuple[int, int]:
+        """
+        最大のフレームから top_db 以内のフレームが続く範囲 [開始, 終了)（サンプル）。librosa.effects.trim の代わり。
+        sample_rate を指定すると、そのレートに変換した音声でのサンプル位置で返す。
+        """
+        rate = sample_rate or self.sample_rate
+        scale = rate / self.sample_rate
+        loud = np.flatnonzero(self.rms_db > -top_db)
+        if len(loud) == 0:
+            return 0, 0
+        start = int(loud[0]) * self.hop
+        end = min(self.num_samples, int(loud[-1]) * self.hop + self.frame)
+        return int(round(start * scale)), min(int(round(end * scale)), int(np.ceil(self.num_samples * scale)))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        return {"sample_rate": self.sample_rate, "num_samples": self.num_samples, "frame": self.frame,
+                "hop": self.hop, "rms": self.rms, "rms_db": self.rms_db, "onset": self.onset,
+                "voiced": self.voiced, "silent": self.silent, "regions": self.regions, "pauses": self.pauses,
+                **self._meta}
+
+
+def analyze_audio(audio: np.ndarray, sample_rate: int) -> AudioAnalysis:
+    """音声のフレーム毎の特徴量を求める。"""
+    frame, hop = _frame_sizes(sample_rate)
+    rms = frame_rms(audio, sample_rate)
+    rms_db = _relative_db(rms)
+    voiced = rms_db > SILENCE_THRESHOLD_DB
+    regions = speech_regions(voiced, sample_rate, len(audio))
+    pauses = np.stack([regions[:-1, 1], regions[1:, 0]], axis=1) if len(regions) > 1 else np.zeros((0, 2))
+    return AudioAnalysis({
+        "sample_rate": sample_rate, "num_samples": len(audio), "frame": frame, "hop": hop,
+        "rms": rms.astype(np.float32), "rms_db": rms_db.astype(np.float32),
+        "onset": _onset_strength(audio, sample_rate, len(rms)),
+        "voiced": voiced, "silent": rms < 10 ** (SILENT_FLOOR_DBFS / 20),
+        "regions": regions, "pauses": pauses, "version": ANALYSIS_VERSION,
+    })
+
+
+def analysis_path(wav_path: str) -> str:
+    return os.path.splitext(wav_path)[0] + ".analysis.npz"
+
+
+def _source_stamp(wav_path: str) -> Tuple[int, int]:
+    stat = os.stat(wav_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def analyze_wav(wav_path: str, save: bool = True) -> AudioAnalysis:
+    """
+    WAVを解析する。save=True なら隣に <名前>.analysis.npz として保存する（パイプラインのTTS音声について、
+    TTSの直後に1回だけ呼ぶ）。保存できなくても（読み取り専用のディレクトリなど）、解析結果はそのまま返す。
+    """
+    with current_telemetry().span("analysis.compute"):
+        audio, sample_rate = sf.read(wav_path, dtype="float32")
+        analysis = analyze_audio(audio, sample_rate)
+    size, mtime_ns = _source_stamp(wav_path)
+    analysis._meta.update(source_size=size, source_mtime_ns=mtime_ns)
+    if not save:
+        return analysis
+    path = analysis_path(wav_path)
+    # 書きかけのファイルを他のプロセスが読まないよう、一時ファイルから置き換える
+    tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+    try:
+        np.savez(tmp_path, **analysis.to_arrays())
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Audio analysis not saved, using it in memory: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return analysis
+    logging.info(f"Saved audio analysis: {path} ({len(analysis.rms)} frames, {len(analysis.regions)} speech regions)")
+    return analysis
+
+
+def _mmap_npz(path: str) -> Dict[str, np.ndarray]:
+    """非圧縮の npz の各配列をメモリマップで開く（np.load は npz の mmap_mode を無視するため、zip内の位置を直接使う）。"""
+    arrays = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            name = info.filename[:-4] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path}: {name} is compressed and cannot be memory-mapped")
+            # ローカルファイルヘッダー（30バイト + ファイル名 + 拡張フィールド）の後にnpyが続く
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, fortran_order, dtype = read_header(f)
+            if len(shape) == 0 or 0 in shape:
+                # スカラーと空の配列はマップできないので読み込む
+                with zf.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                     order="F" if fortran_order else "C")
+    return arrays
+
+
+def saved_analysis(wav_path: str) -> Optional[AudioAnalysis]:
+    """
+    保存済みの解析結果をメモリマップで開く。ファイルが無いか、読めないか、WAVが解析後に変わっていれば None
+    （解析し直さない。一部の特徴量だけが要る呼び出し側は、None なら自分で軽く求める）。
+    """
+    path = analysis_path(wav_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        arrays = _mmap_npz(path)
+        stamp = (int(arrays.get("source_size", -1)), int(arrays.get("source_mtime_ns", -1)))
+        if int(arrays.get("version", 0)) == ANALYSIS_VERSION and stamp == _source_stamp(wav_path):
+            current_telemetry().record("analysis.load", kind="analysis", frames=len(arrays["rms"]))
+            return AudioAnalysis(arrays)
+        logging.info(f"Audio analysis is out of date: {path}")
+    except (ValueError, OSError, KeyError, zipfile.BadZipFile) as e:
+        logging.warning(f"Failed to read audio analysis {path}: {e}")
+    return None
+
+
+def load_analysis(wav_path: str) -> AudioAnalysis:
+    """
+    WAVの解析結果をメモリマップで開く。ファイルが無いか、WAVが解析後に変わっていれば解析し直す
+    （保存はしない。保存するのは analyze_wav を呼ぶTTSだけ）。
+    """
+    analysis = saved_analysis(wav_path)
+    return analysis if analysis is not None else analyze_wav(wav_path, save=False)
@@ -1,59 +1,159 @@
 import os
+import argparse
+import functools
+import time
 import numpy as np
 import json
 import spaudiopy as spa
-import scipy.signal
 import scipy.interpolate
 from pedalboard import Pedalboard, Reverb, LowShelfFilter
 import librosa
+import yaml
 import soundfile as sf
-from typing import Dict, List, Any, Tuple
+import soxr
+from typing import Callable, Dict, List, Any, Optional, Sequence, Tuple, Union
 import logging
+from ..telemetry import current_telemetry
+from . import ambisonics, mastering, sofa_hrtf, synthetic_hrtf
+from .ambisonics import SPATIAL_MODE
+from .export import export_audio
+from .fft_backend import get_backend, next_fast_len
+from .hrtf_cache import PreparedHRTF, as_prepared, get_hrtf_cache
+from .hrtf_compact import COMPACT_ENABLED, load_compact_hrirs
+from .plan_compiler import compile_plan
+from .render_trace import RenderTrace
 
 logging.basicConfig(level=logging.INFO)
 
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
 TARGET_FS = 48000
 MIN_DISTANCE = 0.1
 PROXIMITY_THRESHOLD = 0.5
+BLOCK_SIZE = 1024
+_render_config = config.get("render", {})
+# 入力のサンプルレート（TTSの24kHzなど）のままレンダリングし、HRTFをそのレートに合わせる
+NATIVE_RATE = _render_config.get("native_rate", False)
+# ネイティブレートでレンダリングした最終出力だけを TARGET_FS に変換するか
+UPSAMPLE_OUTPUT = _render_config.get("upsample_output", True)
+# 入力ブロックの全サンプルがこれ（dBFS）未満なら無音とみなして畳み込みを省く。null で無効
+SILENCE_GATE_DB = _render_config.get("silence_gate_db", -90.0)
+# "default": spaudiopy の既定HRTF（初回はダウンロード） / "synthetic": 球頭モデル（tools/synthetic_hrtf.py、オフライン）
+# / "dummy": spaudiopy のダミーHRIR
+HRTF_SOURCE = config.get("hrtf", {}).get("source", "default")
+# 方位角の揺らぎ（ジッター）の乱数シード。固定することで、一部区間だけのレンダリングでも同じ揺らぎになる
+JITTER_SEED = 20240917
+
+class RenderCancelledError(Exception):
+    """cancel_check が True を返したためレンダリングを中断した。"""
 
-def make_asmr_audio(audio_data: np.ndarray, sample_rate: int, spatial_plan_json: List[Dict[str, Any]]) -> Tuple[np.ndarray, int]:
+def make_asmr_audio(audio_data: np.ndarray, sample_rate: int, spatial_plan_json: List[Dict[str, Any]],
+                    cancel_check: Optional[Callable[[], bool]] = None,
+                    trace: Optional[RenderTrace] = None, normalize: bool = True,
+                    sources: Optional[List[Dict[str, Any]]] = None, mode: Optional[str] = None,
+                    native_rate: Optional[bool] = None, hrtf_source: Optional[str] = None) -> Tuple[np.ndarray, int]:
+    """
+    sources には声以外の音源（衣擦れ・吐息など）を
+    {"audio": ndarray, "sample_rate": int, "spatial_plan": [...], "start": 秒, "gain": 倍率} で渡す。
+    spatial_plan の時刻は全体の時間軸。出力は最も遅く終わる音源までの長さになる。
+    近接効果とリバーブの量は声の空間プランに従う。sources を渡した場合、trace は記録しない。
+    mode は "direct"（HRIRの畳み込み）または "ambisonic"（Ambisonicsバス経由、trace は記録しない）。
+    省略時は config.yaml の render.spatial_mode。
+    native_rate=True なら TARGET_FS より低い入力をそのレートでレンダリングし（HRTFもそのレートに変換）、
+    upsample_output が有効なら最終出力だけを TARGET_FS に変換する。省略時は config.yaml の render.native_rate。
+    hrtf_source は聴取者ごとのHRTF（hrtf.source と同じ識別子: default / synthetic / dummy / SOFAファイルのパス）。
+    省略時は config.yaml の hrtf.source。読み込んだHRTFはプロセス内のLRUキャッシュで使い回す。
+    """
+    mode = mode or SPATIAL_MODE
+    fs, block_size = _render_rate(sample_rate, native_rate)
+    if mode not in ("direct", "ambisonic"):
+        raise ValueError(f"Unknown spatial mode: {mode}")
     logging.info("Starting ASMR rendering (Crystal Clear Mode)...")
+    telemetry = current_telemetry()
+    render_start = time.perf_counter()
 
     # 1. 前処理
-    audio_float = _preprocess_audio(audio_data, sample_rate)
-    duration_sec = len(audio_float) / TARGET_FS
+    with telemetry.span("render.preprocess"):
+        audio_float = _preprocess_audio(audio_data, sample_rate, fs)
+    duration_sec = len(audio_float) / fs
 
     # 2. HRTFのロード
-    hrtf = _load_hrtf(TARGET_FS)
+    with telemetry.span("render.hrtf_load"):
+        if mode == "ambisonic":
+            sh_filters = _sh_filters(fs, hrtf_source)
+        else:
+            hrtf = _prepared_hrtf(fs, hrtf_source)
 
-    # 3. 空間プランの補間関数作成
-    interpolators = _create_interpolators(spatial_plan_json, duration_sec)
+    # 3. 空間プランの検証・間引きと補間関数作成
+    interpolators = _create_interpolators(compile_plan(spatial_plan_json), duration_sec)
 
     # 4. 動的バイノーラルレンダリング (Dry信号)
-    output_dry, distance_curve = _render_binaural_dynamic_crossfade(audio_float, hrtf, interpolators)
+    output_length = len(audio_float)
+    with telemetry.span("render.convolution"):
+        if sources or mode == "ambisonic":
+            scene = [(audio_float, interpolators, 0, 1.0)] + _prepare_sources(sources or [], duration_sec, fs)
+            output_length = max(start + len(audio) for audio, _, start, _ in scene)
+            if mode == "ambisonic":
+                output_dry = _render_ambisonic_sources(scene, sh_filters, output_length, block_size=block_size,
+                                                       cancel_check=cancel_check, fs=fs)
+            else:
+                # 全音源をブロック毎に周波数領域で足し合わせ、逆FFTは耳ごとに1回にする
+                output_dry = _render_binaural_sources(scene, hrtf, output_length, block_size=block_size,
+                                                      cancel_check=cancel_check, fs=fs)
+            avg_distance = _mean_block_distance(interpolators, len(audio_float), block_size, fs)
+        else:
+            output_dry, distance_curve = _render_binaural_dynamic_crossfade(audio_float, hrtf, interpolators, block_size=block_size,
+                                                                            cancel_check=cancel_check, trace=trace, fs=fs)
+            avg_distance = np.mean(distance_curve)
+
+    # 5〜7. 近接効果・リバーブ・後処理
+    output_final, output_fs = _finish_render(output_dry, avg_distance, interpolators, output_length, normalize, fs)
 
+    render_sec = time.perf_counter() - render_start
+    telemetry.record("render", duration_sec=render_sec, audio_sec=duration_sec,
+                     real_time_factor=render_sec / duration_sec if duration_sec > 0 else None)
+    logging.info("Rendering finished.")
+    return output_final, output_fs
+
+def _finish_render(output_dry, avg_distance, interpolators, output_length, normalize, fs=TARGET_FS, reverb=None):
+    """
+    畳み込み後の処理（近接効果・リバーブ・出力レートへの変換・正規化・マスタリング・長さの切り詰め）。
+    reverb はリバーブのパラメータ（room_size / damping / wet_level）の上書き。
+    """
+    telemetry = current_telemetry()
     # 5. 近接効果（低音ブースト）のみ微適用
-    avg_distance = np.mean(distance_curve)
-    output_processed = _apply_proximity(output_dry, avg_distance)
+    with telemetry.span("render.proximity"):
+        output_processed = _apply_proximity(output_dry, avg_distance, fs)
 
     # 6. リバーブ処理（極小）
-    output_final = _apply_dynamic_reverb(output_processed, interpolators)
+    with telemetry.span("render.reverb"):
+        output_final = _apply_dynamic_reverb(output_processed, interpolators, fs=fs, reverb=reverb)
 
     # 7. 後処理
-    max_val = np.max(np.abs(output_final))
-    if max_val > 0:
-        # ピークギリギリまで音量を戻してクリアさを保つ
-        target_peak = 0.98
-        output_final = output_final * (target_peak / max_val)
-
-    output_final = _postprocess_audio(output_final, len(audio_float))
+    output_fs = fs
+    if fs != TARGET_FS and UPSAMPLE_OUTPUT:
+        with telemetry.span("render.upsample"):
+            output_final = librosa.resample(output_final, orig_sr=fs, target_sr=TARGET_FS, res_type='soxr_vhq', axis=0)
+        output_length = int(np.ceil(output_length * TARGET_FS / fs))
+        output_fs = TARGET_FS
+    if normalize:
+        output_final = _normalize_peak(output_final)
+    if mastering.MASTERING_ENABLED:
+        output_final = _apply_mastering(output_final, output_fs, normalize)
 
-    logging.info("Rendering finished.")
-    return output_final, TARGET_FS
+    return _postprocess_audio(output_final, output_length), output_fs
 
 # --- ヘルパー関数群 ---
 
-def _preprocess_audio(audio_data, sample_rate):
+def _render_rate(sample_rate, native_rate=None):
+    """レンダリングのレートとブロック長。"""
+    native_rate = NATIVE_RATE if native_rate is None else native_rate
+    fs = sample_rate if native_rate and sample_rate < TARGET_FS else TARGET_FS
+    # ブロックの時間長はレートによらず同じにする（パラメータの更新間隔と揺らぎの系列を揃える）
+    return fs, BLOCK_SIZE * fs // TARGET_FS
+
+def _preprocess_audio(audio_data, sample_rate, fs=TARGET_FS):
     if audio_data.ndim > 1:
         audio_data = np.mean(audio_data, axis=1)
     if not np.issubdtype(audio_data.dtype, np.floating):
@@ -62,26 +162,141 @@ def _preprocess_audio(audio_data, sample_rate):
         else:
             audio_data = audio_data.astype(np.float32)
     audio_data = np.squeeze(audio_data)
-    if sample_rate != TARGET_FS:
+    if sample_rate != fs:
         # リサンプリングの劣化を防ぐため最高品質を指定
-        audio_data = librosa.resample(audio_data, orig_sr=sample_rate, target_sr=TARGET_FS, res_type='soxr_vhq')
+        audio_data = librosa.resample(audio_data, orig_sr=sample_rate, target_sr=fs, res_type='soxr_vhq')
     return audio_data.astype(np.float32)
 
-def _load_hrtf(fs):
+def _load_hrtf(fs, source=None):
+    return _load_hrtf_from(source or HRTF_SOURCE, fs)
+
+def _load_hrtf_from(source, fs):
+    if sofa_hrtf.is_sofa(source):
+        return sofa_hrtf.SofaHRIRs(source, fs)
+    if source == "synthetic":
+        return synthetic_hrtf.spherical_head_hrirs(fs)
+    if source == "dummy":
+        return spa.io.load_hrirs(fs, filename="dummy")
+    if source != "default":
+        raise ValueError(f"Unknown HRTF source: {source}")
     try:
         return spa.io.load_hrirs(fs=fs)
     except Exception:
         return spa.io.load_hrirs(fs=fs)
 
+# spaudiopy が既定のHRTFを用意しているサンプルレート
+_HRTF_NATIVE_RATES = (44100, 48000, 96000)
+
+def _load_hrtf_at_rate(fs, source):
+    """
+    fs のHRIR（キャッシュなし）。既定のHRTFがないレート（24kHzなど）は、TARGET_FS のものを変換する。
+    SOFAのHRTFは方向ごとに読む時に変換するので、そのまま fs で開く。
+    """
+    if fs in _HRTF_NATIVE_RATES or sofa_hrtf.is_sofa(source):
+        return _load_hrtf(fs, source)
+    return _resample_hrtf(_load_hrtf(TARGET_FS, source), fs)
+
+def _original_hrtf(fs, source=None):
+    """fs の元のHRIR（コンパクト化していないもの）を、HRTFのLRUキャッシュ（hrtf_cache.py）から返す。"""
+    source = source or HRTF_SOURCE
+    return get_hrtf_cache().get(("original", source, fs), lambda: PreparedHRTF(_load_hrtf_at_rate(fs, source)))
+
+def _hrtf_at_rate(fs, source=None):
+    return _original_hrtf(fs, source).hrtf
+
+def _prepared_hrtf(fs, source=None):
+    """
+    source（hrtf.source と同じ識別子。省略時は設定の値）のレンダリング用HRTF。設定が有効なら最小位相化・
+    切り詰め済みのもの（hrtf_compact.py）。LRUキャッシュから返すので、同じ識別子・レートなら読み込み・変換・
+    コンパクト化と、方向の索引・周波数特性を使い回す。
+    コンパクト化は全方向を読んで解析するため、方向ごとに読むSOFAのHRTFはそのまま使う。
+    """
+    source = source or HRTF_SOURCE
+    original = _original_hrtf(fs, source)
+    if not COMPACT_ENABLED or isinstance(original.hrtf, sofa_hrtf.SofaHRIRs):
+        return original
+    # 元のセットもキャッシュに残るが、使われなければ先に追い出される
+    return get_hrtf_cache().get(("compact", source, fs),
+                                lambda: PreparedHRTF(load_compact_hrirs(original.hrtf, memory_cache=False)))
+
+def _resample_hrtf(hrtf, fs):
+    # HRIRの各方向をチャンネルとして一度に変換する。
+    # インパルス応答は1サンプルあたりの重みなので、周波数特性を保つにはレートの比を掛ける
+    scale = hrtf.fs / fs
+    left = soxr.resample(hrtf.left.T, hrtf.fs, fs, quality='VHQ').T * scale
+    right = soxr.resample(hrtf.right.T, hrtf.fs, fs, quality='VHQ').T * scale
+    return spa.sig.HRIRs(np.ascontiguousarray(left), np.ascontiguousarray(right), hrtf.azi, hrtf.zen, fs)
+
+def _get_hrtf(fs, source=None):
+    """レンダリングに使うHRIRセット（_prepared_hrtf の中身）。"""
+    return _prepared_hrtf(fs, source).hrtf
+
+def _sh_filters(fs, source=None):
+    """Ambisonicsのデコードに使うSH領域のフィルタ。遅延を分離していない元のHRIRから求め、LRUキャッシュに入れる。"""
+    source = source or HRTF_SOURCE
+    order = ambisonics.AMBISONIC_ORDER
+    return get_hrtf_cache().get(("sh", source, fs, order),
+                                lambda: ambisonics.sh_binaural_filters(_hrtf_at_rate(fs, source), order))
+
+def _ear_offsets(hrtf, idx):
+    """コンパクト化したHRTFの、耳ごとの整数遅延（元のHRTFなら None）。"""
+    offsets = getattr(hrtf, 'offsets', None)
+    return None if offsets is None else offsets[idx]
+
+def _offset_key(hrtf, idx):
+    """方向 idx の耳ごとの整数遅延（同じ遅延の寄与は周波数領域でまとめて逆変換できる）。"""
+    offsets = _ear_offsets(hrtf, idx)
+    return None if offsets is None else (int(offsets[0]), int(offsets[1]))
+
+def _hrir_span(hrtf):
+    """1サンプルの入力が出力に影響する長さ（HRIRの長さ + 最大の遅延）。出力バッファとプリロールの長さに使う。"""
+    offsets = getattr(hrtf, 'offsets', None)
+    return hrtf.left.shape[1] + (int(offsets.max()) if offsets is not None else 0)
+
+def _filter_length(hrtf):
+    """畳み込むフィルタの長さ。耳ごとの整数遅延は出力位置のずらしで与えるので、FFT長には含めない。"""
+    return hrtf.left.shape[1]
+
+def _hrir_spectra(hrtf, ear_plan):
+    """
+    方向 idx のHRIR（整数遅延を除いたフィルタ）の周波数特性を返す関数。ear_plan は2chのFFTプラン。
+    方向ごとにキャッシュするので、ブロック毎の畳み込みで変換するのは入力と出力だけになる。
+    hrtf が PreparedHRTF なら、そのキャッシュ（同じHRTFを使うレンダリングの間で共有）に入れる。
+    """
+    prepared = as_prepared(hrtf)
+    hrtf = prepared.hrtf
+    cache = prepared.spectra((ear_plan.n, str(ear_plan.backend.complex_dtype)))
+
+    def spectrum(idx):
+        if idx not in cache:
+            cache[idx] = ear_plan.forward(np.stack([hrtf.left[idx], hrtf.right[idx]], axis=1))
+        return cache[idx]
+    return spectrum
+
+def _add_contribution(groups, offsets, contribution):
+    """耳ごとの整数遅延が同じ寄与を、周波数領域で足し合わせる。"""
+    groups[offsets] = contribution if offsets not in groups else groups[offsets] + contribution
+
+def _overlap_add(output, groups, ear_plan, start, length):
+    """寄与を遅延ごとに逆変換し、耳ごとの整数遅延だけずらして出力に足す。逆変換の本数を返す。"""
+    for offsets, mixed in groups.items():
+        block = ear_plan.inverse(mixed)[:length]
+        if offsets is None:
+            output[start:start + len(block)] += block
+            continue
+        for ear, offset in enumerate(offsets):
+            output[start + offset:start + offset + len(block), ear] += block[:, ear]
+    return len(groups)
+
 def _create_interpolators(spatial_plan, duration):
-    if not spatial_plan:
+    if len(spatial_plan) == 0:
         default_plan = [{"time": 0.0, "azimuth": 0, "elevation": 0, "distance": 1.0, "reverb_mix": 0.0}]
-        spatial_plan = default_plan
-    times = np.array([p['time'] for p in spatial_plan])
+        spatial_plan = compile_plan(default_plan)
+    times = spatial_plan['time'].astype(np.float64)
     adjusted_times = times.copy()
     values_dict = {}
     for param in ['azimuth', 'elevation', 'distance', 'reverb_mix']:
-        values = np.array([p[param] for p in spatial_plan])
+        values = spatial_plan[param].astype(np.float64)
         if times[0] > 0:
             values = np.insert(values, 0, values[0])
         if times[-1] < duration:
@@ -98,64 +313,359 @@ def _create_interpolators(spatial_plan, duration):
         )
     return interpolators
 
-def _get_hrir_and_attenuation(hrtf, azimuth, elevation, distance):
-    az_rad = np.deg2rad(-azimuth) 
-    zen_rad = np.deg2rad(90 - elevation)
-    x_hrtf, y_hrtf, z_hrtf = spa.utils.sph2cart(hrtf.azi, hrtf.zen)
-    x_target, y_target, z_target = spa.utils.sph2cart(az_rad, zen_rad)
-    distances = np.sqrt((x_hrtf - x_target)**2 + (y_hrtf - y_target)**2 + (z_hrtf - z_target)**2)
-    nearest_idx = np.argmin(distances)
-    hrir_l = hrtf.left[nearest_idx, :]
-    hrir_r = hrtf.right[nearest_idx, :]
+def _lookup_hrir(hrtf, azimuth, elevation, distance):
+    # PreparedHRTF なら方向の索引（単位ベクトル）を作り直さずに使う
+    prepared = as_prepared(hrtf)
+    nearest_idx = prepared.nearest(azimuth, elevation)
+    hrir_l = prepared.hrtf.left[nearest_idx, :]
+    hrir_r = prepared.hrtf.right[nearest_idx, :]
     hrir = np.vstack([hrir_l, hrir_r]).T
+    return nearest_idx, hrir, _distance_attenuation(distance)
+
+def _distance_attenuation(distance):
     eff_distance = max(distance, MIN_DISTANCE)
-    attenuation = 1.0 / (eff_distance ** 1.0) 
+    return 1.0 / (eff_distance ** 1.0)
+
+def _get_hrir_and_attenuation(hrtf, azimuth, elevation, distance):
+    _, hrir, attenuation = _lookup_hrir(hrtf, azimuth, elevation, distance)
     return hrir, attenuation
 
-def _render_binaural_dynamic_crossfade(audio_data, hrtf, interpolators, block_size=1024):
+# ブロック毎のFFT本数（入力1chの順変換 + 出力2chの逆変換。クロスフェード時は順変換がもう1本増え、
+# 新旧のHRIRの整数遅延が違えば逆変換ももう1回増える。HRIRの変換は方向ごとにキャッシュするので数えない）
+_FFTS_PER_BLOCK = 3
+
+def _is_silent(block):
+    """
+    ブロックのピークが SILENCE_GATE_DB 未満か（ゲートが無効なら常に False）。
+    RMSではなくピークで判定し、ブロックの終わり際に始まる発音（リサンプラーのプリリンギングを含む）を落とさない。
+    """
+    if SILENCE_GATE_DB is None or len(block) == 0:
+        return False
+    return float(np.max(np.abs(block))) < 10 ** (SILENCE_GATE_DB / 20)
+
+def _report_silence_gate(blocks, skipped):
+    """畳み込みを省いたブロックの割合をログとテレメトリに残す。"""
+    if blocks == 0:
+        return
+    logging.info(f"Silence gate: skipped {skipped}/{blocks} blocks ({skipped / blocks:.1%})")
+    current_telemetry().record("render.silence_gate", kind="silence_gate", blocks=blocks, skipped=skipped,
+                               skipped_ratio=skipped / blocks)
+
+def _fft_length(block_size, filter_length):
+    """ブロック長 block_size の入力と、長さ filter_length のHRIRの畳み込みに使うFFT長。"""
+    return next_fast_len(block_size + filter_length - 1)
+
+class BlockSpectra:
+    """
+    入力の各ブロック（block_size ごと）の周波数特性。同じ入力を複数の空間プランでレンダリングする時に共有する。
+    precompute=True なら全ブロックをまとめて変換しておき、False ならブロック毎にその場で変換する。
+    共有時は、クロスフェードしたブロックのフェードアウト・フェードイン側も、最初に必要になった時に変換して残す。
+    （全体との差で求めると丸め誤差の分だけ単独のレンダリングと結果が変わるため、どちらも変換する）
+    """
+
+    def __init__(self, audio_data, block_size, n_fft, precompute=False):
+        self.audio = audio_data
+        self.block_size = block_size
+        self.n = n_fft
+        self._fade_in = np.linspace(0, 1, block_size)
+        self._full = None
+        self._faded = {}
+        if precompute:
+            n_blocks = -(-len(audio_data) // block_size)
+            blocks = np.zeros(n_blocks * block_size)
+            blocks[:len(audio_data)] = audio_data
+            self._full = get_backend().rfft(blocks.reshape(n_blocks, block_size), n_fft, axis=1)
+
+    @property
+    def nbytes(self):
+        faded = sum(x.nbytes + y.nbytes for x, y in self._faded.values())
+        return (0 if self._full is None else self._full.nbytes) + faded
+
+    def _block(self, b):
+        return self.audio[b * self.block_size:(b + 1) * self.block_size]
+
+    def full(self, b, plan):
+        """ブロック b の周波数特性。plan はその場で変換する時に使う（FFT長 self.n の1chプラン）。"""
+        if self._full is not None:
+            return self._full[b]
+        return plan.forward(self._block(b))
+
+    def crossfade(self, b, plan):
+        """ブロック b にフェードアウト・フェードインを掛けたものの周波数特性。"""
+        faded = self._faded.get(b)
+        if faded is None:
+            block = self._block(b)
+            fade_in = self._fade_in[:len(block)]
+            faded = (plan.forward(block * (1.0 - fade_in)), plan.forward(block * fade_in))
+            if self._full is not None:
+                # 複数のスレッドが同時に変換しても結果は同じなので、ロックはしない
+                self._faded[b] = faded
+        return faded
+
+def _block_jitters(n_blocks, seed=JITTER_SEED):
+    """開始時の揺らぎと、ブロック毎の揺らぎ（先頭から n_blocks 個）。同じシードなので常に同じ系列になる。"""
+    rng = np.random.default_rng(seed)
+    initial = rng.normal(0, 1.0)
+    return initial, rng.normal(0, 0.5, n_blocks)
+
+def _block_params(interpolators, block_end_times):
+    return tuple(interpolators[p](block_end_times).astype(np.float64) for p in ('azimuth', 'elevation', 'distance'))
+
+def _state_at_block(hrtf, interpolators, first_block, block_size, initial_jitter, jitters, fs=TARGET_FS):
+    """
+    first_block 番目のブロックに入る時点で使われているHRIR。
+    ブロックのパラメータが直前のブロックから変わった時にだけHRIRを選び直すので、
+    それ以前で最後に変化したブロックのパラメータと揺らぎから求まる。
+    """
+    times = np.arange(first_block + 1) * block_size / fs
+    azi, ele, dist = _block_params(interpolators, times)
+    changed = np.flatnonzero((np.diff(azi) != 0) | (np.diff(ele) != 0) | (np.diff(dist) != 0))
+    if len(changed) == 0:
+        last_params = (float(azi[0]), float(ele[0]), float(dist[0]))
+        return _lookup_hrir(hrtf, last_params[0] + initial_jitter, last_params[1], last_params[2]), last_params
+    k = changed[-1] + 1
+    last_params = (float(azi[k]), float(ele[k]), float(dist[k]))
+    return _lookup_hrir(hrtf, last_params[0] + jitters[k - 1], last_params[1], last_params[2]), last_params
+
+def _render_binaural_dynamic_crossfade(audio_data, hrtf, interpolators, block_size=BLOCK_SIZE, cancel_check=None, trace=None,
+                                       offset=0, seed=JITTER_SEED, fs=TARGET_FS, input_spectra=None):
+    """
+    audio_data は全体の offset サンプル目（block_size の倍数）から始まる区間。hrtf はHRIRセットか PreparedHRTF。
+    input_spectra は audio_data の BlockSpectra（複数のレンダリングで共有する場合。FFT長はこのHRTFに合わせたもの）。
+    """
+    prepared = as_prepared(hrtf)
     N = len(audio_data)
-    hrir_len = hrtf.left.shape[1]
-    output_dry = np.zeros((N + hrir_len, 2))
+    length = _filter_length(prepared.hrtf)
+    output_dry = np.zeros((N + _hrir_span(prepared.hrtf), 2))
     distance_curve = np.zeros(N)
-    fade_in = np.linspace(0, 1, block_size)
-    fade_out = 1.0 - fade_in
-    start_time = 0.0
-    azi = float(interpolators['azimuth'](start_time))
-    ele = float(interpolators['elevation'](start_time))
-    dist = float(interpolators['distance'](start_time))
-    jitter_azi = np.random.normal(0, 1.0)
-    current_hrir, current_attenuation = _get_hrir_and_attenuation(hrtf, azi + jitter_azi, ele, dist)
-    last_params = (azi, ele, dist)
-    for start_idx in range(0, N, block_size):
-        end_idx = min(start_idx + block_size, N)
+    # FFT長はレンダリング全体で固定し、プランと作業配列を使い回す
+    backend = get_backend()
+    n_fft = _fft_length(block_size, length)
+    if input_spectra is None:
+        input_spectra = BlockSpectra(audio_data, block_size, n_fft)
+    elif input_spectra.n != n_fft or input_spectra.block_size != block_size:
+        raise ValueError(f"Input spectra were computed for FFT length {input_spectra.n}, this HRTF needs {n_fft}")
+    block_plan, ear_plan = backend.plan(n_fft), backend.plan(n_fft, channels=2)
+    spectrum = _hrir_spectra(prepared, ear_plan)
+    first_block = offset // block_size
+    initial_jitter, jitters = _block_jitters(first_block + -(-N // block_size), seed)
+    (current_idx, _, current_attenuation), last_params = _state_at_block(
+        prepared, interpolators, first_block, block_size, initial_jitter, jitters, fs
+    )
+    # ブロック毎のパラメータ（ブロックの終わりの時刻の値）はまとめて補間する
+    block_ends = np.minimum(np.arange(block_size, N + block_size, block_size), N)
+    block_azi, block_ele, block_dist = _block_params(interpolators, (offset + block_ends) / fs)
+    # 無音の間に変わったパラメータ（揺らぎ込み）。HRIRは音が戻ったブロックで選ぶ
+    pending = None
+    skipped = 0
+    for b, start_idx in enumerate(range(0, N, block_size)):
+        if cancel_check is not None and cancel_check():
+            raise RenderCancelledError("Rendering cancelled.")
+        if trace is not None:
+            block_cpu_start = time.process_time()
+        end_idx = block_ends[b]
         block = audio_data[start_idx:end_idx]
         actual_block_size = len(block)
-        current_time = end_idx / TARGET_FS
-        azi = float(interpolators['azimuth'](current_time))
-        ele = float(interpolators['elevation'](current_time))
-        dist = float(interpolators['distance'](current_time))
+        azi, ele, dist = float(block_azi[b]), float(block_ele[b]), float(block_dist[b])
         distance_curve[start_idx:end_idx] = dist
-        jitter_azi = np.random.normal(0, 0.5)
+        jitter_azi = jitters[(offset + start_idx) // block_size]
         new_params = (azi, ele, dist)
-        current_fade_out = fade_out[:actual_block_size]
-        current_fade_in = fade_in[:actual_block_size]
-        if new_params != last_params:
-            new_hrir, new_attenuation = _get_hrir_and_attenuation(hrtf, azi + jitter_azi, ele, dist)
-            block_fade_out = block[:, None] * current_fade_out[:, None]
-            block_fade_in = block[:, None] * current_fade_in[:, None]
-            binaural_old = scipy.signal.fftconvolve(block_fade_out, current_hrir, mode='full', axes=0) * current_attenuation
-            binaural_new = scipy.signal.fftconvolve(block_fade_in, new_hrir, mode='full', axes=0) * new_attenuation
-            binaural_block = binaural_old + binaural_new
-            current_hrir = new_hrir
-            current_attenuation = new_attenuation
-            last_params = new_params
+        changed = new_params != last_params
+        lookups = 0
+        inverses = 1
+        crossfade = False
+        # 無音のブロックは畳み込まない。それまでのブロックのHRIRの裾は重畳加算で出力済みなので、そのまま残る。
+        # HRIRの切り替えもクロスフェードせずに保留し、音が戻ったブロックで（1回だけ）選び直す
+        silent = _is_silent(block)
+        if silent:
+            skipped += 1
+            if changed:
+                pending = (azi + jitter_azi, ele, dist)
+                last_params = new_params
         else:
-            binaural_block = scipy.signal.fftconvolve(block[:, None], current_hrir, mode='full', axes=0) * current_attenuation
-        out_end_idx = start_idx + len(binaural_block)
-        output_dry[start_idx:out_end_idx] += binaural_block
+            if pending is not None:
+                current_idx, _, current_attenuation = _lookup_hrir(prepared, *pending)
+                pending = None
+                lookups += 1
+            if changed:
+                new_idx, _, new_attenuation = _lookup_hrir(prepared, azi + jitter_azi, ele, dist)
+                lookups += 1
+                # 新旧のHRIRをそれぞれ掛けたスペクトルを（整数遅延が同じなら）足してから逆変換する
+                faded_out, faded_in = input_spectra.crossfade(b, block_plan)
+                groups = {}
+                _add_contribution(groups, _offset_key(prepared.hrtf, current_idx),
+                                  faded_out[:, None] * spectrum(current_idx) * current_attenuation)
+                _add_contribution(groups, _offset_key(prepared.hrtf, new_idx),
+                                  faded_in[:, None] * spectrum(new_idx) * new_attenuation)
+                current_idx = new_idx
+                current_attenuation = new_attenuation
+                last_params = new_params
+                crossfade = True
+            else:
+                groups = {_offset_key(prepared.hrtf, current_idx):
+                          input_spectra.full(b, block_plan)[:, None] * spectrum(current_idx) * current_attenuation}
+            inverses = _overlap_add(output_dry, groups, ear_plan, start_idx, actual_block_size + length - 1)
+        if trace is not None:
+            ffts = 0 if silent else _FFTS_PER_BLOCK + int(crossfade) + 2 * (inverses - 1)
+            trace.add(offset + start_idx, azi, ele, dist, current_idx, crossfade, lookups,
+                      ffts, time.process_time() - block_cpu_start)
+    _report_silence_gate(-(-N // block_size), skipped)
     return output_dry, distance_curve
 
-def _apply_proximity(output_dry, avg_distance):
+def _render_binaural_sources(sources, hrtf, num_samples, block_size=BLOCK_SIZE, cancel_check=None, fs=TARGET_FS):
+    """
+    複数の音源を1つのバイノーラル信号にレンダリングする。
+    sources は (音声, 補間関数, 開始サンプル, ゲイン) のリスト。i 番目の音源は JITTER_SEED + i の揺らぎを使う。
+    各ブロックで音源ごとに順FFTを1回（クロスフェード時は2回）行ってHRIRの周波数特性を掛けて足し合わせ、
+    逆FFTは耳ごとに1回だけ行う。HRIRの周波数特性は方向ごとにキャッシュする。
+    各音源を _render_binaural_dynamic_crossfade で個別にレンダリングして足したものと一致する。
+    """
+    prepared = as_prepared(hrtf)
+    length = _filter_length(prepared.hrtf)
+    backend = get_backend()
+    n_fft = _fft_length(block_size, length)
+    block_plan, ear_plan = backend.plan(n_fft), backend.plan(n_fft, channels=2)
+    spectrum = _hrir_spectra(prepared, ear_plan)
+    output_dry = np.zeros((num_samples + _hrir_span(prepared.hrtf), 2))
+    fade_in = np.linspace(0, 1, block_size)
+    fade_out = 1.0 - fade_in
+    n_blocks = -(-num_samples // block_size)
+
+    states = []
+    for i, (audio, interpolators, start, gain) in enumerate(sources):
+        initial_jitter, jitters = _block_jitters(n_blocks, JITTER_SEED + i)
+        (idx, _, attenuation), last_params = _state_at_block(prepared, interpolators, 0, block_size, initial_jitter, jitters, fs)
+        states.append({"idx": idx, "attenuation": attenuation, "params": last_params, "jitters": jitters})
+
+    skipped = 0
+    for block_index, start_idx in enumerate(range(0, num_samples, block_size)):
+        if cancel_check is not None and cancel_check():
+            raise RenderCancelledError("Rendering cancelled.")
+        end_idx = min(start_idx + block_size, num_samples)
+        actual_block_size = end_idx - start_idx
+        groups = {}
+        current_time = end_idx / fs
+        for (audio, interpolators, start, gain), state in zip(sources, states):
+            new_params = (float(interpolators['azimuth'](current_time)),
+                          float(interpolators['elevation'](current_time)),
+                          float(interpolators['distance'](current_time)))
+            crossfade = new_params != state["params"]
+            if crossfade:
+                azi, ele, dist = new_params
+                new_idx, _, new_attenuation = _lookup_hrir(prepared, azi + state["jitters"][block_index], ele, dist)
+            # ブロックと重なる部分がない（または無音の）音源はFFTを行わず、HRIRの切り替えだけを進める
+            lo, hi = max(start_idx, start), min(end_idx, start + len(audio))
+            if lo < hi:
+                block = np.zeros(actual_block_size)
+                block[lo - start_idx:hi - start_idx] = audio[lo - start:hi - start]
+            if lo >= hi or _is_silent(block):
+                if crossfade:
+                    state.update(idx=new_idx, attenuation=new_attenuation, params=new_params)
+                continue
+            if crossfade:
+                spec_old = block_plan.forward(block * fade_out[:actual_block_size])
+                spec_new = block_plan.forward(block * fade_in[:actual_block_size])
+                _add_contribution(groups, _offset_key(prepared.hrtf, state["idx"]),
+                                  spec_old[:, None] * spectrum(state["idx"]) * (state["attenuation"] * gain))
+                _add_contribution(groups, _offset_key(prepared.hrtf, new_idx),
+                                  spec_new[:, None] * spectrum(new_idx) * (new_attenuation * gain))
+                state.update(idx=new_idx, attenuation=new_attenuation, params=new_params)
+            else:
+                _add_contribution(groups, _offset_key(prepared.hrtf, state["idx"]),
+                                  block_plan.forward(block)[:, None] * spectrum(state["idx"]) * (state["attenuation"] * gain))
+        if not groups:
+            skipped += 1
+            continue
+        _overlap_add(output_dry, groups, ear_plan, start_idx, actual_block_size + length - 1)
+    _report_silence_gate(n_blocks, skipped)
+    return output_dry
+
+def _render_ambisonic_sources(sources, sh_filters, num_samples, block_size=BLOCK_SIZE, cancel_check=None, fs=TARGET_FS):
+    """
+    複数の音源を Ambisonics バス経由でレンダリングする（sources の形式と揺らぎは _render_binaural_sources と同じ）。
+    音源ごとの処理はSHゲインの掛け算だけで、パラメータが変わったブロックではゲインを線形にクロスフェードする。
+    バスはブロック毎に (order + 1) ** 2 本の順FFTと耳ごとの逆FFT1本でデコードするため、コストは音源数によらない。
+    """
+    order = int(np.sqrt(sh_filters.shape[1])) - 1
+    filter_length = sh_filters.shape[2]
+    backend = get_backend()
+    n_fft = next_fast_len(block_size + filter_length - 1)
+    bus_plan, ear_plan = backend.plan(n_fft, channels=sh_filters.shape[1]), backend.plan(n_fft, channels=2)
+    filter_spectra = backend.rfft(sh_filters, n_fft, axis=2)
+    output_dry = np.zeros((num_samples + filter_length - 1, 2))
+    fade_in = np.linspace(0, 1, block_size)
+    fade_out = 1.0 - fade_in
+    n_blocks = -(-num_samples // block_size)
+
+    def gains(params, jitter):
+        azi, ele, dist = params
+        return ambisonics.encoder_gains(azi + jitter, ele, order) * _distance_attenuation(dist)
+
+    states = []
+    for i, (audio, interpolators, start, gain) in enumerate(sources):
+        initial_jitter, jitters = _block_jitters(n_blocks, JITTER_SEED + i)
+        params = tuple(float(v[0]) for v in _block_params(interpolators, np.zeros(1)))
+        states.append({"gains": gains(params, initial_jitter) * gain, "params": params, "jitters": jitters})
+
+    skipped = 0
+    for block_index, start_idx in enumerate(range(0, num_samples, block_size)):
+        if cancel_check is not None and cancel_check():
+            raise RenderCancelledError("Rendering cancelled.")
+        end_idx = min(start_idx + block_size, num_samples)
+        actual_block_size = end_idx - start_idx
+        current_time = end_idx / fs
+        bus = None
+        for (audio, interpolators, start, gain), state in zip(sources, states):
+            new_params = (float(interpolators['azimuth'](current_time)),
+                          float(interpolators['elevation'](current_time)),
+                          float(interpolators['distance'](current_time)))
+            old_gains = state["gains"]
+            crossfade = new_params != state["params"]
+            if crossfade:
+                state.update(gains=gains(new_params, state["jitters"][block_index]) * gain, params=new_params)
+            lo, hi = max(start_idx, start), min(end_idx, start + len(audio))
+            if lo >= hi:
+                continue
+            block = np.zeros(actual_block_size)
+            block[lo - start_idx:hi - start_idx] = audio[lo - start:hi - start]
+            if _is_silent(block):
+                continue
+            if crossfade:
+                block_gains = (np.outer(fade_out[:actual_block_size], old_gains) +
+                               np.outer(fade_in[:actual_block_size], state["gains"]))
+                encoded = block[:, None] * block_gains
+            else:
+                encoded = np.outer(block, old_gains)
+            bus = encoded if bus is None else bus + encoded
+        if bus is None:
+            skipped += 1
+            continue
+        binaural_spectrum = np.einsum('kc,eck->ke', bus_plan.forward(bus), filter_spectra)
+        binaural_block = ear_plan.inverse(binaural_spectrum)[:actual_block_size + filter_length - 1]
+        output_dry[start_idx:start_idx + len(binaural_block)] += binaural_block
+    _report_silence_gate(n_blocks, skipped)
+    return output_dry
+
+def _prepare_sources(sources, duration_sec, fs=TARGET_FS):
+    """追加音源の指定（audio, sample_rate, spatial_plan, start, gain）を _render_binaural_sources の形式にする。"""
+    prepared = []
+    for source in sources:
+        audio = _preprocess_audio(np.asarray(source["audio"]), source["sample_rate"], fs)
+        interpolators = _create_interpolators(compile_plan(source.get("spatial_plan", [])), duration_sec)
+        start = int(round(float(source.get("start", 0.0)) * fs))
+        if start < 0:
+            raise ValueError("Source start time must not be negative.")
+        prepared.append((audio, interpolators, start, float(source.get("gain", 1.0))))
+    return prepared
+
+def _mean_block_distance(interpolators, num_samples, block_size=BLOCK_SIZE, fs=TARGET_FS):
+    """全体をレンダリングした時の distance_curve の平均（ブロック毎の距離をサンプル数で重み付け）。"""
+    ends = np.minimum(np.arange(block_size, num_samples + block_size, block_size), num_samples)
+    lengths = np.diff(np.concatenate([[0], ends]))
+    dist = interpolators['distance'](ends / fs)
+    return float(np.sum(dist * lengths) / num_samples)
+
+def _apply_proximity(output_dry, avg_distance, fs=TARGET_FS):
     """近接効果（透明度優先）"""
     logging.info(f"Applying proximity effect (avg distance: {avg_distance:.2f}m)")
     # 歪み系エフェクトは全て削除し、純粋なEQのみ
@@ -164,20 +674,23 @@ def _apply_proximity(output_dry, avg_distance):
         # ブースト量を控えめに、Qを狭くして範囲を限定
         boost_db = min(2.0, (PROXIMITY_THRESHOLD - avg_distance) * 5)
         board.append(LowShelfFilter(cutoff_frequency_hz=150, gain_db=boost_db, q=1.0))
-        processed = board.process(output_dry.T.astype(np.float32), sample_rate=TARGET_FS).T
+        processed = board.process(output_dry.T.astype(np.float32), sample_rate=fs).T
         return processed
     else:
         # 近接していなければ何もしない
         return output_dry
 
-def _apply_dynamic_reverb(output_dry, interpolators):
-    logging.info("Applying tiny room reverb...")
-    board = Pedalboard([
-        Reverb(room_size=0.15, damping=0.6, wet_level=0.05, dry_level=1.0)
+def _reverb_board(room_size=0.15, damping=0.6, wet_level=0.05):
+    return Pedalboard([
+        Reverb(room_size=room_size, damping=damping, wet_level=wet_level, dry_level=1.0)
     ])
-    output_wet = board.process(output_dry.T.astype(np.float32), sample_rate=TARGET_FS).T
+
+def _apply_dynamic_reverb(output_dry, interpolators, offset=0, fs=TARGET_FS, reverb=None):
+    logging.info("Applying tiny room reverb...")
+    board = _reverb_board(**(reverb or {}))
+    output_wet = board.process(output_dry.T.astype(np.float32), sample_rate=fs).T
     num_samples = output_dry.shape[0]
-    time_axis = np.arange(num_samples) / TARGET_FS
+    time_axis = (offset + np.arange(num_samples)) / fs
     reverb_mix_values = interpolators['reverb_mix'](time_axis).reshape(-1, 1)
     reverb_mix_values = np.clip(reverb_mix_values, 0.0, 0.05) # 最大でも5%
     min_len = min(output_dry.shape[0], output_wet.shape[0])
@@ -185,24 +698,164 @@ def _apply_dynamic_reverb(output_dry, interpolators):
                     output_wet[:min_len] * reverb_mix_values[:min_len])
     return output_final
 
+def _normalize_peak(output_audio, target_peak=0.98):
+    # ピークギリギリまで音量を戻してクリアさを保つ
+    max_val = np.max(np.abs(output_audio))
+    if max_val > 0:
+        output_audio = output_audio * (target_peak / max_val)
+    return output_audio
+
+def _apply_mastering(output_audio, fs, normalize):
+    """
+    ディエッサー・チルトEQ・ノイズフロア（tools/mastering.py）。ノイズフロアの dBFS が最終的な音量に対応するよう
+    正規化後に掛け、EQでピークが変わった分だけもう一度正規化する。
+    """
+    with current_telemetry().span("render.mastering"):
+        output_audio = mastering.master(output_audio, fs)
+    if normalize:
+        output_audio = _normalize_peak(output_audio)
+    return output_audio
+
 def _postprocess_audio(output_audio, original_length):
     output_audio = output_audio[:int(original_length)]
     return output_audio
 
-def BinauralRenderer(mono_audio_path: str, spatial_plan_json: str, output_path: str) -> Dict[str, str]:
+def render_file(mono_audio_path: str, spatial_plan_json: str, output_path: str,
+                cancel_check: Optional[Callable[[], bool]] = None, trace_path: Optional[str] = None,
+                sources: Optional[List[Dict[str, Any]]] = None, native_rate: Optional[bool] = None,
+                hrtf_source: Optional[str] = None, export_extras: Union[bool, Sequence[str]] = False) -> str:
+    """
+    sources は {"path": WAV, "spatial_plan": [...], "start": 秒, "gain": 倍率} のリスト。
+    export_extras は export.extras の追加形式（True なら全て、名前のリストならその形式）。既定はマスターのみ。
+    """
+    audio_data, sample_rate = sf.read(mono_audio_path)
+    spatial_plan = json.loads(spatial_plan_json)
+    trace = RenderTrace() if trace_path else None
+    loaded_sources = [_read_source(source) for source in sources] if sources else None
+    output_audio, output_sr = make_asmr_audio(audio_data, sample_rate, spatial_plan, cancel_check=cancel_check, trace=trace,
+                                              sources=loaded_sources, native_rate=native_rate, hrtf_source=hrtf_source)
+    if trace is not None:
+        trace.save(trace_path)
+    with current_telemetry().span("render.write"):
+        # マスターWAVと（求められた）配信用フォーマットを1回の走査で書き出す
+        export_audio(output_audio, output_sr, output_path, extras=export_extras)
+    if not os.path.exists(output_path):
+        raise IOError(f"Failed to write output file to {output_path}")
+    return output_path
+
+def _read_source(source):
+    audio, sample_rate = sf.read(source["path"])
+    return {**{k: v for k, v in source.items() if k != "path"}, "audio": audio, "sample_rate": sample_rate}
+
+def BinauralRenderer(mono_audio_path: str, spatial_plan_json: str, output_path: str,
+                     hrtf_source: Optional[str] = None) -> Dict[str, str]:
     try:
-        audio_data, sample_rate = sf.read(mono_audio_path)
-        spatial_plan = json.loads(spatial_plan_json)
-        output_audio, output_sr = make_asmr_audio(audio_data, sample_rate, spatial_plan)
-        output_dir = os.path.dirname(output_path)
-        os.makedirs(output_dir, exist_ok=True)
-        sf.write(output_path, output_audio, output_sr)
-        if not os.path.exists(output_path):
-            raise IOError(f"Failed to write output file to {output_path}")
-        return {"binaural_output_path": output_path}
+        return {"binaural_output_path": render_file(mono_audio_path, spatial_plan_json, output_path,
+                                                    hrtf_source=hrtf_source)}
     except Exception as e:
         logging.error(f"Binaural rendering failed: {e}", exc_info=True)
         return {"error": f"Binaural rendering failed: {str(e)}"}
 
+@functools.lru_cache(maxsize=None)
+def _reverb_tail_samples(threshold=1e-6):
+    """リバーブのインパルス応答が threshold（ピーク比）を下回るまでの長さ。区間レンダリングの助走に使う。"""
+    impulse = np.zeros((2, 10 * TARGET_FS), dtype=np.float32)
+    impulse[:, 0] = 1.0
+    response = _reverb_board().process(impulse, sample_rate=TARGET_FS)
+    response[:, 0] -= 1.0  # dry成分を除く
+    envelope = np.max(np.abs(response), axis=0)
+    audible = np.flatnonzero(envelope > threshold * envelope.max())
+    return int(audible[-1]) + 1 if len(audible) else 0
+
+def render_range(mono_audio_path: str, spatial_plan_json: str, t0: float, t1: float, normalize: bool = False,
+                 cancel_check: Optional[Callable[[], bool]] = None,
+                 hrtf_source: Optional[str] = None) -> Tuple[np.ndarray, int]:
+    """
+    t0〜t1秒の区間だけをレンダリングする。入力はこの区間と助走分だけを読み込む。
+    助走（HRIRの長さ + リバーブの残響長）を前に付けてフィルタの状態を揃えるため、
+    結果は全体を make_asmr_audio(..., normalize=False, mode="direct", native_rate=False) でレンダリングした同じ区間と一致する。
+    normalize=True なら区間内のピークで正規化する（全体のピークは分からないため、全体の結果とは音量が異なる）。
+    """
+    telemetry = current_telemetry()
+    info = sf.info(mono_audio_path)
+    # 全体を 48kHz に変換した時の長さ（librosa.resample と同じ切り上げ）
+    total = int(np.ceil(info.frames * TARGET_FS / info.samplerate))
+    w0 = int(round(t0 * TARGET_FS))
+    w1 = min(int(round(t1 * TARGET_FS)), total)
+    if t0 < 0 or w0 >= w1:
+        raise ValueError(f"Invalid render range: {t0}s - {t1}s (audio is {total / TARGET_FS:.2f}s)")
+
+    with telemetry.span("render.hrtf_load"):
+        hrtf = _prepared_hrtf(TARGET_FS, hrtf_source)
+    interpolators = _create_interpolators(compile_plan(spatial_plan_json), total / TARGET_FS)
+
+    # ブロック境界に揃えた、助走込みのレンダリング区間 [s0, e)
+    preroll = _hrir_span(hrtf.hrtf) + _reverb_tail_samples()
+    # マスタリングのSTFTは区間の後ろのフレーム1つ分も使う
+    postroll = 0
+    if mastering.MASTERING_ENABLED:
+        preroll += mastering.preroll_samples(TARGET_FS)
+        postroll = mastering.N_FFT
+    s0 = max(0, (w0 - preroll) // BLOCK_SIZE * BLOCK_SIZE)
+    e = min(total, -(-(w1 + postroll) // BLOCK_SIZE) * BLOCK_SIZE)
+
+    with telemetry.span("render.preprocess"):
+        # 入力側の読み込み開始位置は、48kHz側の整数サンプルに対応する位置に揃える
+        step = info.samplerate // np.gcd(info.samplerate, TARGET_FS)
+        margin = info.samplerate // 10  # リサンプラーの端の影響を避ける余白
+        i0 = max(0, (s0 * info.samplerate // TARGET_FS - margin) // step * step)
+        i1 = min(info.frames, -(-e * info.samplerate // TARGET_FS) + margin)
+        segment, _ = sf.read(mono_audio_path, start=i0, stop=i1)
+        o0 = i0 * TARGET_FS // info.samplerate
+        segment = _preprocess_audio(segment, info.samplerate)[s0 - o0:e - o0]
+        if len(segment) < e - s0:
+            segment = np.pad(segment, (0, e - s0 - len(segment)))
+
+    with telemetry.span("render.convolution"):
+        output_dry, _ = _render_binaural_dynamic_crossfade(segment, hrtf, interpolators, cancel_check=cancel_check, offset=s0)
+    with telemetry.span("render.proximity"):
+        output_processed = _apply_proximity(output_dry, _mean_block_distance(interpolators, total))
+    with telemetry.span("render.reverb"):
+        output_final = _apply_dynamic_reverb(output_processed, interpolators, offset=s0)
+
+    if mastering.MASTERING_ENABLED:
+        with telemetry.span("render.mastering"):
+            output_final = mastering.master(output_final, TARGET_FS, offset=s0)
+    output_final = output_final[w0 - s0:w1 - s0]
+    if normalize:
+        output_final = _normalize_peak(output_final)
+    return output_final, TARGET_FS
+
+def main():
+    p = argparse.ArgumentParser(description="Render binaural ASMR audio from a mono WAV and a spatial plan.")
+    p.add_argument("--input", required=True, help="Mono WAV")
+    p.add_argument("--plan", required=True, help="Spatial plan JSON file")
+    p.add_argument("--output", required=True, help="Output WAV")
+    p.add_argument("--range", nargs=2, type=float, metavar=("T0", "T1"),
+                   help="Render only T0-T1 seconds (fast preview; matches the same window of a full render)")
+    p.add_argument("--normalize", action="store_true", help="With --range, normalize the preview to its own peak")
+    p.add_argument("--sources", help="JSON file listing extra sources: [{\"path\", \"spatial_plan\", \"start\", \"gain\"}]")
+    p.add_argument("--hrtf-source", help="HRTF set (default / synthetic / dummy / path to a .sofa file; defaults to hrtf.source)")
+    p.add_argument("--extras", action="store_true", help="Also write the export.extras formats (FLAC, OGG preview)")
+    args = p.parse_args()
+
+    with open(args.plan, "r", encoding="utf-8") as f:
+        spatial_plan_json = f.read()
+    sources = None
+    if args.sources:
+        with open(args.sources, "r", encoding="utf-8") as f:
+            sources = json.load(f)
+    if args.range and sources:
+        p.error("--range does not support --sources")
+    if args.range:
+        audio, fs = render_range(args.input, spatial_plan_json, args.range[0], args.range[1], normalize=args.normalize,
+                                 hrtf_source=args.hrtf_source)
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        sf.write(args.output, audio, fs)
+    else:
+        render_file(args.input, spatial_plan_json, args.output, sources=sources, hrtf_source=args.hrtf_source,
+                    export_extras=args.extras)
+    print(f"[OK] Wrote: {args.output}")
+
 if __name__ == '__main__':
-    pass
\ No newline at end of file
+    main()
\ No newline at end of file
@@ -0,0 +1,252 @@
+"""
+長尺エピソードの組み立て
+
+睡眠用の30〜120分のトラックを、レンダリング済みのセグメントを順につないで作る。
+
+- セグメントは {"path": レンダリング済みWAV} のリスト。"input"（モノラルWAV）と "spatial_plan" があり、
+  path がまだ無いセグメントは、プロセスプール（render_pool.py）で並列にレンダリングしてから使う
+- ラウドネス: 各セグメントの統合ラウドネス（ITU-R BS.1770, Kウェイト + ゲート）をブロック毎に読んで測り、
+  目標値（episode.target_lufs）に揃えるゲインを掛ける。ピークが上限を超える場合はゲインを抑える
+- つなぎ目: 前のセグメントの終わりと次の始まりを等パワー（cos / sin）のクロスフェードで重ねる。
+  重ねた和がピークの上限を超える場合は、つなぎ目だけ滑らかにゲインを下げる
+- 書き出し: export.py の FanOutExporter にブロック毎に流す。メモリに持つのは読み込み中のブロックと
+  次のつなぎ目に使う前のセグメントの終わり（クロスフェード長）だけで、全体は持たない
+
+設定は config.yaml の episode セクションから読む。
+
+使い方:
+    python -m asmr_gen_adk.tools.episode --segments episode.json --output asmr_gen_adk/output/sleep.wav
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import scipy.signal
+import soundfile as sf
+import yaml
+
+from ..telemetry import current_telemetry
+from .binaural_renderer import render_file
+from .export import BLOCK_FRAMES, FanOutExporter, export_targets_for
+from .render_pool import RenderPool
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_episode_config = config.get("episode", {})
+CROSSFADE_SEC = _episode_config.get("crossfade_sec", 3.0)
+TARGET_LUFS = _episode_config.get("target_lufs", -24.0)
+# ラウドネスを揃えた後のサンプルピークの上限
+PEAK_CEILING = _episode_config.get("peak_ceiling", 0.98)
+
+# BS.1770 のゲート: 400ms のブロックを 100ms ずつずらす
+_GATE_BLOCK_SEC = 0.4
+_GATE_STEP_SEC = 0.1
+_ABSOLUTE_GATE_LUFS = -70.0
+_RELATIVE_GATE_LU = -10.0
+
+
+def _k_weighting(sample_rate: int) -> np.ndarray:
+    """Kウェイト（高域シェルフ + ハイパス）の2次セクション。BS.1770 の48kHzの係数を任意のレートで作り直したもの（libebur128 と同じ）。"""
+    # 高域シェルフ
+    k = np.tan(np.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    # ハイパス
+    k = np.tan(np.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    high_pass = [1.0, -2.0, 1.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return np.array([shelf, high_pass])
+
+
+def _gated_loudness(step_energy: np.ndarray, steps_per_block: int) -> float:
+    """100ms ごとの平均二乗（チャンネルの和）から、ゲート付きの統合ラウドネス（LUFS）。"""
+    if len(step_energy) < steps_per_block:
+        # 400ms に満たない場合はゲートなし
+        blocks = np.array([np.mean(step_energy)]) if len(step_energy) else np.zeros(0)
+    else:
+        windows = np.lib.stride_tricks.sliding_window_view(step_energy, steps_per_block)
+        blocks = windows.mean(axis=1)
+    with np.errstate(divide="ignore"):
+        levels = -0.691 + 10 * np.log10(blocks)
+    gated = blocks[levels > _ABSOLUTE_GATE_LUFS]
+    if len(gated) == 0:
+        return float("-inf")
+    relative = -0.691 + 10 * np.log10(np.mean(gated)) + _RELATIVE_GATE_LU
+    gated = blocks[(levels > _ABSOLUTE_GATE_LUFS) & (levels > relative)]
+    return float(-0.691 + 10 * np.log10(np.mean(gated)))
+
+
+def measure_file(path: str) -> Dict[str, float]:
+    """WAVをブロック毎に読み、統合ラウドネス（LUFS）とサンプルピークを返す。全体はメモリに読まない。"""
+    info = sf.info(path)
+    step = int(round(info.samplerate * _GATE_STEP_SEC))
+    sos = _k_weighting(info.samplerate)
+    zi = np.zeros((len(sos), 2, info.channels))
+    energies = []
+    peak = 0.0
+    # 100ms の倍数ずつ読むと、ブロックの切れ目が100msの区切りと揃う
+    frames = max(1, BLOCK_FRAMES // step) * step
+    for block in sf.blocks(path, blocksize=frames, always_2d=True):
+        peak = max(peak, float(np.max(np.abs(block))) if len(block) else 0.0)
+        weighted, zi = scipy.signal.sosfilt(sos, block, axis=0, zi=zi)
+        n_steps = len(weighted) // step
+        # 最後の100msに満たない端は使わない（BS.1770 のゲートと同じ）
+        squares = weighted[:n_steps * step] ** 2
+        energies.append(squares.reshape(n_steps, step, -1).mean(axis=1).sum(axis=1))
+    step_energy = np.concatenate(energies) if energies else np.zeros(0)
+    steps_per_block = int(round(_GATE_BLOCK_SEC / _GATE_STEP_SEC))
+    return {"loudness_lufs": _gated_loudness(step_energy, steps_per_block), "peak": peak,
+            "frames": info.frames, "sample_rate": info.samplerate, "channels": info.channels}
+
+
+def _segment_gain(measured: Dict[str, float], target_lufs: float) -> float:
+    """ラウドネスを target_lufs に揃えるゲイン（倍率）。ピークが PEAK_CEILING を超えないように抑える。"""
+    if not np.isfinite(measured["loudness_lufs"]) or measured["peak"] == 0:
+        return 1.0
+    gain = 10 ** ((target_lufs - measured["loudness_lufs"]) / 20)
+    if measured["peak"] * gain > PEAK_CEILING:
+        logging.warning(f"Loudness gain limited by the peak ceiling ({measured['peak']:.3f} peak)")
+        gain = PEAK_CEILING / measured["peak"]
+    return gain
+
+
+def _equal_power_fades(n: int):
+    """長さ n の等パワーのフェード（出ていく側, 入ってくる側）。二乗の和が常に1。"""
+    theta = (np.arange(n) + 0.5) / n * np.pi / 2
+    return np.cos(theta)[:, None], np.sin(theta)[:, None]
+
+
+def _limit_overlap(mixed: np.ndarray) -> np.ndarray:
+    """
+    クロスフェードで重ねた区間のピークを PEAK_CEILING に抑える。各セグメントは単独では上限以下でも、
+    等パワーの和（cos·a + sin·b）は最大で約1.41倍になるため、区間の中央ほど深く下げる滑らかなゲインを掛ける。
+    端の近く（窓で下げきれない分）はクリップする。
+    """
+    peak = np.max(np.abs(mixed), axis=1)
+    over = peak > PEAK_CEILING
+    if not np.any(over):
+        return mixed
+    window = np.sin(np.pi * (np.arange(len(mixed)) + 0.5) / len(mixed)) ** 2
+    depth = min(1.0, float(np.max((1 - PEAK_CEILING / peak[over]) / window[over])))
+    logging.warning(f"Crossfade peak {np.max(peak):.3f} limited to {PEAK_CEILING}")
+    return np.clip(mixed * (1 - depth * window)[:, None], -PEAK_CEILING, PEAK_CEILING)
+
+
+def _render_missing(segments: List[Dict[str, Any]], workers: Optional[int]) -> int:
+    """path がまだ無いセグメントをプロセスプールで並列にレンダリングする。レンダリングした数を返す。"""
+    jobs = []
+    for segment in segments:
+        if os.path.exists(segment["path"]):
+            continue
+        if "input" not in segment:
+            raise FileNotFoundError(f"Segment not found and no input to render it from: {segment['path']}")
+        plan = segment.get("spatial_plan", [])
+        # hrtf_source はキーワードで渡す（render_file の引数の順序に依存しない。partial はワーカーに渡せる）
+        render = functools.partial(render_file, hrtf_source=segment.get("hrtf_source"))
+        jobs.append((render, segment["input"], plan if isinstance(plan, str) else json.dumps(plan), segment["path"]))
+    if not jobs:
+        return 0
+
+    async def render_all():
+        pool = RenderPool(workers=min(workers, len(jobs)) if workers else None)
+        try:
+            return await asyncio.gather(*(pool.run(*job) for job in jobs))
+        finally:
+            pool.shutdown()
+
+    logging.info(f"Rendering {len(jobs)} missing segment(s)...")
+    asyncio.run(render_all())
+    return len(jobs)
+
+
+def assemble_episode(segments: List[Dict[str, Any]], output_path: str, crossfade_sec: Optional[float] = None,
+                     target_lufs: Optional[float] = None, workers: Optional[int] = None,
+                     export_extras: Union[bool, Sequence[str]] = False) -> Dict[str, Any]:
+    """
+    segments を順につないで output_path（export_extras を渡せば export 設定の他の形式にも）に書き出す。
+    各セグメントは {"path": WAV, "input": モノラルWAV, "spatial_plan": [...], "hrtf_source": ..., "crossfade_sec": 秒}。
+    input / spatial_plan / hrtf_source は path が無い時のレンダリングに、crossfade_sec は直前のセグメントとの
+    つなぎ目の長さ（省略時は crossfade_sec 引数、さらに省略時は config.yaml の episode.crossfade_sec）に使う。
+    書き出し先・長さと、セグメント毎の開始時刻・ラウドネス・ゲインを返す。
+    """
+    if not segments:
+        raise ValueError("An episode needs at least one segment")
+    crossfade_sec = CROSSFADE_SEC if crossfade_sec is None else crossfade_sec
+    target_lufs = TARGET_LUFS if target_lufs is None else target_lufs
+    telemetry = current_telemetry()
+
+    with telemetry.span("episode.render"):
+        rendered = _render_missing(segments, workers)
+    with telemetry.span("episode.measure"):
+        measured = [measure_file(segment["path"]) for segment in segments]
+    sample_rate, channels = measured[0]["sample_rate"], measured[0]["channels"]
+    for segment, m in zip(segments, measured):
+        if (m["sample_rate"], m["channels"]) != (sample_rate, channels):
+            raise ValueError(f"{segment['path']}: {m['sample_rate']} Hz / {m['channels']} ch does not match "
+                             f"the first segment ({sample_rate} Hz / {channels} ch)")
+
+    # つなぎ目 i は セグメント i-1 と i の重なり。どちらのセグメントも、前後のつなぎ目の和より短くはしない
+    overlaps = [0]
+    for i in range(1, len(segments)):
+        seconds = segments[i].get("crossfade_sec", crossfade_sec)
+        overlaps.append(min(int(round(seconds * sample_rate)), measured[i - 1]["frames"] - overlaps[i - 1],
+                            measured[i]["frames"] // 2))
+    overlaps.append(0)
+
+    report = []
+    position = 0
+    targets = export_targets_for(output_path, sample_rate, export_extras)
+    with telemetry.span("episode.write"), FanOutExporter(targets, sample_rate, channels) as exporter:
+        tail = np.zeros((0, channels))
+        for i, (segment, m) in enumerate(zip(segments, measured)):
+            gain = _segment_gain(m, target_lufs)
+            head_len, tail_len = overlaps[i], overlaps[i + 1]
+            start = position - head_len
+            report.append({"path": segment["path"], "start_sec": start / sample_rate,
+                           "loudness_lufs": m["loudness_lufs"], "gain_db": 20 * np.log10(gain)})
+            with sf.SoundFile(segment["path"]) as f:
+                if head_len:
+                    fade_out, fade_in = _equal_power_fades(head_len)
+                    exporter.write(_limit_overlap(tail * fade_out + f.read(head_len, always_2d=True) * gain * fade_in))
+                body_end = m["frames"] - tail_len
+                while f.tell() < body_end:
+                    exporter.write(f.read(min(BLOCK_FRAMES, body_end - f.tell()), always_2d=True) * gain)
+                tail = f.read(tail_len, always_2d=True) * gain
+            position = start + m["frames"]
+    outputs = {target.name: target.path for target in targets}
+    logging.info(f"Assembled {len(segments)} segment(s) into {position / sample_rate / 60:.1f} min: {output_path}")
+    return {"outputs": outputs, "duration_sec": position / sample_rate, "rendered": rendered, "segments": report}
+
+
+def main():
+    p = argparse.ArgumentParser(description="Assemble rendered segments into one long-form episode.")
+    p.add_argument("--segments", required=True,
+                   help="JSON file: [{\"path\", \"input\"?, \"spatial_plan\"?, \"hrtf_source\"?, \"crossfade_sec\"?}]")
+    p.add_argument("--output", required=True, help="Output WAV")
+    p.add_argument("--crossfade", type=float, help="Crossfade between segments in seconds")
+    p.add_argument("--target-lufs", type=float, help="Integrated loudness every segment is matched to")
+    p.add_argument("--workers", type=int, help="Processes for rendering missing segments (default: render.workers)")
+    p.add_argument("--extras", action="store_true", help="Also write the export.extras formats next to the output")
+    args = p.parse_args()
+
+    with open(args.segments, "r", encoding="utf-8") as f:
+        segments = json.load(f)
+    result = assemble_episode(segments, args.output, crossfade_sec=args.crossfade, target_lufs=args.target_lufs,
+                              workers=args.workers, export_extras=args.extras)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+マルチフォーマット書き出し
+
+レンダリング済みの音声をブロック毎に複数のエンコーダーへ同時に流し、
+WAV マスターと（呼び出し側が求めた場合は）44.1kHz FLAC・OGG プレビューを1回の走査で作る。
+
+- エンコーダー毎にスレッドとキューを持つ（libsndfile / soxr は処理中にGILを解放する）
+- サンプルレートが異なる出力は soxr のストリーミング変換を通す（全体を一度に変換しない）
+- 書き出した音声を読み直したり、デコードし直したりはしない
+"""
+
+import logging
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import soundfile as sf
+import soxr
+import yaml
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_export_config = config.get("export", {})
+BLOCK_FRAMES = _export_config.get("block_frames", 65536)
+# エンコーダー毎のキューの深さ（ブロック数）。遅いエンコーダーがあってもメモリ使用量は頭打ちになる
+QUEUE_BLOCKS = _export_config.get("queue_blocks", 8)
+
+_END = None
+
+
+@dataclass
+class ExportTarget:
+    name: str
+    path: str
+    format: str
+    subtype: str
+    sample_rate: int
+    compression_level: Optional[float] = None
+
+
+def export_targets_for(output_path: str, sample_rate: int,
+                       extras: Union[bool, Sequence[str]] = False) -> List[ExportTarget]:
+    """
+    config.yaml の export 設定から書き出し先を決める。
+    マスターは output_path に書き、サンプルレートは master.sample_rate（省略時はレンダリング結果の sample_rate のまま）。
+    extras=True なら設定の全ての追加形式、名前のリストならその形式だけを、output_path の拡張子を各 suffix に
+    置き換えたパスに書く。
+    """
+    master = _export_config.get("master", {})
+    targets = [ExportTarget(
+        name="master",
+        path=output_path,
+        format=master.get("format", "WAV"),
+        subtype=master.get("subtype", "PCM_16"),
+        sample_rate=master.get("sample_rate") or sample_rate,
+    )]
+    configured = _export_config.get("extras", {})
+    if not extras:
+        return targets
+    names = list(configured) if extras is True else list(extras)
+    unknown = [name for name in names if name not in configured]
+    if unknown:
+        raise ValueError(f"Unknown export format(s): {', '.join(unknown)}")
+    stem = os.path.splitext(output_path)[0]
+    for name in names:
+        extra = configured[name]
+        targets.append(ExportTarget(
+            name=name,
+            path=stem + extra["suffix"],
+            format=extra["format"],
+            subtype=extra["subtype"],
+            sample_rate=extra.get("sample_rate", sample_rate),
+            compression_level=extra.get("compression_level"),
+        ))
+    return targets
+
+
+class _Encoder(threading.Thread):
+    """キューから受け取ったブロックを（必要ならリサンプルして）1つのファイルに書き込む。"""
+
+    def __init__(self, target: ExportTarget, sample_rate: int, channels: int):
+        super().__init__(name=f"export-{target.name}", daemon=True)
+        self.target = target
+        self.queue: queue.Queue = queue.Queue(maxsize=QUEUE_BLOCKS)
+        self.error: Optional[BaseException] = None
+        self._resampler = (
+            soxr.ResampleStream(sample_rate, target.sample_rate, channels, dtype="float32", quality="HQ")
+            if target.sample_rate != sample_rate else None
+        )
+        os.makedirs(os.path.dirname(target.path) or ".", exist_ok=True)
+        self._file = sf.SoundFile(
+            target.path, "w", samplerate=target.sample_rate, channels=channels,
+            subtype=target.subtype, format=target.format, compression_level=target.compression_level,
+        )
+
+    def run(self) -> None:
+        while True:
+            block = self.queue.get()
+            # エラー後も送り側が詰まらないよう、終端まで受け取り続ける
+            if self.error is not None:
+                if block is _END:
+                    return
+                continue
+            try:
+                if block is _END:
+                    if self._resampler is not None:
+                        tail = self._resampler.resample_chunk(np.zeros((0, self._file.channels), np.float32), last=True)
+                        self._file.write(np.clip(tail, -1.0, 1.0))
+                    self._file.close()
+                    return
+                if self._resampler is not None:
+                    # 変換後はオーバーシュートし得るので、整数PCMで折り返さないようにクリップする
+                    block = np.clip(self._resampler.resample_chunk(block), -1.0, 1.0)
+                self._file.write(block)
+            except Exception as e:
+                self.error = e
+                self._file.close()
+                if block is _END:
+                    return
+
+    def discard(self) -> None:
+        """開始前のエンコーダーのファイルを閉じて削除する（他の書き出し先を開けなかった場合）。"""
+        self._file.close()
+        if os.path.exists(self.target.path):
+            os.remove(self.target.path)
+
+
+class FanOutExporter:
+    """
+    write() で渡したブロックを全ての書き出し先に配る。
+    with ブロックを正常に抜けると全エンコーダーの完了を待ち、いずれかが失敗していれば例外を送出する。
+    """
+
+    def __init__(self, targets: List[ExportTarget], sample_rate: int, channels: int = 2):
+        self.targets = targets
+        self._encoders: List[_Encoder] = []
+        try:
+            for target in targets:
+                self._encoders.append(_Encoder(target, sample_rate, channels))
+        except Exception:
+            # 開けなかった書き出し先があれば、開いたファイルを閉じて書きかけを残さない
+            for encoder in self._encoders:
+                encoder.discard()
+            raise
+        for encoder in self._encoders:
+            encoder.start()
+
+    def write(self, block: np.ndarray) -> None:
+        block = np.ascontiguousarray(block, dtype=np.float32)
+        # 全スレッドで同じ配列を共有するので、書き換えられないようにしておく
+        block.flags.writeable = False
+        for encoder in self._encoders:
+            encoder.queue.put(block)
+
+    def close(self) -> Dict[str, str]:
+        for encoder in self._encoders:
+            encoder.queue.put(_END)
+        for encoder in self._encoders:
+            encoder.join()
+        failed = [encoder for encoder in self._encoders if encoder.error is not None]
+        if failed:
+            raise IOError(f"Export to {failed[0].target.path} failed: {failed[0].error}") from failed[0].error
+        return {target.name: target.path for target in self.targets}
+
+    def __enter__(self) -> "FanOutExporter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        # 例外時は書きかけのファイルを閉じるだけにする
+        try:
+            self.close()
+        except IOError as e:
+            logging.warning(f"Export aborted: {e}")
+
+
+def export_audio(audio: np.ndarray, sample_rate: int, output_path: str,
+                 targets: Optional[List[ExportTarget]] = None,
+                 extras: Union[bool, Sequence[str]] = False) -> Dict[str, str]:
+    """
+    レンダリング結果をマスター（と extras で求めた追加形式）へ1回の走査で書き出し、{名前: パス} を返す。
+    """
+    audio = np.atleast_2d(audio.T).T
+    targets = targets or export_targets_for(output_path, sample_rate, extras)
+    with FanOutExporter(targets, sample_rate, channels=audio.shape[1]) as exporter:
+        for start in range(0, len(audio), BLOCK_FRAMES):
+            exporter.write(audio[start:start + BLOCK_FRAMES])
+    return {target.name: target.path for target in targets}
@@ -0,0 +1,150 @@
+"""
+FFTバックエンド
+
+レンダラーの畳み込みで使う実FFTを1か所にまとめる。レンダリング毎にFFT長を固定して
+RealFFTPlan を作り、入力の作業配列（ゼロ埋め済み）と、pyFFTW ならFFTWのプランを使い回す。
+
+- backend: "scipy"（scipy.fft, workers でスレッド数を指定）または "pyfftw"（インストールされている場合のみ。
+  ない場合は scipy にフォールバックする）
+- workers: スレッド数（-1 で全コア）。scipy.fft は複数チャンネルを並列に変換し、pyFFTW は1本の変換も並列化する
+- dtype: "float32" なら単精度で変換する（スペクトルは complex64）
+
+設定は config.yaml の fft セクションから読む。
+"""
+
+import logging
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import scipy.fft
+import yaml
+
+try:
+    import pyfftw
+except ImportError:
+    pyfftw = None
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_fft_config = config.get("fft", {})
+BACKEND = _fft_config.get("backend", "scipy")
+WORKERS = _fft_config.get("workers", -1)
+DTYPE = _fft_config.get("dtype", "float64")
+# pyFFTW のプラン作成の手間（FFTW_ESTIMATE / FFTW_MEASURE / FFTW_PATIENT）
+PYFFTW_PLANNER_EFFORT = _fft_config.get("pyfftw_planner_effort", "FFTW_MEASURE")
+
+_backends: Dict[Tuple[str, int, str], "FFTBackend"] = {}
+
+
+def next_fast_len(n: int) -> int:
+    return scipy.fft.next_fast_len(n, real=True)
+
+
+class RealFFTPlan:
+    """
+    n 点の実FFT。時間領域は (n,) または (n, channels)、周波数領域は (n // 2 + 1,) または (n // 2 + 1, channels)。
+    forward() には n 以下の長さを渡せば残りはゼロとして扱う。返す配列は呼び出し毎に新しいもの。
+    """
+
+    def __init__(self, backend: "FFTBackend", n: int, channels: Optional[int] = None):
+        self.backend = backend
+        self.n = n
+        self.channels = channels
+        shape = (n,) if channels is None else (n, channels)
+        self._scratch = backend._empty(shape, backend.dtype)
+        spectrum_shape = (n // 2 + 1,) + shape[1:]
+        self._spectrum = backend._empty(spectrum_shape, backend.complex_dtype)
+        self._forward = backend._build_forward(self._scratch)
+        self._inverse = backend._build_inverse(self._spectrum, n)
+        # プラン作成（FFTW_MEASURE）は配列を書き換えるので、作成後にゼロで埋める
+        self._scratch[:] = 0
+        self._filled = 0
+
+    def forward(self, x: np.ndarray) -> np.ndarray:
+        m = len(x)
+        self._scratch[:m] = x
+        # 前回より短い入力なら、前回の残りをゼロに戻す
+        if m < self._filled:
+            self._scratch[m:self._filled] = 0
+        self._filled = m
+        return self._forward(self._scratch)
+
+    def inverse(self, spectrum: np.ndarray) -> np.ndarray:
+        return self._inverse(spectrum)
+
+
+class FFTBackend:
+    name = "scipy"
+
+    def __init__(self, workers: int = WORKERS, dtype: str = DTYPE):
+        self.workers = workers
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.float64):
+            raise ValueError(f"Unsupported FFT dtype: {dtype}")
+        self.complex_dtype = np.result_type(self.dtype, np.complex64)
+
+    def plan(self, n: int, channels: Optional[int] = None) -> RealFFTPlan:
+        return RealFFTPlan(self, n, channels)
+
+    def rfft(self, x: np.ndarray, n: int, axis: int = 0) -> np.ndarray:
+        """プランを作らない一度きりの変換（フィルタの前計算など）。"""
+        return scipy.fft.rfft(np.asarray(x, dtype=self.dtype), n, axis=axis, workers=self.workers)
+
+    def irfft(self, spectrum: np.ndarray, n: int, axis: int = 0) -> np.ndarray:
+        return scipy.fft.irfft(spectrum, n, axis=axis, workers=self.workers)
+
+    def _empty(self, shape, dtype) -> np.ndarray:
+        return np.empty(shape, dtype=dtype)
+
+    def _build_forward(self, scratch: np.ndarray):
+        return lambda x: scipy.fft.rfft(x, axis=0, workers=self.workers)
+
+    def _build_inverse(self, spectrum: np.ndarray, n: int):
+        dtype = self.complex_dtype
+        return lambda X: scipy.fft.irfft(np.asarray(X, dtype=dtype), n, axis=0, workers=self.workers)
+
+
+class PyFFTWBackend(FFTBackend):
+    """FFTWのプランを RealFFTPlan 毎に1回だけ作り、整列済みの入出力配列を使い回す。"""
+
+    name = "pyfftw"
+
+    def __init__(self, workers: int = WORKERS, dtype: str = DTYPE):
+        super().__init__(workers, dtype)
+        self._threads = (os.cpu_count() or 1) if workers == -1 else max(1, workers)
+
+    def _empty(self, shape, dtype) -> np.ndarray:
+        return pyfftw.empty_aligned(shape, dtype=dtype)
+
+    def _build_forward(self, scratch: np.ndarray):
+        fft = pyfftw.builders.rfft(scratch, axis=0, threads=self._threads, planner_effort=PYFFTW_PLANNER_EFFORT,
+                                   avoid_copy=True)
+        # FFTWは同じ出力配列に書き込むので、呼び出し側が保持できるようにコピーを返す
+        return lambda x: fft().copy()
+
+    def _build_inverse(self, spectrum: np.ndarray, n: int):
+        ifft = pyfftw.builders.irfft(spectrum, n, axis=0, threads=self._threads,
+                                     planner_effort=PYFFTW_PLANNER_EFFORT, avoid_copy=True)
+
+        def inverse(X):
+            spectrum[:] = X
+            return ifft().copy()
+        return inverse
+
+
+def get_backend(name: Optional[str] = None, workers: Optional[int] = None, dtype: Optional[str] = None) -> FFTBackend:
+    """設定（または引数）に応じたバックエンド。同じ設定なら同じインスタンスを返す。"""
+    name = name or BACKEND
+    workers = WORKERS if workers is None else workers
+    dtype = dtype or DTYPE
+    if name not in ("scipy", "pyfftw"):
+        raise ValueError(f"Unknown FFT backend: {name}")
+    key = (name, workers, str(np.dtype(dtype)))
+    if key not in _backends:
+        if name == "pyfftw" and pyfftw is None:
+            logging.warning("pyFFTW is not installed; falling back to scipy.fft.")
+            name = "scipy"
+        _backends[key] = (PyFFTWBackend if name == "pyfftw" else FFTBackend)(workers, dtype)
+    return _backends[key]
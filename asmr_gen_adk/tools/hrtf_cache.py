@@ -0,0 +1,173 @@
+"""
+HRTFセットのLRUキャッシュ
+
+聴取者ごとに違うHRTF（hrtf.source の識別子: default / synthetic / dummy / SOFAファイルのパス）でレンダリングする
+ワーカーのために、読み込んでレンダリング用に整えたHRTFセットをプロセス内で使い回す。
+上限はエントリ数ではなくバイト数で決め、超えたら最も長く使われていないものから捨てる。
+
+- PreparedHRTF: HRTFセットと、方向の索引（単位ベクトル）、方向ごとの周波数特性（FFT長ごと）のキャッシュ。
+  周波数特性はレンダリング中に増えるため、大きさは参照のたびに測り直す
+- ヒット・ミス・追い出しの回数はテレメトリ（render.hrtf_cache）に記録し、Prometheus にも書き出す
+
+上限は config.yaml の hrtf.cache.max_mb（最後に使ったエントリは上限を超えていても残す）。
+追い出したエントリが close() を持つ場合（SOFAのHRTF）は閉じてファイルハンドルを返す。
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+import numpy as np
+import spaudiopy as spa
+import yaml
+
+from ..telemetry import current_telemetry
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_cache_config = config.get("hrtf", {}).get("cache", {})
+CACHE_MAX_BYTES = int(_cache_config.get("max_mb", 512) * 2 ** 20)
+
+
+def _array_bytes(obj: Any) -> int:
+    """obj が持つ配列の合計バイト数（SOFAのHRTFは読み込み済みの方向の分だけ）。"""
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if hasattr(obj, "cached_bytes"):
+        return int(obj.cached_bytes)
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    return sum(v.nbytes for v in vars(obj).values() if isinstance(v, np.ndarray))
+
+
+def _close(value: Any) -> None:
+    """追い出したエントリが開いているファイル（SOFAのHRTF）を閉じる。"""
+    close = getattr(getattr(value, "hrtf", value), "close", None)
+    if close is None:
+        return
+    try:
+        close()
+    except Exception as e:
+        logging.warning(f"HRTF cache: failed to close evicted entry: {e}")
+
+
+class PreparedHRTF:
+    """レンダリングに使うHRTFセットと、そこから作る方向の索引・周波数特性のキャッシュ。"""
+
+    def __init__(self, hrtf):
+        self.hrtf = hrtf
+        self.directions = np.stack(spa.utils.sph2cart(np.asarray(hrtf.azi), np.asarray(hrtf.zen)), axis=1)
+        self._spectra: Dict[Tuple, Dict[int, np.ndarray]] = {}
+
+    def nearest(self, azimuth: float, elevation: float) -> int:
+        """方位角・仰角（度）に最も近い方向のインデックス。"""
+        target = np.array(spa.utils.sph2cart(np.deg2rad(-azimuth), np.deg2rad(90 - elevation))).ravel()
+        return int(np.argmin(np.sum((self.directions - target) ** 2, axis=1)))
+
+    def spectra(self, key: Tuple) -> Dict[int, np.ndarray]:
+        """FFT長・型（key）ごとの、方向 → 周波数特性の辞書。"""
+        return self._spectra.setdefault(key, {})
+
+    @property
+    def nbytes(self) -> int:
+        spectra = sum(s.nbytes for cache in self._spectra.values() for s in cache.values())
+        return _array_bytes(self.hrtf) + self.directions.nbytes + spectra
+
+
+def as_prepared(hrtf) -> PreparedHRTF:
+    """PreparedHRTF ならそのまま、HRIRセットならキャッシュを持たない PreparedHRTF に包んで返す。"""
+    return hrtf if isinstance(hrtf, PreparedHRTF) else PreparedHRTF(hrtf)
+
+
+class HRTFCache:
+    """合計バイト数で上限を決めるLRU。get() はスレッドセーフ（作る処理はロックの外で行う）。"""
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, build: Callable[[], Any]) -> Any:
+        """key のエントリ。無ければ build() で作って加え、上限を超えた分を古いものから捨てる。"""
+        with self._lock:
+            hit = key in self._entries
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                value = self._entries[key]
+        if not hit:
+            value = build()
+            with self._lock:
+                self.misses += 1
+                # 同時に作られた場合は先に入ったものを使う
+                value = self._entries.setdefault(key, value)
+                self._entries.move_to_end(key)
+        # 追い出しと統計を同じロックの中で行い、測り直した大きさを統計にも使う
+        with self._lock:
+            evicted, total = self._trim_locked()
+            stats = self._stats_locked(total)
+        for evicted_value in evicted:
+            _close(evicted_value)
+        current_telemetry().record("render.hrtf_cache", kind="hrtf_cache", key=str(key), hit=hit,
+                                   evicted=len(evicted), **stats)
+        return value
+
+    def trim(self) -> int:
+        """大きさを測り直し、上限を超えていれば古いものから捨てる。捨てた数を返す。"""
+        with self._lock:
+            evicted, _ = self._trim_locked()
+        for value in evicted:
+            _close(value)
+        return len(evicted)
+
+    def _total_locked(self) -> int:
+        return sum(_array_bytes(value) for value in self._entries.values())
+
+    def _trim_locked(self) -> Tuple[List[Any], int]:
+        """（ロックを持って呼ぶ）上限を超えた分を捨て、捨てたエントリと残りの合計バイト数を返す。閉じるのは呼び出し側。"""
+        evicted = []
+        total = self._total_locked()
+        while total > self.max_bytes and len(self._entries) > 1:
+            key, value = self._entries.popitem(last=False)
+            total -= _array_bytes(value)
+            evicted.append(value)
+            logging.info(f"HRTF cache: evicted {key}")
+        self.evictions += len(evicted)
+        return evicted, total
+
+    def _stats_locked(self, total: int) -> Dict[str, int]:
+        return {"entries": len(self._entries), "bytes": total, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    @property
+    def nbytes(self) -> int:
+        with self._lock:
+            return self._total_locked()
+
+    def stats(self) -> Dict[str, int]:
+        """エントリ数・大きさ・回数を、ロックの中でまとめて取った値で返す。"""
+        with self._lock:
+            return self._stats_locked(self._total_locked())
+
+    def clear(self) -> None:
+        with self._lock:
+            values = list(self._entries.values())
+            self._entries.clear()
+        for value in values:
+            _close(value)
+
+
+_default_cache: Optional[HRTFCache] = None
+
+
+def get_hrtf_cache() -> HRTFCache:
+    """このプロセスのレンダリングで共有するキャッシュ。"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = HRTFCache()
+    return _default_cache
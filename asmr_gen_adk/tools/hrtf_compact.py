@@ -0,0 +1,224 @@
+"""
+HRIRのコンパクト化
+
+バイノーラル畳み込みのコストはHRIRの長さで決まるが、元のHRIRには頭の遅延（到達までの無音）と
+エネルギーの小さい長い裾が含まれている。ここでは各方向・各耳のHRIRを
+
+- 最小位相のHRIR（振幅特性は元のまま、遅延なし）
+- 耳ごとの遅延（両耳の差が ITD）
+
+に分け、最小位相HRIRをエネルギー基準で切り詰める。遅延はレンダラー側で
+整数サンプルのずらし（出力位置。FFT長には含めない） + Lagrange 補間の分数遅延フィルタとして与える。
+切り詰めによる振幅特性の誤差（dB）を計算し、閾値を超える場合は長さを伸ばす。
+結果はHRIRの内容のハッシュごとに .npz としてキャッシュする。
+"""
+
+import hashlib
+import logging
+import os
+from typing import Dict, Optional
+
+import numpy as np
+import spaudiopy as spa
+import yaml
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_compact_config = config.get("hrtf", {}).get("compact", {})
+COMPACT_ENABLED = _compact_config.get("enabled", False)
+CACHE_DIR = _compact_config.get("cache_dir", "asmr_gen_adk/output/hrtf_cache")
+# 切り詰め後に残すエネルギー（切り捨てる裾のエネルギーがこれ以下になる長さ）
+RESIDUAL_ENERGY_DB = _compact_config.get("residual_energy_db", -40.0)
+# 振幅特性の誤差の上限（方向毎のRMS誤差の最大値, dB）
+MAX_SPECTRAL_ERROR_DB = _compact_config.get("max_spectral_error_db", 1.0)
+# 誤差を評価する帯域
+ERROR_BAND_HZ = (100.0, 16000.0)
+# 低いサンプルレートでは帯域の上限をサンプルレートのこの割合までにする
+# （リサンプルしたHRIRはナイキスト付近が阻止域になり、分数遅延フィルタも平坦でなくなるため）
+ERROR_BAND_MAX_FRACTION = 0.45
+# 分数遅延フィルタ（Lagrange 補間）の次数。16kHz付近まで平坦にするため高めにする
+FRACTIONAL_DELAY_ORDER = 15
+
+_memory_cache: Dict[str, "CompactHRIRs"] = {}
+
+
+class CompactHRIRs:
+    """
+    spa.sig.HRIRs と同じ属性（left, right, azi, zen, fs）を持つ、レンダラー用のHRIR。
+    left/right は最小位相HRIRに分数遅延を畳み込んだフィルタ、offsets は耳ごとの整数遅延（サンプル）。
+    """
+
+    def __init__(self, minimum_phase_left, minimum_phase_right, delays, azi, zen, fs,
+                 original_length, spectral_error_db):
+        self.minimum_phase_left = minimum_phase_left
+        self.minimum_phase_right = minimum_phase_right
+        self.delays = delays  # (方向数, 2) 左右の遅延（サンプル、小数あり）
+        self.azi = azi
+        self.zen = zen
+        self.fs = fs
+        self.original_length = original_length
+        self.spectral_error_db = spectral_error_db
+        self.left, offset_l = _apply_fractional_delay(minimum_phase_left, delays[:, 0])
+        self.right, offset_r = _apply_fractional_delay(minimum_phase_right, delays[:, 1])
+        self.offsets = np.stack([offset_l, offset_r], axis=1)
+        self.num_grid_points = len(azi)
+        self.num_samples = self.left.shape[1]
+
+    @property
+    def itd(self) -> np.ndarray:
+        """方向毎の両耳間時間差（秒, 左 - 右）。"""
+        return (self.delays[:, 0] - self.delays[:, 1]) / self.fs
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "original_length": int(self.original_length),
+            "compact_length": int(self.minimum_phase_left.shape[1]),
+            "filter_length": int(self.num_samples),
+            "max_offset": int(self.offsets.max()),
+            "max_spectral_error_db": float(self.spectral_error_db.max()),
+            "max_abs_itd_ms": float(np.max(np.abs(self.itd)) * 1000),
+        }
+
+
+def _apply_fractional_delay(hrirs: np.ndarray, delays: np.ndarray):
+    """
+    遅延を整数部（出力位置のずらし）と分数部（Lagrange フィルタ）に分ける。
+    Lagrange 補間は遅延が次数/2付近で最も正確なので、遅延が足りる限り整数部の一部をフィルタ側に回す。
+    """
+    integer = np.floor(delays).astype(int)
+    shift = np.minimum(integer, FRACTIONAL_DELAY_ORDER // 2)
+    offsets = integer - shift
+    taps = np.stack([
+        spa.process.lagrange_delay(FRACTIONAL_DELAY_ORDER, s + d - i)
+        for s, d, i in zip(shift, delays, integer)
+    ])
+    filters = np.stack([np.convolve(h, t) for h, t in zip(hrirs, taps)])
+    return filters, offsets
+
+
+def minimum_phase(hrirs: np.ndarray, nfft: Optional[int] = None) -> np.ndarray:
+    """実ケプストラムによる最小位相化（行ごと）。時間エイリアスを避けるため長めのFFTを使う。"""
+    n = hrirs.shape[-1]
+    nfft = nfft or 8 * int(2 ** np.ceil(np.log2(n)))
+    log_magnitude = np.log(np.maximum(np.abs(np.fft.rfft(hrirs, nfft)), 1e-8))
+    cepstrum = np.fft.irfft(log_magnitude, nfft)
+    fold = np.zeros(nfft)
+    fold[0] = 1.0
+    fold[1:nfft // 2] = 2.0
+    fold[nfft // 2] = 1.0
+    return np.fft.irfft(np.exp(np.fft.rfft(cepstrum * fold, nfft)), nfft)[..., :n]
+
+
+def estimate_delays(hrirs: np.ndarray, minimum_phase_hrirs: np.ndarray, fs: int,
+                    max_frequency: float = 3000.0) -> np.ndarray:
+    """
+    元のHRIRと最小位相HRIRの位相差（過剰位相）の低域での傾き（群遅延）を遅延（小数サンプル）とする。
+    ITD の知覚に効くのは低域の位相差なので、max_frequency 以下を振幅で重み付けして平均する。
+    """
+    n = hrirs.shape[-1]
+    nfft = 8 * int(2 ** np.ceil(np.log2(n)))
+    spectrum = np.fft.rfft(hrirs, nfft)
+    excess = spectrum * np.conj(np.fft.rfft(minimum_phase_hrirs, nfft))
+    band = slice(0, int(max_frequency / fs * nfft) + 1)
+    # 隣り合うビンの位相差（群遅延）を使えば unwrap が要らず、ノッチ付近の位相の飛びに影響されない
+    step = excess[..., band][..., 1:] * np.conj(excess[..., band][..., :-1])
+    weight = np.minimum(np.abs(spectrum[..., band][..., 1:]), np.abs(spectrum[..., band][..., :-1])) ** 2
+    group_delay = -np.angle(step) / (2 * np.pi / nfft)
+    return np.sum(weight * group_delay, axis=-1) / np.sum(weight, axis=-1)
+
+
+def energy_length(hrirs: np.ndarray, residual_energy_db: float = RESIDUAL_ENERGY_DB) -> int:
+    """
+    HRIRセット全体のエネルギー減衰で、切り捨てる裾のエネルギーが residual_energy_db 以下になる最短の長さ。
+    （一部の方向の測定ノイズの裾で全体の長さが決まらないよう、方向毎ではなく合計で見る）
+    """
+    energy = np.sum(hrirs.reshape(-1, hrirs.shape[-1]) ** 2, axis=0)
+    remaining = energy.sum() - np.cumsum(energy)
+    return int(np.argmax(remaining <= energy.sum() * 10 ** (residual_energy_db / 10))) + 1
+
+
+def spectral_error_db(reference: np.ndarray, candidate: np.ndarray, fs: int, nfft: int = 1024) -> np.ndarray:
+    """ERROR_BAND_HZ の範囲での、振幅特性の差（dB）の方向毎のRMS。"""
+    nfft = max(nfft, int(2 ** np.ceil(np.log2(reference.shape[-1]))))
+    freqs = np.fft.rfftfreq(nfft, 1 / fs)
+    band = (freqs >= ERROR_BAND_HZ[0]) & (freqs <= min(ERROR_BAND_HZ[1], ERROR_BAND_MAX_FRACTION * fs))
+    ref = 20 * np.log10(np.maximum(np.abs(np.fft.rfft(reference, nfft))[..., band], 1e-6))
+    cand = 20 * np.log10(np.maximum(np.abs(np.fft.rfft(candidate, nfft))[..., band], 1e-6))
+    return np.sqrt(np.mean((ref - cand) ** 2, axis=-1))
+
+
+def _fade_out(hrirs: np.ndarray, length: int) -> np.ndarray:
+    """切り詰めた末尾を短い半ハン窓で落とす（不連続によるリンギングを防ぐ）。"""
+    hrirs = hrirs[..., :length].copy()
+    fade = max(1, length // 8)
+    hrirs[..., -fade:] *= np.hanning(2 * fade)[fade:]
+    return hrirs
+
+
+def compact_hrirs(hrtf, residual_energy_db: float = RESIDUAL_ENERGY_DB,
+                  max_spectral_error_db: float = MAX_SPECTRAL_ERROR_DB) -> CompactHRIRs:
+    """HRIRセットを最小位相 + 遅延に分解し、誤差が閾値以内に収まる長さまで切り詰める。"""
+    original = np.stack([hrtf.left, hrtf.right]).astype(np.float64)  # (2, 方向数, 長さ)
+    n = original.shape[-1]
+    min_phase = np.stack([minimum_phase(original[0]), minimum_phase(original[1])])
+    delays = np.stack([estimate_delays(original[0], min_phase[0], hrtf.fs),
+                       estimate_delays(original[1], min_phase[1], hrtf.fs)], axis=1)
+
+    length = min(n, max(energy_length(min_phase, residual_energy_db), 2))
+    while True:
+        truncated = _fade_out(min_phase, length)
+        error = np.maximum(spectral_error_db(original[0], truncated[0], hrtf.fs),
+                           spectral_error_db(original[1], truncated[1], hrtf.fs))
+        if error.max() <= max_spectral_error_db or length >= n:
+            break
+        length = min(n, int(np.ceil(length * 1.25)))
+
+    compact = CompactHRIRs(truncated[0], truncated[1], delays, np.asarray(hrtf.azi), np.asarray(hrtf.zen), hrtf.fs,
+                           original_length=n, spectral_error_db=error)
+    # 報告する誤差は、分数遅延フィルタも含めてレンダラーが実際に使うフィルタで測る
+    compact.spectral_error_db = np.maximum(spectral_error_db(original[0], compact.left, hrtf.fs),
+                                           spectral_error_db(original[1], compact.right, hrtf.fs))
+    if compact.spectral_error_db.max() > max_spectral_error_db:
+        logging.warning(f"Compact HRIR spectral error {compact.spectral_error_db.max():.2f} dB "
+                        f"exceeds {max_spectral_error_db} dB")
+    logging.info(f"Compacted HRIRs: {compact.summary()}")
+    return compact
+
+
+def _cache_key(hrtf, residual_energy_db: float, max_spectral_error_db: float) -> str:
+    digest = hashlib.sha1()
+    for array in (hrtf.left, hrtf.right, hrtf.azi, hrtf.zen):
+        digest.update(np.ascontiguousarray(array, dtype=np.float64).tobytes())
+    digest.update(f"{hrtf.fs}/{residual_energy_db}/{max_spectral_error_db}/{FRACTIONAL_DELAY_ORDER}/"
+                  f"{ERROR_BAND_MAX_FRACTION}".encode())
+    return digest.hexdigest()[:16]
+
+
+def load_compact_hrirs(hrtf, cache_dir: Optional[str] = None, residual_energy_db: float = RESIDUAL_ENERGY_DB,
+                       max_spectral_error_db: float = MAX_SPECTRAL_ERROR_DB, memory_cache: bool = True) -> CompactHRIRs:
+    """
+    コンパクト化したHRIRをメモリ・ディスクのキャッシュから返す。無ければ作って保存する。
+    memory_cache=False ならメモリには残さない（呼び出し側のキャッシュ、hrtf_cache.py で大きさを管理する場合）。
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    key = _cache_key(hrtf, residual_energy_db, max_spectral_error_db)
+    if memory_cache and key in _memory_cache:
+        return _memory_cache[key]
+    path = os.path.join(cache_dir, f"compact_{key}.npz")
+    if os.path.exists(path):
+        data = np.load(path)
+        compact = CompactHRIRs(data["left"], data["right"], data["delays"], data["azi"], data["zen"], int(data["fs"]),
+                               int(data["original_length"]), data["spectral_error_db"])
+    else:
+        compact = compact_hrirs(hrtf, residual_energy_db, max_spectral_error_db)
+        os.makedirs(cache_dir, exist_ok=True)
+        # 書きかけのファイルを他のプロセスが読まないよう、一時ファイルから置き換える
+        tmp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(tmp_path, left=compact.minimum_phase_left, right=compact.minimum_phase_right, delays=compact.delays,
+                 azi=compact.azi, zen=compact.zen, fs=compact.fs, original_length=compact.original_length,
+                 spectral_error_db=compact.spectral_error_db)
+        os.replace(tmp_path, path)
+    if memory_cache:
+        _memory_cache[key] = compact
+    return compact
@@ -0,0 +1,193 @@
+"""
+マスタリング（後処理）
+
+レンダリング済みのステレオ出力を1回のSTFTで処理し、以下をまとめてスペクトルのゲインとして掛けてから
+重畳加算（OLA）で戻す。処理ごとにPedalboardを通して全体を何度も走査する代わりに、後処理全体で
+変換は順・逆の1組だけになる。
+
+- ディエッサー: 5〜8kHz帯のパワーが全帯域に対して閾値を超えたフレームで、その帯域だけを下げる
+  （左右で同じゲイン。ゲインはフレーム間で1次のスムージングを掛ける）
+- チルトEQ: 基準周波数からのオクターブ数に比例した固定のゲイン（高域をわずかに持ち上げて空気感を出す）
+- ノイズフロア: ブラウン/ピンク/ホワイトのノイズを、振幅を整形したスペクトル（位相は乱数）として足す。
+  乱数はフレームの絶対位置から決まるため、区間レンダリングでも同じノイズになる
+
+STFTはフレームをまとめて変換し（chunk_frames ずつ）、全体のスペクトルをメモリに持たない。
+設定は config.yaml の mastering セクションから読む。
+"""
+
+from typing import Optional
+
+import numpy as np
+import scipy.signal
+import yaml
+
+from .fft_backend import get_backend
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_mastering_config = config.get("mastering", {})
+MASTERING_ENABLED = _mastering_config.get("enabled", False)
+N_FFT = _mastering_config.get("n_fft", 2048)
+HOP = _mastering_config.get("hop", 512)
+# 1回に変換するフレーム数
+CHUNK_FRAMES = _mastering_config.get("chunk_frames", 256)
+
+_deesser_config = _mastering_config.get("deesser", {})
+DEESSER_ENABLED = _deesser_config.get("enabled", True)
+DEESSER_BAND_HZ = tuple(_deesser_config.get("band_hz", (5000.0, 8000.0)))
+# 帯域のパワー / 全帯域のパワー（dB）がこれを超えた分を ratio で圧縮する
+DEESSER_THRESHOLD_DB = _deesser_config.get("threshold_db", -15.0)
+DEESSER_RATIO = _deesser_config.get("ratio", 3.0)
+DEESSER_MAX_REDUCTION_DB = _deesser_config.get("max_reduction_db", 4.0)
+DEESSER_SMOOTHING_MS = _deesser_config.get("smoothing_ms", 20.0)
+# これ（dBFS, フレームのRMS）より小さいフレームでは働かせない。帯域の比は音量によらないため、
+# 無音に近いフレームのわずかな違いでゲインが動き、スムージングで次の発音まで残るのを防ぐ
+DEESSER_MIN_LEVEL_DB = _deesser_config.get("min_level_db", -60.0)
+
+_tilt_config = _mastering_config.get("tilt", {})
+TILT_DB_PER_OCTAVE = _tilt_config.get("db_per_octave", 0.3)
+TILT_PIVOT_HZ = _tilt_config.get("pivot_hz", 1000.0)
+TILT_MAX_DB = _tilt_config.get("max_db", 2.0)
+
+_noise_config = _mastering_config.get("noise_floor", {})
+NOISE_FLOOR_ENABLED = _noise_config.get("enabled", False)
+NOISE_FLOOR_DBFS = _noise_config.get("level_dbfs", -60.0)
+NOISE_COLOR = _noise_config.get("color", "brown")
+NOISE_SEED = 20241021
+
+# ノイズの色ごとのパワースペクトルの傾き（周波数の何乗か）
+_NOISE_EXPONENTS = {"white": 0.0, "pink": -1.0, "brown": -2.0}
+# 帯域の端のゲインをなだらかにつなぐ幅（オクターブ）
+_BAND_EDGE_OCTAVES = 0.25
+
+
+def _window(n_fft: int, hop: int):
+    window = scipy.signal.get_window("hann", n_fft)
+    # 分析窓 × 合成窓をずらして足した値（定数）で割ると、ゲインが1なら元の信号に戻る
+    return window, np.sum(window ** 2) / hop
+
+
+def tilt_gains(freqs: np.ndarray, db_per_octave: float = None, pivot_hz: float = None,
+               max_db: float = None) -> np.ndarray:
+    """チルトEQの振幅ゲイン（各周波数）。"""
+    db_per_octave = TILT_DB_PER_OCTAVE if db_per_octave is None else db_per_octave
+    pivot_hz = TILT_PIVOT_HZ if pivot_hz is None else pivot_hz
+    max_db = TILT_MAX_DB if max_db is None else max_db
+    octaves = np.log2(np.maximum(freqs, 1.0) / pivot_hz)
+    return 10 ** (np.clip(db_per_octave * octaves, -max_db, max_db) / 20)
+
+
+def _band_mask(freqs: np.ndarray, band_hz) -> np.ndarray:
+    """band_hz の内側で1、外側へ _BAND_EDGE_OCTAVES かけて0に下がる重み。"""
+    octaves = np.log2(np.maximum(freqs, 1.0))
+    lo, hi = np.log2(band_hz[0]), np.log2(band_hz[1])
+    rise = np.clip((octaves - (lo - _BAND_EDGE_OCTAVES)) / _BAND_EDGE_OCTAVES, 0.0, 1.0)
+    fall = np.clip(((hi + _BAND_EDGE_OCTAVES) - octaves) / _BAND_EDGE_OCTAVES, 0.0, 1.0)
+    return np.minimum(rise, fall)
+
+
+def _noise_magnitudes(freqs: np.ndarray, n_fft: int, norm: float, level_dbfs: float, color: str) -> np.ndarray:
+    """位相が一様乱数のとき、OLA後のノイズのRMSが level_dbfs になるビンごとの振幅。"""
+    if color not in _NOISE_EXPONENTS:
+        raise ValueError(f"Unknown noise color: {color}")
+    shape = np.zeros(len(freqs))
+    # 20Hz未満（とDC）にはノイズを入れない
+    audible = freqs >= 20.0
+    shape[audible] = freqs[audible] ** (_NOISE_EXPONENTS[color] / 2)
+    # 逆FFT後の1サンプルの分散は 2 Σ|X|^2 / n_fft^2、合成窓を掛けて重ねると norm 倍、最後に norm^2 で割る
+    variance = 2 * np.sum(shape ** 2) / n_fft ** 2 / norm
+    return shape * (10 ** (level_dbfs / 20) / np.sqrt(variance))
+
+
+def _noise_phases(first_frame: int, n_frames: int, channels: int, n_bins: int) -> np.ndarray:
+    """フレーム first_frame から n_frames 分の位相。乱数列をフレームの絶対位置まで進めてから引く。"""
+    bit_generator = np.random.PCG64(NOISE_SEED)
+    # random() は1つの値に64ビットの乱数を1回だけ使うので、位置は値の数で決まる
+    bit_generator.advance(first_frame * channels * n_bins)
+    return np.exp(2j * np.pi * np.random.Generator(bit_generator).random((n_frames, channels, n_bins)))
+
+
+def preroll_samples(sample_rate: int, threshold: float = 1e-6) -> int:
+    """区間だけを処理する時の助走: フレーム長と、ディエッサーのスムージングが threshold まで減衰する長さ。"""
+    smoothing = np.exp(-HOP / (DEESSER_SMOOTHING_MS / 1000 * sample_rate))
+    return N_FFT + int(np.ceil(np.log(threshold) / np.log(smoothing))) * HOP
+
+
+def _segment(audio: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """audio[start:stop]。範囲外はゼロ。"""
+    segment = np.zeros((stop - start, audio.shape[1]))
+    lo, hi = max(start, 0), min(stop, len(audio))
+    if hi > lo:
+        segment[lo - start:hi - start] = audio[lo:hi]
+    return segment
+
+
+def master(audio: np.ndarray, sample_rate: int, offset: int = 0, deesser: Optional[bool] = None,
+           tilt: bool = True, noise_floor: Optional[bool] = None) -> np.ndarray:
+    """
+    (サンプル数, チャンネル数) の音声にマスタリングを掛けて同じ長さで返す。
+    audio は全体の offset サンプル目から始まる区間。STFTのフレームは全体の先頭を基準に並べるため、
+    フレーム長とスムージングの分の助走があれば、区間の結果は全体を処理した同じ区間と一致する。
+    """
+    if N_FFT % HOP:
+        raise ValueError(f"mastering.n_fft ({N_FFT}) must be a multiple of mastering.hop ({HOP})")
+    deesser = DEESSER_ENABLED if deesser is None else deesser
+    noise_floor = NOISE_FLOOR_ENABLED if noise_floor is None else noise_floor
+    audio = np.atleast_2d(np.asarray(audio, dtype=np.float64).T).T
+    num_samples, channels = audio.shape
+    output = np.zeros_like(audio)
+    if num_samples == 0:
+        return output
+
+    backend = get_backend()
+    window, norm = _window(N_FFT, HOP)
+    window_power = np.mean(window ** 2)
+    freqs = np.fft.rfftfreq(N_FFT, 1 / sample_rate)
+    static_gains = tilt_gains(freqs) if tilt else np.ones(len(freqs))
+    band = _band_mask(freqs, DEESSER_BAND_HZ)
+    in_band = band > 0.5
+    smoothing = np.exp(-HOP / (DEESSER_SMOOTHING_MS / 1000 * sample_rate))
+    reduction_state = np.zeros(1)
+    if noise_floor:
+        noise = _noise_magnitudes(freqs, N_FFT, norm, NOISE_FLOOR_DBFS, NOISE_COLOR)
+
+    # フレーム j は全体の j * HOP - lead から N_FFT サンプル。各サンプルを N_FFT / HOP 個のフレームが覆う
+    lead = N_FFT - HOP
+    overlap = N_FFT // HOP
+    first_frame = offset // HOP
+    end_frame = -(-(offset + num_samples + lead) // HOP)
+    for chunk_start in range(first_frame, end_frame, CHUNK_FRAMES):
+        n_frames = min(CHUNK_FRAMES, end_frame - chunk_start)
+        start = chunk_start * HOP - lead - offset
+        samples = _segment(audio, start, start + (n_frames - 1) * HOP + N_FFT)
+        frames = np.lib.stride_tricks.sliding_window_view(samples, N_FFT, axis=0)[::HOP]
+        windowed = frames * window
+        spectra = backend.rfft(windowed, N_FFT, axis=2)  # (フレーム, チャンネル, ビン)
+
+        gains = np.broadcast_to(static_gains[None, :], (n_frames, len(freqs)))
+        if deesser:
+            power = np.sum(spectra.real ** 2 + spectra.imag ** 2, axis=1)
+            ratio_db = 10 * np.log10((np.sum(power[:, in_band], axis=1) + 1e-20) / (np.sum(power, axis=1) + 1e-20))
+            excess = np.maximum(ratio_db - DEESSER_THRESHOLD_DB, 0.0)
+            mean_square = np.mean(windowed ** 2, axis=(1, 2)) / window_power
+            excess[mean_square < 10 ** (DEESSER_MIN_LEVEL_DB / 10)] = 0.0
+            reduction = np.minimum(excess * (1 - 1 / DEESSER_RATIO), DEESSER_MAX_REDUCTION_DB)
+            reduction, reduction_state = scipy.signal.lfilter([1 - smoothing], [1, -smoothing], reduction,
+                                                              zi=reduction_state * smoothing)
+            reduction_state = reduction[-1:]
+            gains = gains * (1 - band[None, :] * (1 - 10 ** (-reduction[:, None] / 20)))
+        spectra *= gains[:, None, :]
+        if noise_floor:
+            spectra += noise * _noise_phases(chunk_start, n_frames, channels, len(freqs))
+
+        frames = backend.irfft(spectra, N_FFT, axis=2)
+        frames *= window / norm
+        # 重畳加算: フレームを HOP ごとの区切りに分け、区切りの位置ごとにまとめて足す
+        ola = np.zeros(((n_frames + overlap - 1) * HOP, channels))
+        for q in range(overlap):
+            part = frames[:, :, q * HOP:(q + 1) * HOP].transpose(0, 2, 1).reshape(-1, channels)
+            ola[q * HOP:(q + n_frames) * HOP] += part
+        a, b = max(start, 0), min(start + len(ola), num_samples)
+        output[a:b] += ola[a - start:b - start]
+    return output
@@ -0,0 +1,137 @@
+"""
+空間プランのコンパイラ
+
+LLMが生成したプラン（JSON）を検証して構造化NumPy配列に変換し、値を安全な範囲に収め、
+知覚上の許容誤差（角度・センチメートル）の範囲でキーフレームを間引く。
+
+レンダラーはパラメータが変わったブロックでクロスフェード（畳み込み2回）を行うため、
+微小な揺れを含む密なキーフレームをそのまま渡すと、聞き分けられない変化のために処理量が倍になる。
+間引きには Ramer–Douglas–Peucker 法を時間軸上で使い、各パラメータの線形補間からのずれが
+すべて許容誤差以内に収まる区間のキーフレームを取り除く。
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Union
+
+import numpy as np
+import yaml
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+PLAN_DTYPE = np.dtype([
+    ("time", np.float64),
+    ("azimuth", np.float32),
+    ("elevation", np.float32),
+    ("distance", np.float32),
+    ("reverb_mix", np.float32),
+])
+PARAMS = ["azimuth", "elevation", "distance", "reverb_mix"]
+
+# レンダラーが扱える範囲（方位角は範囲制限せず、±180°の境界をまたぐ移動を最短経路にする）
+ELEVATION_RANGE = (-90.0, 90.0)
+DISTANCE_RANGE = (0.1, 5.0)
+REVERB_MIX_RANGE = (0.0, 1.0)
+
+_compiler_config = config.get("plan_compiler", {})
+DEFAULT_TOLERANCES = {
+    "azimuth": _compiler_config.get("azimuth_tolerance_deg", 2.0),
+    "elevation": _compiler_config.get("elevation_tolerance_deg", 2.0),
+    "distance": _compiler_config.get("distance_tolerance_cm", 1.0) / 100.0,
+    "reverb_mix": _compiler_config.get("reverb_mix_tolerance", 0.005),
+}
+
+
+class SpatialPlanError(ValueError):
+    """空間プランの形式が不正。"""
+
+
+def parse_plan(plan: Union[str, List[Dict[str, Any]]]) -> np.ndarray:
+    """JSON文字列またはキーフレームのリストを検証し、時刻順の構造化配列にする。同時刻は後のものを採用する。"""
+    if isinstance(plan, str):
+        try:
+            plan = json.loads(plan)
+        except json.JSONDecodeError as e:
+            raise SpatialPlanError(f"Spatial plan is not valid JSON: {e}") from e
+    if not isinstance(plan, list):
+        raise SpatialPlanError("Spatial plan must be a list of keyframes.")
+
+    rows = []
+    for i, keyframe in enumerate(plan):
+        if not isinstance(keyframe, dict):
+            raise SpatialPlanError(f"Keyframe {i} is not an object.")
+        missing = [key for key in PLAN_DTYPE.names if key not in keyframe]
+        if missing:
+            raise SpatialPlanError(f"Keyframe {i} is missing {', '.join(missing)}.")
+        try:
+            row = tuple(float(keyframe[key]) for key in PLAN_DTYPE.names)
+        except (TypeError, ValueError) as e:
+            raise SpatialPlanError(f"Keyframe {i} has a non-numeric value.") from e
+        if not np.all(np.isfinite(row)):
+            raise SpatialPlanError(f"Keyframe {i} has a non-finite value.")
+        if row[0] < 0:
+            raise SpatialPlanError(f"Keyframe {i} has a negative time.")
+        rows.append(row)
+
+    compiled = np.array(rows, dtype=PLAN_DTYPE)
+    compiled = compiled[np.argsort(compiled["time"], kind="stable")]
+    # 同時刻のキーフレームは最後のものだけ残す
+    keep = np.append(np.diff(compiled["time"]) > 0, True) if len(compiled) else np.zeros(0, dtype=bool)
+    return compiled[keep]
+
+
+def clamp_plan(plan: np.ndarray) -> np.ndarray:
+    """値を安全な範囲に収める。方位角は連続になるよう展開する（170° → -170° は 170° → 190° として扱う）。"""
+    plan = plan.copy()
+    if len(plan) > 1:
+        plan["azimuth"] = np.rad2deg(np.unwrap(np.deg2rad(plan["azimuth"].astype(np.float64))))
+    plan["elevation"] = np.clip(plan["elevation"], *ELEVATION_RANGE)
+    plan["distance"] = np.clip(plan["distance"], *DISTANCE_RANGE)
+    plan["reverb_mix"] = np.clip(plan["reverb_mix"], *REVERB_MIX_RANGE)
+    return plan
+
+
+def simplify_plan(plan: np.ndarray, tolerances: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+    Ramer–Douglas–Peucker 法でキーフレームを間引く。
+    区間の両端を結ぶ線形補間からのずれを各パラメータの許容誤差で割り、最大値が1を超える点で分割する。
+    """
+    tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+    if len(plan) < 2:
+        return plan
+    plan = plan.copy()
+    # 全体が許容誤差の幅に収まるパラメータは、揺れを残さず一定値にする（クロスフェード自体を発生させない）
+    for p in PARAMS:
+        if np.ptp(plan[p]) <= tolerances[p]:
+            plan[p] = plan[p][0]
+    times = plan["time"]
+    values = np.stack([plan[p].astype(np.float64) for p in PARAMS], axis=1)
+    scale = np.array([max(tolerances[p], 1e-9) for p in PARAMS])
+
+    keep = np.zeros(len(plan), dtype=bool)
+    keep[[0, -1]] = True
+    stack = [(0, len(plan) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        inner = slice(first + 1, last)
+        ratio = ((times[inner] - times[first]) / (times[last] - times[first]))[:, None]
+        expected = values[first] + ratio * (values[last] - values[first])
+        error = np.max(np.abs(values[inner] - expected) / scale, axis=1)
+        worst = int(np.argmax(error))
+        if error[worst] > 1.0:
+            split = first + 1 + worst
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return plan[keep]
+
+
+def compile_plan(plan: Union[str, List[Dict[str, Any]]], tolerances: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """検証 → 範囲の制限 → 間引き を行い、レンダラーに渡す構造化配列を返す。"""
+    return simplify_plan(clamp_plan(parse_plan(plan)), tolerances)
+
+
+def to_keyframes(plan: np.ndarray) -> List[Dict[str, float]]:
+    return [{key: round(float(row[key]), 3) for key in PLAN_DTYPE.names} for row in plan]
@@ -0,0 +1,264 @@
+"""
+リアルタイム（低遅延）レンダリングエンジン
+
+空間プランを対話的に試聴するためのエンジン。オーディオコールバックから固定長のバッファ
+（128〜512サンプル）ごとに process() を呼ぶと、同じ長さのステレオ出力を返す。
+
+- 畳み込みは均一分割の重畳保存法（パーティション長 = バッファ長）。入力のスペクトルを
+  周波数領域の遅延線に溜め、全方向のHRIRを分割したスペクトルと掛けて足すため、
+  コールバック1回あたりの処理は順FFT1本 + 耳ごとの逆FFT1本で、追加の遅延はない
+- パラメータは set_params() でスレッドセーフな制御キューに送る。コールバックの先頭でキューを
+  読み切って最新の値を使い、HRIR・距離減衰・リバーブ量が変わったバッファ内でクロスフェードする
+  （遅延線は新旧のフィルタで共有できるため、切り替え時の追加コストは逆FFT2本のみ）
+- コールバック毎の処理時間をバッファの締め切り（バッファ長 / サンプルレート）と比べて記録する
+
+試聴用のため、オフラインレンダラーの方位角の揺らぎと近接効果は適用しない。
+実機なしでの駆動・検証には simulate_callback_loop() を使う。
+
+使い方:
+    python -m asmr_gen_adk.tools.realtime --input voice.wav --plan plan.json --buffer 256 --pace
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import time
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import soundfile as sf
+import spaudiopy as spa
+import yaml
+
+from ..telemetry import current_telemetry
+from .binaural_renderer import (TARGET_FS, _create_interpolators, _distance_attenuation, _get_hrtf, _preprocess_audio,
+                                _reverb_board)
+from .fft_backend import get_backend
+from .plan_compiler import compile_plan
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+_realtime_config = config.get("realtime", {})
+BUFFER_SIZE = _realtime_config.get("buffer_size", 256)
+REVERB_ENABLED = _realtime_config.get("reverb", True)
+
+CONTROL_PARAMS = ("azimuth", "elevation", "distance", "reverb_mix")
+# オフラインレンダラーと同じく、リバーブは最大でも5%
+MAX_REVERB_MIX = 0.05
+
+
+def partition_filters(hrtf, partition_size: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    全方向のHRIRを partition_size ごとに分割したスペクトル (方向数, 2, パーティション数, partition_size + 1) と、
+    方向・耳ごとの遅延線の読み出し位置 (方向数, 2)。
+    コンパクト化したHRTFの耳ごとの整数遅延は、パーティション単位の部分を遅延線の読み出し位置で与え、
+    残り（partition_size 未満）だけをフィルタに含める（遅延の分だけパーティションを増やさない）。
+    """
+    n_dirs, length = hrtf.left.shape
+    offsets = getattr(hrtf, 'offsets', None)
+    offsets = np.zeros((n_dirs, 2), dtype=int) if offsets is None else np.asarray(offsets, dtype=int)
+    starts, shifts = np.divmod(offsets, partition_size)
+    n_parts = -(-(length + int(shifts.max())) // partition_size)
+    filters = np.zeros((n_dirs, 2, n_parts * partition_size))
+    for idx in range(n_dirs):
+        for ear, irs in enumerate((hrtf.left, hrtf.right)):
+            filters[idx, ear, shifts[idx, ear]:shifts[idx, ear] + length] = irs[idx]
+    parts = filters.reshape(n_dirs, 2, n_parts, partition_size)
+    return get_backend().rfft(parts, 2 * partition_size, axis=3), starts
+
+
+class CallbackStats:
+    """コールバック毎の処理時間と、締め切り超過（オーバーラン）の集計。"""
+
+    def __init__(self, deadline_sec: float):
+        self.deadline_sec = deadline_sec
+        self.durations: List[float] = []
+
+    def add(self, duration_sec: float) -> None:
+        self.durations.append(duration_sec)
+
+    @property
+    def overruns(self) -> int:
+        return sum(1 for d in self.durations if d > self.deadline_sec)
+
+    def report(self) -> Dict[str, Any]:
+        if not self.durations:
+            return {"callbacks": 0, "deadline_ms": self.deadline_sec * 1000}
+        durations = np.array(self.durations)
+        return {
+            "callbacks": len(durations),
+            "deadline_ms": self.deadline_sec * 1000,
+            "mean_ms": float(durations.mean() * 1000),
+            "p99_ms": float(np.percentile(durations, 99) * 1000),
+            "max_ms": float(durations.max() * 1000),
+            "overruns": self.overruns,
+            # 処理時間 / 締め切り。1を超えたバッファは実機なら音切れになる
+            "max_load": float(durations.max() / self.deadline_sec),
+        }
+
+
+class RealtimeEngine:
+    """
+    process(block) は長さ buffer_size のモノラル入力を受け取り、(buffer_size, 2) の出力を返す。
+    set_params() は任意のスレッドから呼べる。params は開始時のパラメータ（クロスフェードなしで使う）。
+    """
+
+    def __init__(self, hrtf=None, buffer_size: int = BUFFER_SIZE, sample_rate: int = TARGET_FS,
+                 reverb: bool = REVERB_ENABLED, params: Optional[Dict[str, float]] = None):
+        hrtf = hrtf if hrtf is not None else _get_hrtf(sample_rate)
+        self.buffer_size = buffer_size
+        self.sample_rate = sample_rate
+        self.controls: "queue.SimpleQueue[Dict[str, float]]" = queue.SimpleQueue()
+        self.stats = CallbackStats(buffer_size / sample_rate)
+
+        backend = get_backend()
+        self._filters, self._starts = partition_filters(hrtf, buffer_size)
+        self._directions = np.stack(spa.utils.sph2cart(hrtf.azi, hrtf.zen), axis=1)
+        self._fdl = np.zeros((self._filters.shape[2] + int(self._starts.max()), buffer_size + 1),
+                             dtype=backend.complex_dtype)
+        self._input = np.zeros(2 * buffer_size)
+        self._input_plan = backend.plan(2 * buffer_size)
+        self._output_plan = backend.plan(2 * buffer_size, channels=2)
+        self._fade_in = np.linspace(0, 1, buffer_size)[:, None]
+        self._reverb = _reverb_board() if reverb else None
+
+        self.params = {"azimuth": 0.0, "elevation": 0.0, "distance": 1.0, "reverb_mix": 0.0, **(params or {})}
+        self._idx, self._gain, self._mix = self._resolve(self.params)
+
+    @property
+    def latency_samples(self) -> int:
+        return self.buffer_size
+
+    def set_params(self, **params: float) -> None:
+        """パラメータの一部または全部を制御キューに送る。次のコールバックから反映される。"""
+        unknown = set(params) - set(CONTROL_PARAMS)
+        if unknown:
+            raise ValueError(f"Unknown control parameter(s): {', '.join(sorted(unknown))}")
+        self.controls.put({key: float(value) for key, value in params.items()})
+
+    def _nearest(self, azimuth: float, elevation: float) -> int:
+        target = np.array(spa.utils.sph2cart(np.deg2rad(-azimuth), np.deg2rad(90 - elevation))).ravel()
+        return int(np.argmax(self._directions @ target))
+
+    def _resolve(self, params: Dict[str, float]) -> Tuple[int, float, float]:
+        return (self._nearest(params["azimuth"], params["elevation"]), _distance_attenuation(params["distance"]),
+                float(np.clip(params["reverb_mix"], 0.0, MAX_REVERB_MIX)))
+
+    def _apply_controls(self) -> None:
+        updated = False
+        while True:
+            try:
+                update = self.controls.get_nowait()
+            except queue.Empty:
+                break
+            self.params.update(update)
+            updated = True
+        if updated:
+            self._idx, self._gain, self._mix = self._resolve(self.params)
+
+    def _convolve(self, idx: int) -> np.ndarray:
+        n_parts = self._filters.shape[2]
+        start_l, start_r = self._starts[idx]
+        if start_l == start_r:
+            spectrum = np.einsum('pk,epk->ke', self._fdl[start_l:start_l + n_parts], self._filters[idx])
+        else:
+            # 耳ごとに遅延線の別の位置から読む
+            spectrum = np.stack([np.einsum('pk,pk->k', self._fdl[start:start + n_parts], self._filters[idx, ear])
+                                 for ear, start in enumerate((start_l, start_r))], axis=1)
+        return self._output_plan.inverse(spectrum)[self.buffer_size:]
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        start = time.perf_counter()
+        block = np.asarray(block, dtype=np.float64)
+        if block.shape != (self.buffer_size,):
+            raise ValueError(f"Expected a mono buffer of {self.buffer_size} samples, got shape {block.shape}")
+        previous = (self._idx, self._gain, self._mix)
+        self._apply_controls()
+
+        # 重畳保存: 直前のバッファと合わせた 2B サンプルを変換し、遅延線の先頭に入れる
+        self._input[:self.buffer_size] = self._input[self.buffer_size:]
+        self._input[self.buffer_size:] = block
+        self._fdl[1:] = self._fdl[:-1]
+        self._fdl[0] = self._input_plan.forward(self._input)
+
+        current = self._convolve(self._idx)
+        if self._idx != previous[0]:
+            output = self._convolve(previous[0]) * previous[1] * (1.0 - self._fade_in) + current * self._gain * self._fade_in
+        else:
+            # 同じHRIRなら距離減衰のランプを掛けるだけ
+            output = current * (previous[1] + (self._gain - previous[1]) * self._fade_in)
+
+        if self._reverb is not None:
+            wet = self._reverb.process(output.T.astype(np.float32), sample_rate=self.sample_rate, reset=False).T
+            mix = previous[2] + (self._mix - previous[2]) * self._fade_in
+            output = output * (1.0 - mix) + wet * mix
+
+        self.stats.add(time.perf_counter() - start)
+        return output
+
+
+def simulate_callback_loop(engine: RealtimeEngine, audio: np.ndarray,
+                           spatial_plan: Optional[Union[str, List[Dict[str, Any]]]] = None,
+                           pace: bool = False) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    オーディオデバイスの代わりにコールバックを順に呼ぶ。spatial_plan を渡すと、各バッファの開始時刻の
+    パラメータが変わった時に（操作画面のように）制御キューへ送る。pace=True ならバッファの周期に合わせて待つ。
+    出力 (len(audio), 2) とコールバックの集計を返す。
+    """
+    B = engine.buffer_size
+    n_buffers = -(-len(audio) // B)
+    padded = np.zeros(n_buffers * B)
+    padded[:len(audio)] = audio
+    output = np.zeros((n_buffers * B, 2))
+    interpolators = None
+    if spatial_plan is not None:
+        interpolators = _create_interpolators(compile_plan(spatial_plan), len(audio) / engine.sample_rate)
+    sent = None
+    period = B / engine.sample_rate
+    started = time.perf_counter()
+    for i in range(n_buffers):
+        if interpolators is not None:
+            params = {p: float(interpolators[p](i * period)) for p in CONTROL_PARAMS}
+            if params != sent:
+                engine.set_params(**params)
+                sent = params
+        if pace:
+            wait = started + i * period - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+        output[i * B:(i + 1) * B] = engine.process(padded[i * B:(i + 1) * B])
+    report = engine.stats.report()
+    current_telemetry().record("realtime", buffer_size=B, **report)
+    return output[:len(audio)], report
+
+
+def main():
+    p = argparse.ArgumentParser(description="Drive the real-time engine with a simulated audio callback loop.")
+    p.add_argument("--input", required=True, help="Mono WAV")
+    p.add_argument("--plan", help="Spatial plan JSON file (sent as live control updates)")
+    p.add_argument("--buffer", type=int, default=BUFFER_SIZE, help="Callback buffer size in samples")
+    p.add_argument("--pace", action="store_true", help="Call back at the real buffer period instead of as fast as possible")
+    p.add_argument("--output", help="Write the rendered preview to this WAV")
+    args = p.parse_args()
+
+    audio, sample_rate = sf.read(args.input)
+    audio = _preprocess_audio(audio, sample_rate)
+    spatial_plan = None
+    if args.plan:
+        with open(args.plan, "r", encoding="utf-8") as f:
+            spatial_plan = f.read()
+    engine = RealtimeEngine(buffer_size=args.buffer)
+    output, report = simulate_callback_loop(engine, audio, spatial_plan, pace=args.pace)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        sf.write(args.output, output, engine.sample_rate)
+    if report.get("overruns"):
+        logging.warning(f"{report['overruns']} callback(s) missed the {report['deadline_ms']:.2f} ms deadline")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
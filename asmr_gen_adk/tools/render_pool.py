@@ -0,0 +1,158 @@
+"""
+レンダリング用プロセスプール
+
+BinauralRenderer は同期かつCPU負荷の高い処理のため、ADKの非同期ランナー内で直接呼ぶと
+レンダリング中はイベントループ全体が止まり、並行する他のセッションも停止する。
+ここではレンダリングをプロセスプールに逃がし、await 可能なツールとして提供する。
+
+- 各ワーカーは起動時にHRTFを読み込んでおく（初回レンダリングの待ちを無くす）
+- asyncio のキャンセルは、待機中のジョブなら取り消し、実行中のジョブには
+  共有メモリのフラグで通知してブロック境界で中断させる
+"""
+
+import asyncio
+import contextlib
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+import yaml
+
+from .. import telemetry as telemetry_module
+from ..telemetry import current_telemetry, telemetry_run
+from .ambisonics import SPATIAL_MODE
+from .binaural_renderer import TARGET_FS, RenderCancelledError, _get_hrtf, _sh_filters, render_file
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+DEFAULT_WORKERS = config.get("render", {}).get("workers", 2)
+# 同時に投入できるジョブ数（キャンセルフラグのスロット数）
+MAX_IN_FLIGHT = 256
+
+# --- ワーカープロセス側 ---
+
+_worker_cancel_flags = None
+_worker_slot = -1
+
+
+def _init_worker(cancel_flags, preload_hrtf: bool, telemetry_paths=None) -> None:
+    global _worker_cancel_flags
+    _worker_cancel_flags = cancel_flags
+    if telemetry_paths is not None:
+        # 呼び出し元と同じファイルに書き出す（起動方法によっては config.yaml の既定値に戻るため）
+        telemetry_module.JSONL_PATH, telemetry_module.PROMETHEUS_PATH = telemetry_paths
+    if preload_hrtf:
+        try:
+            if SPATIAL_MODE == "ambisonic":
+                _sh_filters(TARGET_FS)
+            else:
+                _get_hrtf(TARGET_FS)
+        except Exception as e:
+            # 読み込みに失敗しても、レンダリング時に改めてエラーとして報告される
+            logging.warning(f"HRTF preload failed: {e}")
+
+
+def cancel_requested() -> bool:
+    """ワーカー内で実行中のジョブにキャンセルが要求されているか。"""
+    return _worker_slot >= 0 and bool(_worker_cancel_flags[_worker_slot])
+
+
+def _call_with_slot(slot: int, fn: Callable, args: tuple) -> Any:
+    global _worker_slot
+    _worker_slot = slot
+    try:
+        return fn(*args)
+    finally:
+        _worker_slot = -1
+
+
+def _render_binaural(mono_audio_path: str, spatial_plan_json: str, output_path: str,
+                     run_id: Optional[str] = None, hrtf_source: Optional[str] = None) -> Dict[str, str]:
+    try:
+        # 呼び出し元の run と同じIDで、ワーカー内のレンダリング工程を記録する（呼び出し元が計測していなければ記録しない）
+        with telemetry_run(run_id) if run_id is not None else contextlib.nullcontext():
+            return {"binaural_output_path": render_file(
+                mono_audio_path, spatial_plan_json, output_path, cancel_check=cancel_requested, hrtf_source=hrtf_source
+            )}
+    except RenderCancelledError:
+        return {"error": "Binaural rendering cancelled."}
+    except Exception as e:
+        logging.error(f"Binaural rendering failed: {e}", exc_info=True)
+        return {"error": f"Binaural rendering failed: {str(e)}"}
+
+
+# --- 呼び出し側 ---
+
+class RenderPool:
+    """キャンセル可能なジョブを実行する、HRTF読み込み済みワーカーのプロセスプール。"""
+
+    def __init__(self, workers: Optional[int] = None, preload_hrtf: bool = True):
+        self.workers = workers or DEFAULT_WORKERS
+        self._cancel_flags = multiprocessing.Array("b", MAX_IN_FLIGHT, lock=False)
+        self._free_slots = list(range(MAX_IN_FLIGHT))
+        self._lock = threading.Lock()
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self._cancel_flags, preload_hrtf,
+                      (telemetry_module.JSONL_PATH, telemetry_module.PROMETHEUS_PATH)),
+        )
+
+    def _acquire_slot(self) -> int:
+        with self._lock:
+            # スロットが尽きた場合でも実行はできる（実行開始後のキャンセルだけが効かない）
+            return self._free_slots.pop() if self._free_slots else -1
+
+    def _release_slot(self, slot: int) -> None:
+        if slot < 0:
+            return
+        with self._lock:
+            self._cancel_flags[slot] = 0
+            self._free_slots.append(slot)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """fn(*args) をワーカーで実行して結果を待つ。await がキャンセルされればジョブも中断する。"""
+        slot = self._acquire_slot()
+        future: Future = self._executor.submit(_call_with_slot, slot, fn, args)
+        future.add_done_callback(lambda _: self._release_slot(slot))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            self._request_cancel(future, slot)
+            raise
+
+    def _request_cancel(self, future: Future, slot: int) -> None:
+        if future.cancel() or slot < 0:
+            return
+        with self._lock:
+            # 完了済みならスロットは解放（再利用）されているのでフラグを立てない
+            if not future.done():
+                self._cancel_flags[slot] = 1
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_default_pool: Optional[RenderPool] = None
+
+
+def get_render_pool() -> RenderPool:
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = RenderPool()
+    return _default_pool
+
+
+async def BinauralRendererAsync(mono_audio_path: str, spatial_plan_json: str, output_path: str,
+                                hrtf_source: Optional[str] = None) -> Dict[str, str]:
+    """
+    BinauralRenderer の非同期版。レンダリングはプロセスプールで行い、イベントループを止めない。
+    HRTFは各ワーカーのLRUキャッシュに残るため、同じ hrtf_source の聴取者が続けば読み直さない。
+    """
+    telemetry = current_telemetry()
+    run_id = telemetry.run_id if telemetry.enabled else None
+    return await get_render_pool().run(_render_binaural, mono_audio_path, spatial_plan_json, output_path, run_id,
+                                       hrtf_source)
@@ -0,0 +1,93 @@
+"""
+レンダリングのトレース記録
+
+_render_binaural_dynamic_crossfade のブロック毎に、補間されたパラメータ、選ばれたHRIRの
+インデックス、クロスフェードの有無、FFT回数、CPU時間を NumPy の構造化配列に記録する。
+トレースを渡さない場合、レンダラー側の追加コストはブロック毎の None 判定のみ。
+
+使い方:
+    trace = RenderTrace()
+    make_asmr_audio(audio, sr, plan, trace=trace)
+    trace.save("render_trace.npy")
+    python -m asmr_gen_adk.tools.render_trace render_trace.npy
+"""
+
+import argparse
+import json
+from typing import Any, Dict
+
+import numpy as np
+
+TRACE_DTYPE = np.dtype([
+    ("start", np.int64),         # ブロック先頭のサンプル位置
+    ("azimuth", np.float32),     # 補間後の方位角（ジッター前）
+    ("elevation", np.float32),
+    ("distance", np.float32),
+    ("hrir_index", np.int32),    # このブロックの終わりで使われているHRIR
+    ("crossfade", np.bool_),     # パラメータが変化し、二重畳み込みになったか
+    ("hrir_lookups", np.int16),  # 最近傍方向の探索回数
+    ("ffts", np.int16),          # 実行したFFT（順・逆変換）の本数
+    ("cpu_sec", np.float32),     # ブロックのCPU時間
+])
+
+
+class RenderTrace:
+    """ブロック毎のトレースを溜める。配列は必要に応じて倍々で拡張する。"""
+
+    def __init__(self, capacity: int = 4096):
+        self.blocks = np.zeros(capacity, dtype=TRACE_DTYPE)
+        self.count = 0
+
+    def add(self, start, azimuth, elevation, distance, hrir_index, crossfade, hrir_lookups, ffts, cpu_sec) -> None:
+        if self.count == len(self.blocks):
+            self.blocks = np.resize(self.blocks, 2 * len(self.blocks))
+        self.blocks[self.count] = (start, azimuth, elevation, distance, hrir_index, crossfade, hrir_lookups, ffts, cpu_sec)
+        self.count += 1
+
+    @property
+    def records(self) -> np.ndarray:
+        return self.blocks[:self.count]
+
+    def save(self, path: str) -> None:
+        np.save(path, self.records)
+
+    @classmethod
+    def load(cls, path: str) -> "RenderTrace":
+        records = np.load(path)
+        trace = cls(capacity=max(len(records), 1))
+        trace.blocks[:len(records)] = records
+        trace.count = len(records)
+        return trace
+
+    def summary(self) -> Dict[str, Any]:
+        return summarize(self.records)
+
+
+def summarize(records: np.ndarray) -> Dict[str, Any]:
+    """トレースの集計（ブロック数、クロスフェード率、HRIR探索・FFTの総数、ブロック毎CPU時間の分布）。"""
+    if len(records) == 0:
+        return {"blocks": 0}
+    cpu = records["cpu_sec"].astype(np.float64)
+    return {
+        "blocks": int(len(records)),
+        "crossfades": int(np.count_nonzero(records["crossfade"])),
+        "crossfade_ratio": float(np.mean(records["crossfade"])),
+        "hrir_lookups": int(records["hrir_lookups"].sum()),
+        "hrir_switches": int(np.count_nonzero(np.diff(records["hrir_index"]))),
+        "ffts": int(records["ffts"].astype(np.int64).sum()),
+        "cpu_sec_total": float(cpu.sum()),
+        "cpu_sec_mean": float(cpu.mean()),
+        "cpu_sec_p95": float(np.percentile(cpu, 95)),
+        "cpu_sec_max": float(cpu.max()),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description="Summarize a render trace saved by RenderTrace.save().")
+    p.add_argument("trace", help="Trace file (.npy)")
+    args = p.parse_args()
+    print(json.dumps(RenderTrace.load(args.trace).summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
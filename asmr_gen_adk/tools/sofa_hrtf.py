@@ -0,0 +1,164 @@
+"""
+SOFAファイルのHRTF（遅延読み込み）
+
+SOFA（AES69, SimpleFreeFieldHRIR）の測定HRTFを、ファイル全体を読まずに使う。
+開く時に読むのは音源位置（SourcePosition）とサンプルレート、遅延（Data.Delay）だけで、
+HRIR（Data.IR）は方向ごとに必要になった時にHDF5から読み、レンダリングのレートに変換してキャッシュする。
+高密度の測定セット（数千方向）でも、メモリは軌道が実際に通った方向の数に比例する。
+
+- 方向の向きは SOFA の既定（聴取者は +x を向き、方位角は反時計回りで +90° が左、受音点 0 が左耳）とし、
+  ListenerView による回転は扱わない
+- 変換は _resample_hrtf と同じく soxr（VHQ）でレートの比を掛ける
+- 全方向が必要な処理（Ambisonicsのデコーダー、リアルタイムエンジン）は left / right を配列として使えば
+  まとめて読む。HRTFのコンパクト化（hrtf_compact.py）は全方向を解析するため、SOFAには掛けない
+
+SOFAはHDF5（netCDF-4）なので h5py が必要（requirements.txt に含む。無ければSOFAを開く時にエラー）。
+"""
+
+import logging
+import threading
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import soxr
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+def is_sofa(source: str) -> bool:
+    """hrtf.source がSOFAファイルのパスか。"""
+    return isinstance(source, str) and source.lower().endswith(".sofa")
+
+
+def _attr(dataset, name: str, default: str = "") -> str:
+    value = dataset.attrs.get(name, default)
+    return (value.decode() if isinstance(value, bytes) else str(value)).lower()
+
+
+def _source_directions(positions: np.ndarray, coordinate_type: str, units: str):
+    """SourcePosition (方向数, 3) から spaudiopy と同じ向きの方位角・天頂角（ラジアン）。"""
+    if coordinate_type == "cartesian":
+        x, y, z = positions[:, 0], positions[:, 1], positions[:, 2]
+        azi = np.arctan2(y, x)
+        zen = np.arccos(np.clip(z / np.maximum(np.sqrt(x ** 2 + y ** 2 + z ** 2), 1e-12), -1.0, 1.0))
+    elif coordinate_type == "spherical":
+        angles = positions[:, :2] if "radian" in units else np.deg2rad(positions[:, :2])
+        azi, zen = angles[:, 0], np.pi / 2 - angles[:, 1]
+    else:
+        raise ValueError(f"Unsupported SOFA SourcePosition type: {coordinate_type}")
+    return np.mod(azi, 2 * np.pi), zen
+
+
+class _EarView:
+    """片耳のHRIRを (方向数, 長さ) の配列のように読む。行を指定すれば、その方向だけをファイルから読む。"""
+
+    def __init__(self, hrirs: "SofaHRIRs", ear: int):
+        self._hrirs = hrirs
+        self._ear = ear
+
+    @property
+    def shape(self):
+        return (len(self._hrirs.azi), self._hrirs.length)
+
+    def __len__(self):
+        return len(self._hrirs.azi)
+
+    def __getitem__(self, key):
+        row, rest = (key[0], key[1:]) if isinstance(key, tuple) else (key, ())
+        if isinstance(row, (int, np.integer)):
+            ir = self._hrirs.pair(int(row))[self._ear]
+            return ir[rest] if rest else ir
+        return np.asarray(self)[key]
+
+    def __array__(self, dtype=None, copy=None):
+        irs = self._hrirs.read(range(len(self)))[:, self._ear]
+        return irs if dtype is None else irs.astype(dtype)
+
+
+class SofaHRIRs:
+    """
+    spa.sig.HRIRs と同じ属性（left, right, azi, zen, fs）を持つ、SOFAファイルのHRIRセット。
+    fs はレンダリングのレート（ファイルのレートと違えば方向ごとに変換する）。
+    """
+
+    def __init__(self, path: str, fs: Optional[int] = None):
+        if h5py is None:
+            raise ImportError("h5py is required to read SOFA HRTF files (pip install h5py)")
+        self.path = path
+        self._file = h5py.File(path, "r")
+        ir = self._file["Data.IR"]
+        if ir.ndim != 3 or ir.shape[1] != 2:
+            raise ValueError(f"{path}: expected Data.IR of shape (directions, 2, samples), got {ir.shape}")
+        positions = self._file["SourcePosition"]
+        self.azi, self.zen = _source_directions(np.broadcast_to(positions[()], (ir.shape[0], 3)),
+                                                _attr(positions, "Type", "spherical"),
+                                                _attr(positions, "Units", "degree"))
+        rates = np.unique(np.asarray(self._file["Data.SamplingRate"][()]).ravel())
+        if len(rates) != 1:
+            raise ValueError(f"{path}: directions with different sampling rates are not supported")
+        self.source_fs = int(rates[0])
+        self.fs = int(fs or self.source_fs)
+        # 受音点ごとの遅延（サンプル数）。HRIRの前にゼロを足して表す
+        delays = np.zeros((1, 2))
+        if "Data.Delay" in self._file:
+            delays = np.asarray(self._file["Data.Delay"][()], dtype=np.float64).reshape(-1, 2)
+        self._delays = np.rint(np.broadcast_to(delays, (ir.shape[0], 2))).astype(int)
+        source_length = ir.shape[2] + int(self._delays.max())
+        self.length = source_length if self.fs == self.source_fs else len(
+            soxr.resample(np.zeros(source_length), self.source_fs, self.fs, quality='VHQ'))
+        self._cache: Dict[int, np.ndarray] = {}
+        self._lock = threading.Lock()
+        self.left = _EarView(self, 0)
+        self.right = _EarView(self, 1)
+        logging.info(f"Opened SOFA HRTF {path}: {ir.shape[0]} directions at {self.source_fs} Hz "
+                     f"(rendering at {self.fs} Hz)")
+
+    @property
+    def cached_directions(self) -> int:
+        return len(self._cache)
+
+    @property
+    def cached_bytes(self) -> int:
+        return sum(pair.nbytes for pair in self._cache.values())
+
+    def pair(self, idx: int) -> np.ndarray:
+        """方向 idx の両耳のHRIR (2, 長さ)。"""
+        cached = self._cache.get(idx)
+        return cached if cached is not None else self.read([idx])[0]
+
+    def read(self, indices: Iterable[int]) -> np.ndarray:
+        """indices の方向のHRIR (方向数, 2, 長さ)。キャッシュにない方向は1回の読み込みでまとめて読む。"""
+        indices = [int(i) for i in indices]
+        with self._lock:
+            missing = sorted(set(indices) - self._cache.keys())
+            if missing:
+                if not self._file:
+                    # キャッシュから追い出されて閉じた後も、使用中のレンダリングは読み続けられる
+                    self._file = h5py.File(self.path, "r")
+                # h5py の座標指定は昇順のみ
+                raw = np.asarray(self._file["Data.IR"][missing, :, :], dtype=np.float64)
+                for idx, pair in zip(missing, self._convert(raw, missing)):
+                    self._cache[idx] = pair
+            return np.stack([self._cache[i] for i in indices]) if indices else np.zeros((0, 2, self.length))
+
+    def _convert(self, raw: np.ndarray, indices) -> np.ndarray:
+        """ファイルのHRIR (方向数, 2, サンプル数) に遅延を足し、レンダリングのレートに変換する。"""
+        n_dirs, _, n = raw.shape
+        source_length = n + int(self._delays.max())
+        delayed = np.zeros((n_dirs, 2, source_length))
+        for row, idx in enumerate(indices):
+            for ear in range(2):
+                shift = self._delays[idx, ear]
+                delayed[row, ear, shift:shift + n] = raw[row, ear]
+        if self.fs == self.source_fs:
+            return delayed
+        # 各方向・各耳をチャンネルとして一度に変換する
+        channels = delayed.reshape(-1, source_length).T
+        resampled = soxr.resample(channels, self.source_fs, self.fs, quality='VHQ').T * (self.source_fs / self.fs)
+        return np.ascontiguousarray(resampled.reshape(n_dirs, 2, -1))
+
+    def close(self) -> None:
+        self._file.close()
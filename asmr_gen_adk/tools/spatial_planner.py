@@ -0,0 +1,118 @@
+import json
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+# spatial_plan_agent のプロンプトと同じASMR向け制約
+MIN_DISTANCE = 0.1
+MAX_DISTANCE = 0.3
+MAX_REVERB_MIX = 0.03
+MAX_AZIMUTH_SPEED = 30.0  # degrees/sec
+
+# 冒頭は正面の少し離れた位置から近づく
+INITIAL_STATE = {"azimuth": 0.0, "distance": MAX_DISTANCE, "reverb_mix": 0.0}
+
+_BRACKET_CUE = re.compile(r"\[([^\]]*)\]")
+
+# (キーワード, 方位角) 先に一致したものを採用する
+_AZIMUTH_RULES = [
+    ("右耳", 80.0),
+    ("左耳", -80.0),
+    ("右後ろ", 135.0),
+    ("左後ろ", -135.0),
+    ("右", 45.0),
+    ("左", -45.0),
+    ("背後", 180.0),
+    ("後ろ", 180.0),
+    ("正面", 0.0),
+    ("前", 0.0),
+]
+
+# (キーワード, 距離[m], リバーブ量)
+_DISTANCE_RULES = [
+    ("吐息がかかる", 0.1, 0.0),
+    ("耳元", 0.1, 0.0),
+    ("すぐ近く", 0.12, 0.0),
+    ("囁", 0.15, 0.0),
+    ("近く", 0.2, 0.0),
+    ("離れ", MAX_DISTANCE, MAX_REVERB_MIX),
+    ("遠", MAX_DISTANCE, MAX_REVERB_MIX),
+]
+
+
+def parse_cue(cue: str) -> Dict[str, float]:
+    """角括弧の演出指示 1 つを、指定のある空間パラメータだけの辞書に変換する。"""
+    params = {}
+    for keyword, azimuth in _AZIMUTH_RULES:
+        if keyword in cue:
+            params["azimuth"] = azimuth
+            break
+    for keyword, distance, reverb_mix in _DISTANCE_RULES:
+        if keyword in cue:
+            params["distance"] = distance
+            params["reverb_mix"] = reverb_mix
+            break
+    return params
+
+
+def extract_cues(scene_elements: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """各セリフの演出指示を (開始時刻, パラメータ) のリストにする。空間指定のない指示は無視する。"""
+    cues = []
+    for element in scene_elements:
+        params = {}
+        for cue in _BRACKET_CUE.findall(element.get("script", "")):
+            params.update(parse_cue(cue))
+        if params:
+            cues.append({"time": float(element.get("start_time", 0.0)), **params})
+    return cues
+
+
+def _keyframe(time: float, state: Dict[str, float]) -> Dict[str, float]:
+    return {
+        "time": round(time, 3),
+        "azimuth": round(state["azimuth"], 2),
+        "elevation": 0.0,
+        "distance": round(min(max(state["distance"], MIN_DISTANCE), MAX_DISTANCE), 3),
+        "reverb_mix": round(min(max(state["reverb_mix"], 0.0), MAX_REVERB_MIX), 3),
+    }
+
+
+def build_spatial_plan(timed_script: Dict[str, Any]) -> Optional[List[Dict[str, float]]]:
+    """
+    タイムスタンプ付き脚本の演出指示から、決定的にキーフレーム列を生成する。
+    距離・リバーブ・仰角は範囲内に丸め、方位角は最大速度を超えないよう移動時間を確保する。
+    空間に関する演出指示が 1 つもなければ None を返す（LLMにフォールバック）。
+    """
+    cues = extract_cues(timed_script.get("scene_elements", []))
+    if not cues:
+        return None
+
+    state = dict(INITIAL_STATE)
+    plan = [_keyframe(0.0, state)]
+    for cue in sorted(cues, key=lambda c: c["time"]):
+        # 前の移動が終わる前に次の指示が来た場合は、到着後に移動を開始する
+        start = round(max(cue["time"], plan[-1]["time"]), 3)
+        target = {**state, **{k: v for k, v in cue.items() if k != "time"}}
+        if target == state:
+            continue
+        # 移動開始までは位置を保持（無音区間では動かない）
+        if start > plan[-1]["time"]:
+            plan.append(_keyframe(start, state))
+        travel = abs(target["azimuth"] - state["azimuth"]) / MAX_AZIMUTH_SPEED
+        # 距離だけの変化でも瞬間移動にならないよう最低 0.5 秒かける
+        # 丸めで速度制限を超えないよう、到着時刻はミリ秒単位で切り上げる
+        arrival = math.ceil(round((start + max(travel, 0.5)) * 1000, 6)) / 1000
+        plan.append(_keyframe(arrival, target))
+        state = target
+    return plan
+
+
+def build_spatial_plan_json(timed_script_json: str) -> Optional[str]:
+    """timed_script_json 文字列から空間プランのJSON文字列を生成する。指示がなければ None。"""
+    match = re.search(r'```(json)?\s*([\s\S]*?)\s*```', timed_script_json)
+    if match:
+        timed_script_json = match.group(2).strip()
+    plan = build_spatial_plan(json.loads(timed_script_json))
+    if plan is None:
+        return None
+    return json.dumps(plan, ensure_ascii=False)
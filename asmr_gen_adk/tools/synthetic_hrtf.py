@@ -0,0 +1,99 @@
+"""
+合成HRTF（球頭モデル）
+
+ダウンロードなしで使えるHRIRセットを、Brown & Duda (1998) の構造モデルで決定的に生成する。
+測定したHRTFの代わりにはならないが、左右の耳で異なる遅延（ITD）と頭部による高域の減衰（ILD）、
+耳介の反射による仰角ごとのノッチを持つため、レンダラーのテストやベンチマークの入力として使える。
+
+- 方向: 球面上のフィボナッチ格子（方向数は設定、既定512）
+- ITD: Woodworth の式（耳ごとの遅延を、耳の向きと音源方向のなす角から求める）
+- 頭部の影: 1次のシェルビング（耳の正面で高域 +6dB、裏側で約 -20dB）
+- 耳介: 仰角と方位角で遅延が変わる5つの反射
+
+spaudiopy.sig.HRIRs（left, right, azi, zen, fs）を返すので、spa.io.load_hrirs の結果と同じように扱える。
+"""
+
+import functools
+
+import numpy as np
+import spaudiopy as spa
+
+HEAD_RADIUS_M = 0.0875
+SPEED_OF_SOUND = 343.0
+NUM_DIRECTIONS = 512
+HRIR_LENGTH = 256
+# 頭の遅延（最も早く届く耳でもこれだけ遅れる）。切り詰めやコンパクト化で扱いやすいよう実測のHRIRに合わせる
+ONSET_SEC = 0.0005
+# 頭部の影: 耳の反対側で最も減衰する角度と、その時の高域のゲイン
+SHADOW_MIN_ANGLE_DEG = 150.0
+SHADOW_MIN_ALPHA = 0.1
+# 耳介の反射（Brown & Duda, 1998）: 反射係数、遅延の係数（44.1kHzのサンプル数）
+_PINNA_RHO = (0.5, -1.0, 0.5, -0.25, 0.25)
+_PINNA_A = (1.0, 5.0, 5.0, 5.0, 5.0)
+_PINNA_B = (2.0, 4.0, 7.0, 11.0, 13.0)
+_PINNA_D = (1.0, 0.5, 0.5, 0.5, 0.5)
+_PINNA_REFERENCE_FS = 44100
+# 分数遅延によるリンギングを抑えるため、ナイキスト周波数のこの割合から上をなだらかに落とす（測定したHRIRも帯域制限されている）
+ROLLOFF_START_FRACTION = 0.8
+
+
+def fibonacci_grid(n: int):
+    """球面上にほぼ均等に並ぶ n 方向（方位角, 天頂角; ラジアン）。"""
+    k = np.arange(n) + 0.5
+    zen = np.arccos(1 - 2 * k / n)
+    azi = np.mod(np.pi * (1 + 5 ** 0.5) * k, 2 * np.pi)
+    return azi, zen
+
+
+def _ear_response(freqs, incidence, azimuth_from_ear, elevation, delay):
+    """1つの耳の周波数特性。incidence は耳の向きと音源方向のなす角（ラジアン）。"""
+    omega = 2 * np.pi * freqs
+    omega0 = SPEED_OF_SOUND / HEAD_RADIUS_M
+    alpha = (1 + SHADOW_MIN_ALPHA / 2) + (1 - SHADOW_MIN_ALPHA / 2) * np.cos(
+        incidence / np.deg2rad(SHADOW_MIN_ANGLE_DEG) * np.pi)
+    shadow = (1 + 1j * alpha * omega / (2 * omega0)) / (1 + 1j * omega / (2 * omega0))
+    pinna = np.ones_like(omega, dtype=np.complex128)
+    for rho, a, b, d in zip(_PINNA_RHO, _PINNA_A, _PINNA_B, _PINNA_D):
+        tau = (a * np.cos(azimuth_from_ear / 2) * np.sin(d * (np.pi / 2 - elevation)) + b) / _PINNA_REFERENCE_FS
+        pinna += rho * np.exp(-1j * omega * tau)
+    # 反射を足した分、平均的な音量が変わらないようにする
+    pinna /= 1 + sum(abs(rho) for rho in _PINNA_RHO) / 2
+    return shadow * pinna * np.exp(-1j * omega * delay)
+
+
+def _woodworth_delay(incidence):
+    """耳に届くまでの遅延（頭の中心を基準, 秒）。"""
+    a_over_c = HEAD_RADIUS_M / SPEED_OF_SOUND
+    return np.where(incidence < np.pi / 2, -a_over_c * np.cos(incidence), a_over_c * (incidence - np.pi / 2))
+
+
+@functools.lru_cache(maxsize=None)
+def spherical_head_hrirs(fs: int, num_directions: int = NUM_DIRECTIONS, length: int = HRIR_LENGTH):
+    """球頭モデルのHRIRセット。同じ引数なら同じ（キャッシュされた）オブジェクトを返す。"""
+    azi, zen = fibonacci_grid(num_directions)
+    directions = np.stack(spa.utils.sph2cart(azi, zen), axis=1)
+    nfft = 4 * length
+    freqs = np.fft.rfftfreq(nfft, 1 / fs)
+    # 最も早い耳（真横からの音）でも ONSET_SEC だけ遅れるように、遅延の最小値 -a/c を足す
+    base_delay = ONSET_SEC + HEAD_RADIUS_M / SPEED_OF_SOUND
+    fade = np.cos(np.linspace(0, np.pi / 2, length // 4)) ** 2
+    nyquist = fs / 2
+    rolloff = np.cos(np.clip((freqs / nyquist - ROLLOFF_START_FRACTION) / (1 - ROLLOFF_START_FRACTION), 0.0, 1.0)
+                     * np.pi / 2) ** 2
+
+    irs = []
+    # 左耳は +y、右耳は -y を向く（spaudiopy の座標系では方位角 +90° が左）
+    for ear_axis in (np.array([0.0, 1.0, 0.0]), np.array([0.0, -1.0, 0.0])):
+        incidence = np.arccos(np.clip(directions @ ear_axis, -1.0, 1.0))
+        # 耳から見た方位角（耳の正面を0として、前後の向き）
+        azimuth_from_ear = np.arctan2(directions[:, 0], directions @ ear_axis)
+        elevation = np.pi / 2 - zen
+        ear = np.zeros((num_directions, length))
+        for idx in range(num_directions):
+            delay = base_delay + _woodworth_delay(incidence[idx])
+            spectrum = rolloff * _ear_response(freqs, incidence[idx], azimuth_from_ear[idx], elevation[idx], delay)
+            ir = np.fft.irfft(spectrum, nfft)[:length]
+            ir[-len(fade):] *= fade
+            ear[idx] = ir
+        irs.append(ear)
+    return spa.sig.HRIRs(irs[0], irs[1], azi, zen, fs)
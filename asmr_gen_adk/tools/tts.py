@@ -1,9 +1,14 @@
+import logging
 import os
+import time
+import uuid
 import wave
 from typing import Optional
 from google import genai
 from google.genai import types
 from datetime import datetime
+from ..telemetry import current_telemetry
+from .audio_analysis import analyze_wav
 
 AUDIO_DIR = os.path.join(os.path.dirname(__file__), "..", "output", "audio")
 os.makedirs(AUDIO_DIR, exist_ok=True)
@@ -25,7 +30,8 @@ def synthesize_tts(
 ) -> dict:
     if wav_path is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        wav_path = os.path.join(AUDIO_DIR, f"output_{timestamp}.wav")
+        # 同じ秒に並行して生成される音声（ジョブサーバー）が上書きし合わないよう、一意な接尾辞を付ける
+        wav_path = os.path.join(AUDIO_DIR, f"output_{timestamp}_{uuid.uuid4().hex[:8]}.wav")
     client = genai.Client()
     
     full_prompt = (
@@ -38,6 +44,7 @@ def synthesize_tts(
         f"{text}"
     )
     
+    start = time.perf_counter()
     resp = client.models.generate_content(
         model="gemini-2.5-pro-preview-tts",
         contents=full_prompt,
@@ -53,5 +60,21 @@ def synthesize_tts(
         ),
     )
     data = resp.candidates[0].content.parts[0].inline_data.data
+    wall_sec = time.perf_counter() - start
+    # 24kHz / 16bit / モノラルのPCM
+    audio_sec = len(data) / (24000 * 2)
+    usage = resp.usage_metadata
+    current_telemetry().record(
+        "tts", kind="tts", duration_sec=wall_sec, audio_sec=audio_sec,
+        audio_sec_per_wall_sec=audio_sec / wall_sec if wall_sec > 0 else None,
+        tokens_in=usage.prompt_token_count if usage else None,
+        tokens_out=usage.candidates_token_count if usage else None,
+    )
     _save_wav(wav_path, data)
+    # 後の工程（対応付け・トリミング）が使うフレーム毎の特徴量を、この音声について1回だけ求めて保存する
+    try:
+        analyze_wav(wav_path, save=True)
+    except Exception as e:
+        # 解析結果が無くても、後の工程が読み込む時に改めて解析する
+        logging.warning(f"Audio analysis failed: {e}")
     return {"wav_path": wav_path}
\ No newline at end of file
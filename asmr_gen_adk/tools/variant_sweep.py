@@ -0,0 +1,143 @@
+"""
+空間プランのバリエーションの一括レンダリング（A/Bテスト用）
+
+同じTTS音声を、空間プラン・HRTF・リバーブだけを変えた 5〜20 通りでレンダリングする。
+BinauralRenderer を通常どおり呼ぶと、バリエーションごとにデコード・リサンプリング・HRTFの読み込み・
+入力ブロックのFFTをやり直すため、ここではそれらを1回だけ行って全バリエーションで共有する。
+
+- デコードとリサンプリングは1回だけ
+- HRTFは識別子ごとに1回だけ読み込む（プロセス内のLRUキャッシュ経由。方向ごとの周波数特性も共有される）
+- 入力ブロックの周波数特性（BlockSpectra）は、FFT長（HRIRの長さで決まる）ごとに1回だけまとめて変換する。
+  各バリエーションで変換するのは、HRIRを切り替えるブロックのフェードアウト・フェードイン側（他のバリエーションと共有）と
+  逆変換だけ
+- バリエーションはスレッドで並列にレンダリングし、共有する配列はコピーしない
+- 出力は output_dir/<名前>.wav（export_extras を渡せば export 設定の他の形式も）
+
+経路は render.spatial_mode: direct の声1つのレンダリング（make_asmr_audio の sources なし）と同じで、
+結果もバリエーションごとに make_asmr_audio を呼んだ場合と一致する。
+共有する周波数特性の大きさは、入力の長さ × FFT長（HRTFの種類ごと）に比例する。
+
+並列数は config.yaml の sweep.workers。
+
+使い方:
+    python -m asmr_gen_adk.tools.variant_sweep --input voice.wav --variants variants.json --output-dir out/
+"""
+
+import argparse
+import contextvars
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import soundfile as sf
+import yaml
+
+from ..telemetry import current_telemetry
+from .binaural_renderer import (BlockSpectra, _create_interpolators, _fft_length, _filter_length, _finish_render,
+                                _preprocess_audio, _prepared_hrtf, _render_binaural_dynamic_crossfade, _render_rate)
+from .export import export_audio
+from .plan_compiler import compile_plan
+
+with open("config.yaml", "r") as f:
+    config = yaml.safe_load(f)
+
+SWEEP_WORKERS = config.get("sweep", {}).get("workers", 4)
+
+
+def _variant_names(variants: List[Dict[str, Any]]) -> List[str]:
+    """各バリエーションの出力ファイル名（拡張子なし）。name が無ければ通し番号。"""
+    names = [str(variant.get("name", f"variant_{i:02d}")) for i, variant in enumerate(variants)]
+    for name in names:
+        if not re.fullmatch(r"[\w.-]+", name):
+            raise ValueError(f"Variant name must be usable as a file name: {name!r}")
+    if len(set(names)) != len(names):
+        raise ValueError("Variant names must be unique")
+    return names
+
+
+def render_variants(audio_data: np.ndarray, sample_rate: int, variants: List[Dict[str, Any]], output_dir: str,
+                    normalize: bool = True, native_rate: Optional[bool] = None,
+                    workers: Optional[int] = None,
+                    export_extras: Union[bool, Sequence[str]] = False) -> Dict[str, Dict[str, str]]:
+    """
+    variants は {"name": 名前, "spatial_plan": [...] または JSON文字列, "hrtf_source": HRTFの識別子,
+    "reverb": {"room_size", "damping", "wet_level"} の上書き} のリスト（spatial_plan 以外は省略可）。
+    全バリエーションを output_dir にレンダリングし、{名前: {形式: パス}} を返す。
+    export_extras は export.extras の追加形式（render_file と同じ）。
+    """
+    names = _variant_names(variants)
+    telemetry = current_telemetry()
+    fs, block_size = _render_rate(sample_rate, native_rate)
+
+    # 1. 前処理（1回だけ）
+    with telemetry.span("sweep.preprocess"):
+        audio_float = _preprocess_audio(audio_data, sample_rate, fs)
+    duration_sec = len(audio_float) / fs
+
+    # 2. HRTFと、そのHRIRの長さに合わせた入力ブロックの周波数特性（それぞれ1回だけ）
+    hrtfs = {}
+    spectra: Dict[int, BlockSpectra] = {}
+    with telemetry.span("sweep.spectra"):
+        for variant in variants:
+            source = variant.get("hrtf_source")
+            if source not in hrtfs:
+                hrtfs[source] = _prepared_hrtf(fs, source)
+            n_fft = _fft_length(block_size, _filter_length(hrtfs[source].hrtf))
+            if n_fft not in spectra:
+                spectra[n_fft] = BlockSpectra(audio_float, block_size, n_fft, precompute=True)
+    logging.info(f"Sweeping {len(variants)} variants over {duration_sec:.1f}s of audio "
+                 f"({len(hrtfs)} HRTF set(s), {len(spectra)} shared input spectra)")
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    def render(name, variant):
+        with telemetry.span("sweep.variant", variant=name):
+            hrtf = hrtfs[variant.get("hrtf_source")]
+            plan = variant.get("spatial_plan", [])
+            interpolators = _create_interpolators(compile_plan(plan), duration_sec)
+            output_dry, distance_curve = _render_binaural_dynamic_crossfade(
+                audio_float, hrtf, interpolators, block_size=block_size, fs=fs,
+                input_spectra=spectra[_fft_length(block_size, _filter_length(hrtf.hrtf))])
+            output, output_fs = _finish_render(output_dry, np.mean(distance_curve), interpolators, len(audio_float),
+                                               normalize, fs, reverb=variant.get("reverb"))
+            return export_audio(output, output_fs, os.path.join(output_dir, f"{name}.wav"), extras=export_extras)
+
+    # テレメトリ（contextvars）を各スレッドに引き継ぐ
+    with ThreadPoolExecutor(max_workers=max(1, min(workers or SWEEP_WORKERS, len(variants)))) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, render, name, variant)
+                   for name, variant in zip(names, variants)]
+        results = [future.result() for future in futures]
+    telemetry.record("sweep", kind="sweep", variants=len(variants), audio_sec=duration_sec,
+                     shared_spectra_bytes=sum(s.nbytes for s in spectra.values()))
+    return dict(zip(names, results))
+
+
+def render_variants_file(mono_audio_path: str, variants: List[Dict[str, Any]], output_dir: str,
+                         **kwargs) -> Dict[str, Dict[str, str]]:
+    audio_data, sample_rate = sf.read(mono_audio_path)
+    return render_variants(audio_data, sample_rate, variants, output_dir, **kwargs)
+
+
+def main():
+    p = argparse.ArgumentParser(description="Render spatial plan / HRTF / reverb variants of one voice track.")
+    p.add_argument("--input", required=True, help="Mono WAV")
+    p.add_argument("--variants", required=True,
+                   help="JSON file: [{\"name\", \"spatial_plan\", \"hrtf_source\"?, \"reverb\"?}]")
+    p.add_argument("--output-dir", required=True, help="Directory for <name>.wav")
+    p.add_argument("--workers", type=int, help="Variants rendered in parallel (default: sweep.workers)")
+    p.add_argument("--extras", action="store_true", help="Also write the export.extras formats (FLAC, OGG preview)")
+    args = p.parse_args()
+
+    with open(args.variants, "r", encoding="utf-8") as f:
+        variants = json.load(f)
+    outputs = render_variants_file(args.input, variants, args.output_dir, workers=args.workers,
+                                   export_extras=args.extras)
+    print(json.dumps(outputs, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ from scipy.interpolate import interp1d
 import librosa
 import os
 import argparse
+from .audio_analysis import saved_analysis
 
 # 処理のターゲットサンプルレート (HRTFデータと一致させるため48kHzを推奨)
 TARGET_SAMPLE_RATE = 48000 
@@ -23,8 +24,13 @@ def load_audio_mono(file_path, sample_rate):
         raise e
 
     # ASMR向け前処理: 微小な無音部分のトリミング (Doc 2.4)
-    # top_db=30 は比較的静かな音も残す設定
-    audio, _ = librosa.effects.trim(audio, top_db=30)
+    # top_db=30 は比較的静かな音も残す設定。TTS後に保存した解析結果があれば、範囲はそのRMSから求める
+    analysis = saved_analysis(file_path)
+    if analysis is not None:
+        start, end = analysis.trim_bounds(top_db=30, sample_rate=sr)
+        audio = audio[start:end]
+    else:
+        audio, _ = librosa.effects.trim(audio, top_db=30)
     
     return audio, sr
 
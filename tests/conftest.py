@@ -0,0 +1,20 @@
+import os
+
+import pytest
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import binaural_renderer
+from asmr_gen_adk.tools.hrtf_cache import get_hrtf_cache
+
+
+@pytest.fixture(autouse=True)
+def offline_hrtf(monkeypatch):
+    """
+    テストではダウンロードの要らない球頭モデルのHRTFを使う（_load_hrtf を差し替えるテストはそちらが優先）。
+    HRTFのキャッシュは識別子で引くため、差し替えが前のテストの結果に隠れないよう毎回空にする。
+    """
+    monkeypatch.setattr(binaural_renderer, "HRTF_SOURCE", "synthetic")
+    get_hrtf_cache().clear()
@@ -0,0 +1,102 @@
+import pytest
+import os
+
+import numpy as np
+import scipy.signal
+import spaudiopy as spa
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import binaural_renderer
+from asmr_gen_adk.tools.ambisonics import encoder_gains, sh_binaural_filters, sh_matrix
+from asmr_gen_adk.tools.binaural_renderer import TARGET_FS, make_asmr_audio
+from asmr_gen_adk.tools.fft_backend import RealFFTPlan
+
+
+@pytest.fixture
+def dummy_hrtf(monkeypatch):
+    monkeypatch.setattr(binaural_renderer, "_load_hrtf", lambda fs, source=None: spa.io.load_hrirs(fs, filename="dummy"))
+
+
+def _static_interpolators(azimuth, elevation=0.0, distance=1.0):
+    plan = [{"time": 0.0, "azimuth": azimuth, "elevation": elevation, "distance": distance, "reverb_mix": 0.0}]
+    return binaural_renderer._create_interpolators(binaural_renderer.compile_plan(plan), 1.0)
+
+
+# --- Test Case 1: spherical harmonics and SH-domain filters ---
+
+def test_first_order_sh_are_real_n3d_acn():
+    rng = np.random.default_rng(0)
+    azi, zen = rng.uniform(0, 2 * np.pi, 20), rng.uniform(0, np.pi, 20)
+    Y = sh_matrix(1, azi, zen)
+    c0, c1 = np.sqrt(1 / (4 * np.pi)), np.sqrt(3 / (4 * np.pi))
+    expected = np.stack([np.full(20, c0), c1 * np.sin(zen) * np.sin(azi),
+                         c1 * np.cos(zen), c1 * np.sin(zen) * np.cos(azi)], axis=1)
+    np.testing.assert_allclose(Y, expected, atol=1e-12)
+
+
+def test_magls_keeps_high_frequency_magnitude():
+    """Above the transition frequency MagLS tracks the HRTF magnitude far better than a plain least-squares fit."""
+    hrtf = spa.io.load_hrirs(TARGET_FS, filename="dummy")
+    Y = sh_matrix(3, hrtf.azi, hrtf.zen)
+    freqs = np.fft.rfftfreq(1024, 1 / TARGET_FS)
+    band = (freqs >= 4000) & (freqs <= 16000)
+    reference = np.abs(np.fft.rfft(hrtf.left, 1024, axis=1))[:, band]
+
+    def rms_error_db(filters):
+        decoded = np.abs(np.fft.rfft(Y @ filters[0], 1024, axis=1))[:, band]
+        return np.sqrt(np.mean((20 * np.log10(decoded / reference)) ** 2))
+
+    assert rms_error_db(sh_binaural_filters(hrtf, 3)) < 2.0
+    assert rms_error_db(sh_binaural_filters(hrtf, 3, transition_hz=TARGET_FS)) > 5.0
+
+
+# --- Test Case 2: bus rendering ---
+
+def test_static_source_is_convolved_with_decoded_hrir(dummy_hrtf):
+    filters = sh_binaural_filters(binaural_renderer._load_hrtf(TARGET_FS))
+    audio = np.random.default_rng(1).uniform(-0.3, 0.3, 5000)
+    interpolators = _static_interpolators(azimuth=40.0, elevation=10.0, distance=0.5)
+
+    output = binaural_renderer._render_ambisonic_sources([(audio, interpolators, 0, 1.0)], filters, len(audio))
+
+    initial_jitter, _ = binaural_renderer._block_jitters(1)
+    gains = encoder_gains(40.0 + initial_jitter, 10.0) / 0.5
+    decoded = np.stack([gains @ filters[0], gains @ filters[1]], axis=1)
+    expected = scipy.signal.fftconvolve(audio[:, None], decoded, axes=0)
+    np.testing.assert_allclose(output, expected, atol=1e-9)
+
+
+def test_decode_cost_does_not_grow_with_sources(dummy_hrtf, monkeypatch):
+    filters = sh_binaural_filters(binaural_renderer._load_hrtf(TARGET_FS))
+    rng = np.random.default_rng(2)
+    calls = []
+    forward = RealFFTPlan.forward
+    monkeypatch.setattr(RealFFTPlan, "forward", lambda self, x: calls.append(1) or forward(self, x))
+
+    ffts = []
+    for n_sources in (1, 6):
+        calls.clear()
+        scene = [(rng.uniform(-0.3, 0.3, 20000), _static_interpolators(azimuth=30.0 * i), 0, 1.0)
+                 for i in range(n_sources)]
+        binaural_renderer._render_ambisonic_sources(scene, filters, 20000)
+        ffts.append(len(calls))
+    assert ffts[0] == ffts[1]
+
+
+def test_make_asmr_audio_ambisonic_mode(dummy_hrtf):
+    rng = np.random.default_rng(3)
+    voice = rng.uniform(-0.3, 0.3, 24000)
+    plan = [{"time": 0.0, "azimuth": -60, "elevation": 0, "distance": 0.4, "reverb_mix": 0.02},
+            {"time": 1.0, "azimuth": 60, "elevation": 0, "distance": 0.4, "reverb_mix": 0.02}]
+    breath = {"audio": rng.uniform(-0.3, 0.3, 6000), "sample_rate": 24000, "spatial_plan": plan, "start": 0.8}
+
+    output, output_sr = make_asmr_audio(voice, 24000, plan, sources=[breath], mode="ambisonic")
+    assert output_sr == TARGET_FS
+    assert output.shape == (int(1.05 * TARGET_FS), 2)
+    assert np.isclose(np.max(np.abs(output)), 0.98)
+
+    with pytest.raises(ValueError):
+        make_asmr_audio(voice, 24000, plan, mode="vbap")
@@ -6,7 +6,7 @@ from unittest.mock import AsyncMock, patch
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from asmr_gen_adk.agents.asmr_agent import _build_instruction
+from asmr_gen_adk.agents.asmr_agent import RENDER_TOOL, _build_instruction
 
 # --- Test Case 1: _build_instruction ---
 
@@ -62,8 +62,17 @@ async def test_build_instruction_prompt_generation():
     
     # Check that the final tool call is well-formed
     expected_tool_call = (
-        f"Call the tool with: `BinauralRenderer(mono_audio_path='{test_wav_path}', "
+        f"Call the tool with: `{RENDER_TOOL.__name__}(mono_audio_path='{test_wav_path}', "
         f"spatial_plan_json='''{cleaned_json}''', "
         f"output_path='{expected_output_path}')`"
     )
     assert expected_tool_call in prompt
+
+# --- Test Case 2: _defer_render ---
+
+def test_defer_render_skips_agent_only_when_flagged():
+    from types import SimpleNamespace
+    from asmr_gen_adk.agents.asmr_agent import _defer_render
+
+    assert _defer_render(SimpleNamespace(state={})) is None
+    assert _defer_render(SimpleNamespace(state={"defer_render": True})) is not None
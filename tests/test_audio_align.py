@@ -0,0 +1,99 @@
+import pytest
+import numpy as np
+import soundfile as sf
+import json
+import os
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools.audio_align import (
+    align_script_to_audio,
+    align_script_to_wav,
+    detect_speech_regions,
+    split_script,
+)
+
+SAMPLE_RATE = 24000
+
+
+def _make_speech(segments, sample_rate=SAMPLE_RATE):
+    """Builds noise bursts at the given (start, end) seconds, separated by digital silence."""
+    total = max(end for _, end in segments) + 1.0
+    audio = np.zeros(int(total * sample_rate), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    for start, end in segments:
+        s, e = int(start * sample_rate), int(end * sample_rate)
+        audio[s:e] = rng.uniform(-0.3, 0.3, size=e - s)
+    return audio
+
+
+# --- Test Case 1: detect_speech_regions ---
+
+def test_detect_speech_regions_finds_bursts():
+    segments = [(0.5, 1.5), (3.0, 4.0), (4.1, 5.0)]
+    regions = detect_speech_regions(_make_speech(segments), SAMPLE_RATE)
+
+    # The 0.1 s gap is shorter than a pause and gets merged
+    assert regions.shape == (2, 2)
+    np.testing.assert_allclose(regions[0], [0.5, 1.5], atol=0.05)
+    np.testing.assert_allclose(regions[1], [3.0, 5.0], atol=0.05)
+
+
+# --- Test Case 2: split_script ---
+
+def test_split_script_attaches_cues_to_next_sentence():
+    script = "[右耳元で囁く]\nねえ…起きてる？\n(吐息)\nおやすみなさい。"
+    assert split_script(script) == ["[右耳元で囁く]ねえ…", "起きてる？", "(吐息)おやすみなさい。"]
+
+
+# --- Test Case 3: align_script_to_audio ---
+
+def test_align_maps_regions_to_sentences():
+    script = "こんばんは。\nきょうもおつかれさまでした、ゆっくりやすんでね。\nおやすみ。"
+    # The middle sentence is split by a comma pause into two regions
+    segments = [(0.5, 1.5), (3.5, 5.0), (5.6, 7.0), (9.0, 10.0)]
+    result = align_script_to_audio(_make_speech(segments), SAMPLE_RATE, script)
+
+    assert result is not None
+    elements = result["scene_elements"]
+    assert [e["script"] for e in elements] == split_script(script)
+    assert elements[1]["start_time"] == pytest.approx(3.5, abs=0.05)
+    assert elements[1]["end_time"] == pytest.approx(7.0, abs=0.05)
+    assert all(e["speaker"] == "main character" for e in elements)
+
+
+def test_mixed_speakers_are_attributed_from_narration_markers():
+    script = ("ナレーション：夜、あなたの部屋に彼女が来た。\n"
+              "[右耳元で囁く]\nねえ…まだ起きてる？\n"
+              "【状況説明】彼女はそっと隣に座る。\n"
+              "おやすみ。")
+    assert split_script(script) == ["夜、あなたの部屋に彼女が来た。", "[右耳元で囁く]ねえ…", "まだ起きてる？",
+                                    "彼女はそっと隣に座る。", "おやすみ。"]
+    segments = [(0.5, 2.5), (3.5, 4.2), (4.8, 5.8), (7.0, 9.0), (10.0, 10.8)]
+    result = align_script_to_audio(_make_speech(segments), SAMPLE_RATE, script)
+
+    assert result is not None
+    assert [e["speaker"] for e in result["scene_elements"]] == [
+        "situation explainer", "main character", "main character", "situation explainer", "main character"]
+    # An explicit speaker still overrides the attribution
+    forced = align_script_to_audio(_make_speech(segments), SAMPLE_RATE, script, speaker="main character")
+    assert all(e["speaker"] == "main character" for e in forced["scene_elements"])
+
+
+def test_align_returns_none_when_ambiguous():
+    script = "ひとつめ。\nふたつめ。\nみっつめ。"
+    # Only two speech regions for three sentences
+    segments = [(0.5, 1.5), (3.0, 4.0)]
+    assert align_script_to_audio(_make_speech(segments), SAMPLE_RATE, script) is None
+
+
+def test_align_script_to_wav_outputs_json(tmp_path):
+    wav_path = tmp_path / "tts.wav"
+    sf.write(wav_path, _make_speech([(0.5, 1.5), (3.0, 4.0)]), SAMPLE_RATE)
+
+    timed_script_json = align_script_to_wav(str(wav_path), "ねえ。\nおやすみ。")
+    timed_script = json.loads(timed_script_json)
+    assert len(timed_script["scene_elements"]) == 2
+    assert timed_script["scene_elements"][1]["start_time"] == pytest.approx(3.0, abs=0.05)
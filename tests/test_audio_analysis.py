@@ -0,0 +1,136 @@
+import pytest
+import os
+import time
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import audio_analysis, wav_to_asmr
+from asmr_gen_adk.tools.audio_align import align_script_to_wav, detect_speech_regions
+from asmr_gen_adk.tools.audio_analysis import analysis_path, analyze_audio, analyze_wav, load_analysis, saved_analysis
+
+SAMPLE_RATE = 24000
+
+
+def _make_speech(segments, sample_rate=SAMPLE_RATE, total=None):
+    """Noise bursts at the given (start, end) seconds, separated by digital silence."""
+    total = total or max(end for _, end in segments) + 1.0
+    audio = np.zeros(int(total * sample_rate), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    for start, end in segments:
+        s, e = int(start * sample_rate), int(end * sample_rate)
+        audio[s:e] = rng.uniform(-0.3, 0.3, size=e - s)
+    return audio
+
+
+@pytest.fixture
+def take(tmp_path):
+    path = tmp_path / "take.wav"
+    sf.write(str(path), _make_speech([(0.5, 1.5), (3.0, 4.0), (4.1, 5.0)]), SAMPLE_RATE, subtype="PCM_16")
+    return str(path)
+
+
+# --- Test Case 1: feature table ---
+
+def test_feature_table():
+    audio = _make_speech([(0.5, 1.5), (3.0, 4.0), (4.1, 5.0)])
+    analysis = analyze_audio(audio, SAMPLE_RATE)
+    n_frames = len(analysis.rms)
+    assert all(len(x) == n_frames for x in (analysis.rms_db, analysis.onset, analysis.voiced, analysis.silent))
+    np.testing.assert_array_equal(analysis.regions, detect_speech_regions(audio, SAMPLE_RATE))
+    # One pause between the two merged speech regions
+    np.testing.assert_allclose(analysis.pauses, [[1.5, 3.0]], atol=0.05)
+
+    times = analysis.times
+    assert np.all(analysis.silent[(times > 2.0) & (times < 2.9)])
+    assert not np.any(analysis.silent[(times > 0.6) & (times < 1.4)])
+    # Onsets peak where a burst starts
+    assert min(abs(times[np.argmax(analysis.onset)] - start) for start in (0.5, 3.0, 4.1)) < 0.05
+
+
+def test_trim_bounds_replace_librosa_trim():
+    audio = _make_speech([(0.7, 2.2)], total=3.0)
+    analysis = analyze_audio(audio, SAMPLE_RATE)
+    start, end = analysis.trim_bounds(top_db=30)
+    burst_start, burst_end = int(0.7 * SAMPLE_RATE), int(2.2 * SAMPLE_RATE)
+    # The burst is kept, with at most one analysis frame of silence around it
+    assert burst_start - analysis.frame <= start <= burst_start
+    assert burst_end <= end <= burst_end + analysis.frame
+    # At least as tight as librosa.effects.trim (2048-sample frames)
+    _, (librosa_start, librosa_end) = librosa.effects.trim(audio, top_db=30)
+    assert librosa_start <= start and end <= librosa_end
+    # Bounds for the same audio resampled to 48 kHz
+    start_48, end_48 = analysis.trim_bounds(top_db=30, sample_rate=48000)
+    assert (start_48, end_48) == (2 * start, 2 * end)
+    assert analyze_audio(np.zeros(SAMPLE_RATE), SAMPLE_RATE).trim_bounds() == (0, 0)
+
+
+# --- Test Case 2: saved once, memory-mapped afterwards ---
+
+def test_saved_next_to_wav_and_memory_mapped(take, monkeypatch):
+    computed = analyze_wav(take)
+    assert os.path.exists(analysis_path(take))
+    assert analysis_path(take).endswith("take.analysis.npz")
+
+    monkeypatch.setattr(audio_analysis, "analyze_audio", lambda *a: pytest.fail("should not recompute"))
+    loaded = load_analysis(take)
+    assert isinstance(loaded.rms, np.memmap) and isinstance(loaded.onset, np.memmap)
+    for name in ("rms", "rms_db", "onset", "voiced", "silent", "regions", "pauses"):
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(computed, name))
+    assert (loaded.sample_rate, loaded.num_samples) == (computed.sample_rate, computed.num_samples)
+
+
+def test_recomputed_when_missing_or_stale(take):
+    # A WAV the pipeline did not analyze (a user's input) is analyzed in memory, without a file next to it
+    first = load_analysis(take)
+    assert not os.path.exists(analysis_path(take))
+    assert len(first.regions) == 2
+
+    # The take is replaced after its analysis was saved: the analysis follows it
+    analyze_wav(take)
+    time.sleep(0.01)
+    sf.write(take, _make_speech([(0.2, 0.8)], total=2.0), SAMPLE_RATE, subtype="PCM_16")
+    second = load_analysis(take)
+    assert second.num_samples == 2 * SAMPLE_RATE != first.num_samples
+    assert len(second.regions) == 1
+
+
+def test_unwritable_sidecar_falls_back_to_memory(take, monkeypatch):
+    def read_only(*args, **kwargs):
+        raise PermissionError("read-only directory")
+
+    monkeypatch.setattr(np, "savez", read_only)
+    analysis = analyze_wav(take)
+    assert not os.path.exists(analysis_path(take))
+    assert len(analysis.regions) == 2
+    assert not [p for p in os.listdir(os.path.dirname(take)) if p.endswith(".npz")]
+
+
+def test_alignment_reads_the_analysis(take, monkeypatch):
+    analyze_wav(take)
+    # Alignment no longer decodes the WAV
+    monkeypatch.setattr(sf, "read", lambda *a, **k: pytest.fail("should use the saved analysis"))
+    timed_script_json = align_script_to_wav(take, "ねえ。\nおやすみ。")
+    assert timed_script_json is not None and "おやすみ" in timed_script_json
+
+
+def test_trim_uses_the_saved_analysis_only(take, monkeypatch):
+    # Without a saved analysis, trimming keeps librosa.effects.trim and does not build the feature table
+    assert saved_analysis(take) is None
+    monkeypatch.setattr(audio_analysis, "analyze_audio", lambda *a: pytest.fail("should not analyze"))
+    audio, sr = wav_to_asmr.load_audio_mono(take, SAMPLE_RATE)
+    expected, _ = librosa.effects.trim(librosa.load(take, sr=SAMPLE_RATE, mono=True)[0], top_db=30)
+    np.testing.assert_array_equal(audio, expected)
+    assert not os.path.exists(analysis_path(take))
+
+    monkeypatch.undo()
+    analysis = analyze_wav(take)
+    monkeypatch.setattr(librosa.effects, "trim", lambda *a, **k: pytest.fail("should use the saved analysis"))
+    start, end = analysis.trim_bounds(top_db=30)
+    audio, _ = wav_to_asmr.load_audio_mono(take, SAMPLE_RATE)
+    assert len(audio) == end - start
@@ -0,0 +1,87 @@
+import pytest
+import os
+
+import soundfile as sf
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.benchmark import (
+    BenchmarkCase, build_matrix, compare_native_rate, find_regressions, load_baseline, make_plan, run_case, save_baseline,
+    write_test_signal,
+)
+
+
+# --- Test Case 1: matrix and inputs ---
+
+def test_default_matrix_covers_every_combination():
+    cases = build_matrix()
+    assert len(cases) == 3 * 4 * 2 * 3
+    assert len({c.case_id for c in cases}) == len(cases)
+    assert "binaural_renderer/3600s/48000Hz/dense" in {c.case_id for c in cases}
+
+
+@pytest.mark.parametrize("density, expected_keyframes", [("static", 1), ("slow_sweep", 4), ("dense", 121)])
+def test_plan_density(density, expected_keyframes):
+    plan = make_plan(density, 30.0)
+    assert len(plan) == expected_keyframes
+    assert plan[0]["time"] == 0.0
+    assert plan == make_plan(density, 30.0)  # reproducible
+
+
+def test_write_test_signal_in_chunks(tmp_path):
+    path = tmp_path / "input.wav"
+    write_test_signal(str(path), 2.5, 24000, chunk_sec=1.0)
+    info = sf.info(str(path))
+    assert info.samplerate == 24000
+    assert info.frames == 60000
+
+
+# --- Test Case 2: baseline comparison ---
+
+def _result(case_id, wall_sec, peak_rss_bytes, status="ok"):
+    return {"case_id": case_id, "status": status, "wall_sec": wall_sec,
+            "peak_rss_bytes": peak_rss_bytes, "real_time_factor": wall_sec / 10}
+
+
+def test_regressions_beyond_threshold_are_flagged(tmp_path):
+    baseline_path = str(tmp_path / "baseline.json")
+    save_baseline([_result("a", 1.0, 100), _result("b", 1.0, 100), _result("c", 1.0, 100, status="error")],
+                  baseline_path)
+    baseline = load_baseline(baseline_path)
+    assert set(baseline) == {"a", "b"}
+
+    regressions = find_regressions(
+        [_result("a", 1.1, 100), _result("b", 1.5, 130), _result("new", 9.0, 900)], baseline, threshold=0.2
+    )
+    assert {(g["case_id"], g["metric"]) for g in regressions} == {("b", "wall_sec"), ("b", "peak_rss_bytes")}
+
+
+def test_missing_baseline_is_empty(tmp_path):
+    assert load_baseline(str(tmp_path / "none.json")) == {}
+
+
+# --- Test Case 3: running a case in a fresh process ---
+
+def test_run_case_measures_time_and_memory(tmp_path):
+    result = run_case(BenchmarkCase("asmr_spatialize", 1.0, 24000, "slow_sweep"), str(tmp_path))
+    assert result["status"] == "ok", result.get("error")
+    assert result["wall_sec"] > 0
+    assert result["real_time_factor"] == pytest.approx(result["wall_sec"])
+    assert result["peak_rss_bytes"] > 0
+    assert not (tmp_path / "output.wav").exists()
+
+
+# --- Test Case 4: native-rate comparison ---
+
+def test_compare_native_rate_reports_speed_and_quality(monkeypatch):
+    from asmr_gen_adk.tools import binaural_renderer
+
+    # hrtf_source switches the renderer's setting; restore it afterwards
+    monkeypatch.setattr(binaural_renderer, "HRTF_SOURCE", binaural_renderer.HRTF_SOURCE)
+    report = compare_native_rate(duration_sec=2.0, hrtf_source="synthetic", repeats=1)
+    assert report["output_sample_rate"] == binaural_renderer.TARGET_FS
+    assert report["speedup"] > 0
+    assert report["snr_db"] > 0
+    assert report["log_spectral_distance_db"] < 3
@@ -8,7 +8,12 @@ import os
 import sys
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from asmr_gen_adk.tools.binaural_renderer import make_asmr_audio, BinauralRenderer, TARGET_FS
+import spaudiopy as spa
+
+from asmr_gen_adk import telemetry
+from asmr_gen_adk.tools import binaural_renderer, hrtf_compact
+from asmr_gen_adk.tools.binaural_renderer import make_asmr_audio, BinauralRenderer, TARGET_FS, render_range
+from asmr_gen_adk.tools.render_trace import RenderTrace
 
 # --- Test Case 1: make_asmr_audio ---
 
@@ -89,3 +94,224 @@ def test_binaural_renderer_tool_success(tmp_path):
     assert output_sr == TARGET_FS, f"Sample rate of the output file should be {TARGET_FS}"
     assert output_audio.ndim == 2, "Output WAV file is not stereo"
     assert output_audio.shape[1] == 2, "Output WAV file does not have 2 channels"
+
+
+# --- Test Case 3: render_range ---
+
+@pytest.fixture
+def dummy_hrtf(monkeypatch):
+    monkeypatch.setattr(binaural_renderer, "_load_hrtf", lambda fs, source=None: spa.io.load_hrirs(fs, filename="dummy"))
+
+
+@pytest.mark.parametrize("sample_rate", [24000, 44100, 48000])
+@pytest.mark.parametrize("t0, t1", [(7.0, 9.0), (0.0, 1.5), (11.0, 13.0)])
+def test_render_range_matches_full_render(tmp_path, dummy_hrtf, sample_rate, t0, t1):
+    """
+    A window rendered on its own matches the same window of a full (unnormalized) render.
+    """
+    rng = np.random.default_rng(0)
+    input_wav_path = tmp_path / "mono_input.wav"
+    sf.write(input_wav_path, rng.uniform(-0.3, 0.3, size=int(12.3 * sample_rate)), sample_rate, subtype="FLOAT")
+    spatial_plan = [
+        {"time": float(t), "azimuth": float(rng.uniform(-90, 90)), "elevation": 0,
+         "distance": float(rng.uniform(0.1, 0.3)), "reverb_mix": 0.03}
+        for t in np.arange(0, 12, 0.5)
+    ]
+
+    full, _ = make_asmr_audio(sf.read(input_wav_path)[0], sample_rate, spatial_plan, normalize=False)
+    window, output_sr = render_range(str(input_wav_path), json.dumps(spatial_plan), t0, t1)
+
+    assert output_sr == TARGET_FS
+    start = int(round(t0 * TARGET_FS))
+    expected = full[start:int(round(min(t1, 12.3) * TARGET_FS))]
+    assert window.shape == expected.shape
+    # -80 dB relative to the signal peak
+    assert np.max(np.abs(window - expected)) < 1e-4 * np.max(np.abs(expected))
+
+
+def test_render_range_rejects_invalid_range(tmp_path, dummy_hrtf):
+    input_wav_path = tmp_path / "mono_input.wav"
+    sf.write(input_wav_path, np.zeros(24000), 24000)
+    with pytest.raises(ValueError):
+        render_range(str(input_wav_path), "[]", 2.0, 3.0)
+
+
+# --- Test Case 4: multi-source scenes ---
+
+def _sweep_plan(rng, duration):
+    return [
+        {"time": float(t), "azimuth": float(rng.uniform(-180, 180)), "elevation": float(rng.uniform(-30, 30)),
+         "distance": float(rng.uniform(0.1, 1.0)), "reverb_mix": 0.02}
+        for t in np.arange(0, duration, 0.4)
+    ]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_frequency_domain_mix_matches_separate_renders(dummy_hrtf, tmp_path, monkeypatch, compact):
+    """
+    Mixing sources in the frequency domain equals rendering each source on its own and summing.
+    """
+    monkeypatch.setattr(binaural_renderer, "COMPACT_ENABLED", compact)
+    monkeypatch.setattr(hrtf_compact, "CACHE_DIR", str(tmp_path))
+    rng = np.random.default_rng(1)
+    hrtf = binaural_renderer._get_hrtf(TARGET_FS)
+    num_samples = 3 * TARGET_FS
+    voice = rng.uniform(-0.3, 0.3, num_samples)
+    rustle = rng.uniform(-0.3, 0.3, TARGET_FS)
+    breath = rng.uniform(-0.3, 0.3, TARGET_FS // 2)
+    scene = [(voice, 0, 1.0), (rustle, 12345, 0.5), (breath, num_samples - 1000, 2.0)]
+    length = max(start + len(audio) for audio, start, _ in scene)
+
+    prepared, expected = [], 0.0
+    for i, (audio, start, gain) in enumerate(scene):
+        interpolators = binaural_renderer._create_interpolators(
+            binaural_renderer.compile_plan(_sweep_plan(rng, 4.0)), 4.0)
+        prepared.append((audio, interpolators, start, gain))
+        placed = np.zeros(length)
+        placed[start:start + len(audio)] = audio
+        single, _ = binaural_renderer._render_binaural_dynamic_crossfade(
+            placed, hrtf, interpolators, seed=binaural_renderer.JITTER_SEED + i)
+        expected = expected + single * gain
+
+    mixed = binaural_renderer._render_binaural_sources(prepared, hrtf, length)
+    assert mixed.shape == expected.shape
+    assert np.max(np.abs(mixed - expected)) < 1e-9 * np.max(np.abs(expected))
+
+
+def test_make_asmr_audio_with_sources(dummy_hrtf):
+    rng = np.random.default_rng(2)
+    voice = rng.uniform(-0.3, 0.3, 24000)
+    plan = [{"time": 0.0, "azimuth": 30, "elevation": 0, "distance": 0.5, "reverb_mix": 0.02}]
+    voice_only, _ = make_asmr_audio(voice, 24000, plan, normalize=False)
+
+    # A silent extra source changes nothing; a late one extends the output
+    silent = {"audio": np.zeros(12000), "sample_rate": 24000, "spatial_plan": plan, "start": 0.2}
+    with_silent, _ = make_asmr_audio(voice, 24000, plan, normalize=False, sources=[silent])
+    # (reverb runs in float32)
+    np.testing.assert_allclose(with_silent, voice_only, atol=1e-6)
+
+    late = {"audio": rng.uniform(-0.3, 0.3, 12000), "sample_rate": 24000,
+            "spatial_plan": [{"time": 0.0, "azimuth": -90, "elevation": 0, "distance": 0.3, "reverb_mix": 0.0}],
+            "start": 1.5}
+    with_late, output_sr = make_asmr_audio(voice, 24000, plan, sources=[late])
+    assert output_sr == TARGET_FS
+    assert len(with_late) == 2 * TARGET_FS
+    assert np.max(np.abs(with_late[int(1.6 * TARGET_FS):])) > 0
+
+
+# --- Test Case 5: native-rate rendering ---
+
+def test_resampled_hrtf_keeps_gain_and_is_cached(monkeypatch):
+    source = spa.io.load_hrirs(TARGET_FS, filename="dummy")
+    monkeypatch.setattr(binaural_renderer, "_load_hrtf", lambda fs, hrtf_source=None: source)
+    hrtf = binaural_renderer._hrtf_at_rate(24000)
+    assert hrtf.fs == 24000
+    assert hrtf is binaural_renderer._hrtf_at_rate(24000)
+    assert binaural_renderer._hrtf_at_rate(TARGET_FS) is source
+    # DC gain of every HRIR is preserved (up to the resampling filter's tail cut off at the IR end)
+    np.testing.assert_allclose(hrtf.left.sum(axis=1), source.left.sum(axis=1), rtol=3e-2, atol=1e-3)
+    np.testing.assert_allclose(hrtf.right.sum(axis=1), source.right.sum(axis=1), rtol=3e-2, atol=1e-3)
+
+
+def test_native_rate_matches_resampled_input(dummy_hrtf, monkeypatch):
+    """
+    Rendering 24 kHz input at 24 kHz and upsampling the result is close to upsampling the input first.
+    """
+    monkeypatch.setattr(binaural_renderer, "COMPACT_ENABLED", False)
+    rng = np.random.default_rng(3)
+    voice = rng.uniform(-0.3, 0.3, 3 * 24000)
+    plan = [{"time": 0.0, "azimuth": 30, "elevation": 0, "distance": 1.0, "reverb_mix": 0.0},
+            {"time": 2.0, "azimuth": -60, "elevation": 10, "distance": 1.0, "reverb_mix": 0.0}]
+    reference, _ = make_asmr_audio(voice, 24000, plan, normalize=False, native_rate=False)
+    native, output_sr = make_asmr_audio(voice, 24000, plan, normalize=False, native_rate=True)
+
+    assert output_sr == TARGET_FS
+    assert native.shape == reference.shape
+    snr_db = 10 * np.log10(np.sum(reference ** 2) / np.sum((native - reference) ** 2))
+    assert snr_db > 20
+
+
+def test_native_rate_without_upsampling(dummy_hrtf, monkeypatch):
+    monkeypatch.setattr(binaural_renderer, "UPSAMPLE_OUTPUT", False)
+    voice = np.random.default_rng(4).uniform(-0.3, 0.3, 24000)
+    plan = [{"time": 0.0, "azimuth": 30, "elevation": 0, "distance": 0.3, "reverb_mix": 0.02}]
+    output, output_sr = make_asmr_audio(voice, 24000, plan, native_rate=True)
+    assert output_sr == 24000
+    assert output.shape == (24000, 2)
+    # Inputs at or above TARGET_FS are unaffected by the setting
+    _, output_sr = make_asmr_audio(np.zeros(TARGET_FS), TARGET_FS, plan, native_rate=True)
+    assert output_sr == TARGET_FS
+
+
+# --- Test Case 6: silence gate ---
+
+def _speech_with_pauses(rng, num_samples, fs):
+    t = np.arange(num_samples) / fs
+    return rng.uniform(-0.3, 0.3, num_samples) * (np.mod(t, 1.5) < 0.8)
+
+
+def test_silence_gate_matches_ungated_render(dummy_hrtf, monkeypatch):
+    rng = np.random.default_rng(5)
+    hrtf = binaural_renderer._get_hrtf(TARGET_FS)
+    audio = _speech_with_pauses(rng, 6 * TARGET_FS, TARGET_FS)
+    interpolators = binaural_renderer._create_interpolators(
+        binaural_renderer.compile_plan(_sweep_plan(rng, 6.0)), 6.0)
+
+    monkeypatch.setattr(binaural_renderer, "SILENCE_GATE_DB", None)
+    ungated, ungated_distance = binaural_renderer._render_binaural_dynamic_crossfade(audio, hrtf, interpolators)
+    monkeypatch.setattr(binaural_renderer, "SILENCE_GATE_DB", -90.0)
+    trace = RenderTrace()
+    gated, gated_distance = binaural_renderer._render_binaural_dynamic_crossfade(audio, hrtf, interpolators, trace=trace)
+
+    np.testing.assert_allclose(gated, ungated, atol=1e-9)
+    np.testing.assert_array_equal(gated_distance, ungated_distance)
+    # Pauses cost no FFTs and no HRIR lookups; a switch made during a pause is looked up once speech resumes
+    records = trace.records
+    silent = np.array([np.max(np.abs(audio[s:s + binaural_renderer.BLOCK_SIZE])) == 0 for s in records["start"]])
+    assert silent.sum() > len(records) // 4
+    assert np.all(records["ffts"][silent] == 0)
+    assert np.all(records["hrir_lookups"][silent] == 0)
+    assert np.all(records["ffts"][~silent] >= 3)
+
+
+def test_silence_gate_reports_skipped_blocks(dummy_hrtf, tmp_path, monkeypatch):
+    jsonl_path = tmp_path / "telemetry.jsonl"
+    monkeypatch.setattr(telemetry, "JSONL_PATH", str(jsonl_path))
+    monkeypatch.setattr(telemetry, "PROMETHEUS_PATH", str(tmp_path / "metrics.prom"))
+    audio = np.zeros(2 * 24000)
+    audio[:12000] = np.random.default_rng(6).uniform(-0.3, 0.3, 12000)
+    plan = [{"time": 0.0, "azimuth": 30, "elevation": 0, "distance": 0.5, "reverb_mix": 0.0}]
+    with telemetry.telemetry_run("gate-run"):
+        make_asmr_audio(audio, 24000, plan)
+
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        gate = next(r for r in map(json.loads, f) if r["stage"] == "render.silence_gate")
+    assert gate["blocks"] == int(np.ceil(2 * TARGET_FS / binaural_renderer.BLOCK_SIZE))
+    # The last 1.5 s are silent, minus the resampler's ringing after the cut
+    assert 0.7 < gate["skipped_ratio"] < 0.75
+
+
+def test_silence_gate_in_multi_source_mix(dummy_hrtf):
+    """
+    Sources that fall silent are skipped per source, and the mix still equals the separate renders.
+    """
+    rng = np.random.default_rng(7)
+    hrtf = binaural_renderer._get_hrtf(TARGET_FS)
+    num_samples = 4 * TARGET_FS
+    voice = _speech_with_pauses(rng, num_samples, TARGET_FS)
+    rustle = _speech_with_pauses(rng, 2 * TARGET_FS, TARGET_FS) * 0.5
+    scene = [(voice, 0), (rustle, 30000)]
+
+    prepared, expected = [], 0.0
+    for i, (audio, start) in enumerate(scene):
+        interpolators = binaural_renderer._create_interpolators(
+            binaural_renderer.compile_plan(_sweep_plan(rng, 4.0)), 4.0)
+        prepared.append((audio, interpolators, start, 1.0))
+        placed = np.zeros(num_samples)
+        placed[start:start + len(audio)] = audio
+        single, _ = binaural_renderer._render_binaural_dynamic_crossfade(
+            placed, hrtf, interpolators, seed=binaural_renderer.JITTER_SEED + i)
+        expected = expected + single
+
+    mixed = binaural_renderer._render_binaural_sources(prepared, hrtf, num_samples)
+    assert np.max(np.abs(mixed - expected)) < 1e-9 * np.max(np.abs(expected))
@@ -0,0 +1,129 @@
+import pytest
+import asyncio
+import os
+from typing import AsyncGenerator
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from google.adk.agents import BaseAgent, SequentialAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.genai import types
+
+from asmr_gen_adk import checkpoint
+from asmr_gen_adk.checkpoint import RESUME_KEY, RUN_ID_KEY, input_hash_for, load_stage, save_stage, with_checkpoint
+
+
+class StubStage(BaseAgent):
+    """Writes a fixed value to the session state, optionally failing on the first call."""
+
+    key: str
+    value: str
+    calls: int = 0
+    fail_first: bool = False
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> AsyncGenerator[Event, None]:
+        self.calls += 1
+        if self.fail_first and self.calls == 1:
+            raise RuntimeError(f"{self.name} failed")
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=self.name,
+            actions=EventActions(state_delta={self.key: self.value}),
+        )
+
+
+async def _run_pipeline(agent, text, state=None, messages=1):
+    """Runs text through the pipeline `messages` times in one session and returns the final state."""
+    session_service = InMemorySessionService()
+    runner = Runner(agent=agent, app_name="test", session_service=session_service)
+    session = await session_service.create_session(app_name="test", user_id="u", state=state)
+    message = types.Content(role="user", parts=[types.Part(text=text)])
+    for _ in range(messages):
+        async for _ in runner.run_async(user_id="u", session_id=session.id, new_message=message):
+            pass
+    session = await session_service.get_session(app_name="test", user_id="u", session_id=session.id)
+    return session.state
+
+
+# --- Test Case 1: save_stage / load_stage ---
+
+def test_save_stage_copies_audio_and_invalidates_later_stages(tmp_path):
+    run_dir = str(tmp_path / "run")
+    wav = tmp_path / "tts.wav"
+    wav.write_bytes(b"RIFF")
+
+    save_stage(run_dir, "spatial_plan_json", "[]")
+    saved = save_stage(run_dir, "wav_path", f"`{wav}`")
+
+    assert saved.startswith(run_dir)
+    assert os.path.exists(saved)
+    assert load_stage(run_dir, "wav_path") == saved
+    # Re-running an earlier stage discards downstream outputs
+    assert load_stage(run_dir, "spatial_plan_json") is None
+
+
+# --- Test Case 2: resume through the ADK runner ---
+
+@pytest.mark.asyncio
+async def test_pipeline_resumes_from_failed_stage(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_DIR", str(tmp_path))
+    script = StubStage(name="script", key="script_text", value="ねえ。")
+    plan = StubStage(name="plan", key="timed_script_json", value="{}")
+    render = StubStage(name="render", key="spatial_plan_json", value="[]", fail_first=True)
+    pipeline = SequentialAgent(
+        name="pipeline",
+        sub_agents=[with_checkpoint(a, a.key) for a in (script, plan, render)],
+    )
+
+    with pytest.raises(RuntimeError):
+        await _run_pipeline(pipeline, "床屋さんで")
+    (failed_run,) = os.listdir(tmp_path / input_hash_for("床屋さんで"))
+    state = await _run_pipeline(pipeline, "床屋さんで", state={RESUME_KEY: failed_run})
+
+    # Stages that already succeeded are restored, not re-run
+    assert (script.calls, plan.calls, render.calls) == (1, 1, 2)
+    assert state["script_text"] == "ねえ。"
+    assert state["spatial_plan_json"] == "[]"
+    assert state[RUN_ID_KEY] == failed_run
+
+    # A different input gets its own run directory
+    await _run_pipeline(pipeline, "図書館で")
+    assert script.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_runs_are_isolated_unless_resumed(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_DIR", str(tmp_path))
+    script = StubStage(name="script", key="script_text", value="ねえ。")
+    pipeline = SequentialAgent(name="pipeline", sub_agents=[with_checkpoint(script, script.key)])
+
+    # The same input again, or at the same time, runs from scratch in a directory of its own
+    states = await asyncio.gather(*(_run_pipeline(pipeline, "床屋さんで") for _ in range(3)))
+    assert script.calls == 3
+    run_ids = {state[RUN_ID_KEY] for state in states}
+    assert len(run_ids) == 3
+    assert set(os.listdir(tmp_path / input_hash_for("床屋さんで"))) == run_ids
+
+    with pytest.raises(ValueError):
+        await _run_pipeline(pipeline, "床屋さんで", state={RESUME_KEY: "../other"})
+
+
+@pytest.mark.asyncio
+async def test_resume_is_used_once_per_session(tmp_path, monkeypatch):
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_DIR", str(tmp_path))
+    script = StubStage(name="script", key="script_text", value="ねえ。")
+    plan = StubStage(name="plan", key="timed_script_json", value="{}")
+    pipeline = SequentialAgent(name="pipeline", sub_agents=[with_checkpoint(a, a.key) for a in (script, plan)])
+
+    first = await _run_pipeline(pipeline, "床屋さんで")
+    assert (script.calls, plan.calls) == (1, 1)
+    # Resumed by the first message only (both stages restored); the second message in the session runs afresh
+    state = await _run_pipeline(pipeline, "床屋さんで", state={RESUME_KEY: first[RUN_ID_KEY]}, messages=2)
+    assert (script.calls, plan.calls) == (2, 2)
+    assert state[RESUME_KEY] is None and state[RUN_ID_KEY] != first[RUN_ID_KEY]
+    assert len(os.listdir(tmp_path / input_hash_for("床屋さんで"))) == 2
@@ -0,0 +1,158 @@
+import pytest
+import os
+
+import numpy as np
+import soundfile as sf
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import episode
+from asmr_gen_adk.tools.episode import assemble_episode, measure_file
+from asmr_gen_adk.tools.export import ExportTarget
+
+SR = 48000
+
+
+def _write(path, audio, sample_rate=SR):
+    sf.write(str(path), audio, sample_rate, subtype="FLOAT")
+    return str(path)
+
+
+def _sine(seconds, amplitude, freq=1000.0, sample_rate=SR, channels=2):
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    return np.repeat((amplitude * np.sin(2 * np.pi * freq * t))[:, None], channels, axis=1)
+
+
+@pytest.fixture(autouse=True)
+def master_only(monkeypatch):
+    """書き出しはマスターWAV（float）だけにする。"""
+    monkeypatch.setattr(episode, "export_targets_for", lambda path, sr, extras=False: [
+        ExportTarget(name="master", path=path, format="WAV", subtype="FLOAT", sample_rate=sr)])
+
+
+# --- Test Case 1: loudness measurement ---
+
+def test_sine_loudness(tmp_path):
+    # A 1 kHz sine at -20 dBFS peak in both channels: -23 dB mean square per channel, +3 dB for two channels
+    # (the -0.691 offset cancels the K-weighting gain at 1 kHz)
+    path = _write(tmp_path / "sine.wav", _sine(3.0, 0.1))
+    measured = measure_file(path)
+    assert measured["loudness_lufs"] == pytest.approx(-20.0, abs=0.05)
+    assert measured["peak"] == pytest.approx(0.1, abs=1e-4)
+
+
+def test_silence_is_gated(tmp_path):
+    measured = measure_file(_write(tmp_path / "silence.wav", np.zeros((SR, 2))))
+    assert measured["loudness_lufs"] == float("-inf")
+
+
+# --- Test Case 2: assembly ---
+
+def test_crossfades_and_matches_loudness(tmp_path):
+    quiet = _write(tmp_path / "a.wav", _sine(4.0, 0.02))
+    loud = _write(tmp_path / "b.wav", _sine(4.0, 0.2, freq=700.0))
+    third = _write(tmp_path / "c.wav", _sine(2.0, 0.05, freq=500.0))
+    result = assemble_episode([{"path": quiet}, {"path": loud}, {"path": third, "crossfade_sec": 0.5}],
+                              str(tmp_path / "episode.wav"), crossfade_sec=1.0, target_lufs=-24.0)
+
+    out, sr = sf.read(result["outputs"]["master"], always_2d=True)
+    assert sr == SR
+    assert len(out) == int((4.0 + 4.0 + 2.0 - 1.0 - 0.5) * SR)
+    assert result["duration_sec"] == pytest.approx(len(out) / SR)
+    assert [s["start_sec"] for s in result["segments"]] == pytest.approx([0.0, 3.0, 6.5])
+    assert result["rendered"] == 0
+
+    # Each segment comes out at the target loudness
+    for start, end in ((0.0, 3.0), (4.0, 6.5), (7.0, 8.5)):
+        part = _write(tmp_path / "part.wav", out[int(start * SR):int(end * SR)])
+        assert measure_file(part)["loudness_lufs"] == pytest.approx(-24.0, abs=0.3)
+
+    # Equal power: the mean power across the first overlap stays between the two levels (no dip)
+    overlap = out[3 * SR:4 * SR, 0]
+    window = SR // 20
+    power = np.array([np.mean(overlap[i:i + window] ** 2) for i in range(0, len(overlap) - window, window)])
+    level = np.mean(out[SR:2 * SR, 0] ** 2)
+    assert np.all(power > 0.7 * level) and np.all(power < 1.3 * level)
+
+
+def test_crossfade_is_clamped_to_short_segments(tmp_path):
+    paths = [_write(tmp_path / f"{i}.wav", _sine(0.5, 0.1)) for i in range(3)]
+    result = assemble_episode([{"path": p} for p in paths], str(tmp_path / "episode.wav"), crossfade_sec=10.0)
+    out, _ = sf.read(result["outputs"]["master"])
+    # Each overlap is at most half of a segment, so every segment still contributes
+    assert len(out) == int(1.0 * SR)
+    assert [s["start_sec"] for s in result["segments"]] == pytest.approx([0.0, 0.25, 0.5])
+
+
+def test_peak_ceiling_limits_gain(tmp_path, monkeypatch):
+    # A single click in silence: reaching the target would need a huge gain
+    audio = np.zeros((SR, 2))
+    audio[SR // 2] = 0.5
+    audio += _sine(1.0, 0.001)
+    path = _write(tmp_path / "click.wav", audio)
+    result = assemble_episode([{"path": path}], str(tmp_path / "episode.wav"), target_lufs=-10.0)
+    out, _ = sf.read(result["outputs"]["master"])
+    assert np.max(np.abs(out)) == pytest.approx(episode.PEAK_CEILING, abs=1e-4)
+
+
+def test_crossfade_of_loud_segments_stays_under_the_ceiling(tmp_path):
+    # Two in-phase segments, each limited to the ceiling on its own: their equal-power sum would reach ~1.39x
+    paths = [_write(tmp_path / f"{i}.wav", _sine(2.0, 0.5)) for i in range(2)]
+    result = assemble_episode([{"path": p} for p in paths], str(tmp_path / "episode.wav"), crossfade_sec=1.0,
+                              target_lufs=0.0)
+    out, _ = sf.read(result["outputs"]["master"])
+    assert np.max(np.abs(out)) <= episode.PEAK_CEILING + 1e-6
+    # Outside the join the segments keep their gain
+    assert np.max(np.abs(out[:SR // 2])) == pytest.approx(episode.PEAK_CEILING, abs=1e-4)
+
+
+def test_mismatched_segments(tmp_path):
+    first = _write(tmp_path / "a.wav", _sine(1.0, 0.1))
+    other = _write(tmp_path / "b.wav", _sine(1.0, 0.1, sample_rate=24000), sample_rate=24000)
+    with pytest.raises(ValueError):
+        assemble_episode([{"path": first}, {"path": other}], str(tmp_path / "episode.wav"))
+    with pytest.raises(FileNotFoundError):
+        assemble_episode([{"path": first}, {"path": str(tmp_path / "missing.wav")}], str(tmp_path / "episode.wav"))
+
+
+# --- Test Case 3: missing segments are rendered ---
+
+def test_renders_missing_segments(tmp_path):
+    rng = np.random.default_rng(0)
+    inputs = [_write(tmp_path / f"in{i}.wav", rng.uniform(-0.2, 0.2, 24000), sample_rate=24000) for i in range(2)]
+    plan = [{"time": 0.0, "azimuth": 30, "elevation": 0, "distance": 0.5, "reverb_mix": 0.0}]
+    existing = _write(tmp_path / "intro.wav", _sine(1.0, 0.05))
+    segments = [{"path": existing}] + [
+        {"path": str(tmp_path / f"seg{i}.wav"), "input": inputs[i], "spatial_plan": plan} for i in range(2)]
+    result = assemble_episode(segments, str(tmp_path / "episode.wav"), crossfade_sec=0.2, workers=2)
+
+    assert result["rendered"] == 2
+    assert all(os.path.exists(s["path"]) for s in segments)
+    out, _ = sf.read(result["outputs"]["master"])
+    rendered = sum(sf.info(s["path"]).frames for s in segments)
+    assert len(out) == rendered - 2 * int(0.2 * SR)
+
+
+def test_render_jobs_pass_the_hrtf_by_keyword(tmp_path, monkeypatch):
+    calls = []
+
+    class InlinePool:
+        def __init__(self, workers=None):
+            pass
+
+        async def run(self, fn, *args):
+            calls.append((fn, args))
+            return fn(*args)
+
+        def shutdown(self):
+            pass
+
+    monkeypatch.setattr(episode, "RenderPool", InlinePool)
+    monkeypatch.setattr(episode, "render_file", lambda *args, **kwargs: (args, kwargs))
+    segments = [{"path": str(tmp_path / "seg.wav"), "input": "in.wav", "spatial_plan": [], "hrtf_source": "dummy"}]
+    assert episode._render_missing(segments, workers=1) == 1
+    fn, args = calls[0]
+    assert args == ("in.wav", "[]", str(tmp_path / "seg.wav"))
+    assert fn.keywords == {"hrtf_source": "dummy"}
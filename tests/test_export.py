@@ -0,0 +1,95 @@
+import pytest
+import os
+
+import numpy as np
+import soundfile as sf
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import export
+from asmr_gen_adk.tools.export import ExportTarget, FanOutExporter, export_audio, export_targets_for
+
+
+def _tone(seconds=3.0, sr=48000, freq=1000.0):
+    t = np.arange(int(seconds * sr)) / sr
+    left = 0.5 * np.sin(2 * np.pi * freq * t)
+    return np.stack([left, 0.25 * left], axis=1)
+
+
+# --- Test Case 1: targets from config ---
+
+def test_targets_from_config(tmp_path):
+    targets = {t.name: t for t in export_targets_for(str(tmp_path / "binaural_take.wav"), 48000, extras=True)}
+    assert targets["master"].path == str(tmp_path / "binaural_take.wav")
+    assert targets["master"].sample_rate == 48000
+    assert targets["flac"].path == str(tmp_path / "binaural_take.flac")
+    assert targets["flac"].sample_rate == 44100
+    assert targets["preview"].path == str(tmp_path / "binaural_take_preview.ogg")
+
+
+def test_extras_are_opt_in_and_master_keeps_the_rate(tmp_path):
+    path = str(tmp_path / "take.wav")
+    # A native-rate render is written at its own rate, without extras
+    assert [(t.name, t.sample_rate) for t in export_targets_for(path, 24000)] == [("master", 24000)]
+    assert [t.name for t in export_targets_for(path, 24000, extras=["preview"])] == ["master", "preview"]
+    with pytest.raises(ValueError):
+        export_targets_for(path, 24000, extras=["mp3"])
+
+
+# --- Test Case 2: one pass produces every format ---
+
+def test_export_audio_writes_all_formats(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "BLOCK_FRAMES", 4096)  # many blocks through the streaming resampler
+    audio = _tone()
+    paths = export_audio(audio, 48000, str(tmp_path / "out" / "take.wav"), extras=True)
+
+    master, master_sr = sf.read(paths["master"])
+    assert master_sr == 48000
+    # The master keeps the format the pipeline always wrote
+    assert sf.info(paths["master"]).subtype == "PCM_16"
+    np.testing.assert_allclose(master, audio, atol=2 ** -15)
+
+    flac, flac_sr = sf.read(paths["flac"])
+    assert flac_sr == 44100
+    # The streaming conversion keeps the full length and the tone's level
+    assert abs(len(flac) - 3.0 * 44100) <= 1
+    mid = slice(4410, -4410)
+    assert np.sqrt(np.mean(flac[mid, 0] ** 2)) == pytest.approx(0.5 / np.sqrt(2), rel=0.01)
+    spectrum = np.abs(np.fft.rfft(flac[mid, 0]))
+    peak_hz = np.argmax(spectrum) * 44100 / len(flac[mid, 0])
+    assert peak_hz == pytest.approx(1000.0, abs=2.0)
+
+    info = sf.info(paths["preview"])
+    assert info.format == "OGG" and info.channels == 2
+    assert os.path.getsize(paths["preview"]) < os.path.getsize(paths["master"])
+
+
+# --- Test Case 3: encoder failures are reported ---
+
+def test_failed_encoder_raises_without_blocking_others(tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "QUEUE_BLOCKS", 1)
+    targets = [
+        ExportTarget("master", str(tmp_path / "ok.wav"), "WAV", "PCM_16", 48000),
+        ExportTarget("broken", str(tmp_path / "broken.wav"), "WAV", "PCM_16", 48000),
+    ]
+    exporter = FanOutExporter(targets, 48000)
+    # Simulate a failing encoder, e.g. a full disk
+    exporter._encoders[1]._file.write = lambda block: (_ for _ in ()).throw(OSError("disk full"))
+    for start in range(0, 48000 * 2, 4096):
+        exporter.write(_tone(2.0)[start:start + 4096])
+    with pytest.raises(IOError, match="broken.wav"):
+        exporter.close()
+    assert sf.info(str(tmp_path / "ok.wav")).frames == 96000
+
+
+def test_failed_target_closes_the_opened_ones(tmp_path):
+    targets = [
+        ExportTarget("master", str(tmp_path / "ok.wav"), "WAV", "PCM_16", 48000),
+        ExportTarget("bad", str(tmp_path / "bad.flac"), "FLAC", "NOT_A_SUBTYPE", 48000),
+    ]
+    with pytest.raises(ValueError):
+        FanOutExporter(targets, 48000)
+    # The master opened first is closed and no partial file is left behind
+    assert not os.path.exists(tmp_path / "ok.wav")
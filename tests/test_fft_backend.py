@@ -0,0 +1,98 @@
+import pytest
+import os
+
+import numpy as np
+import scipy.signal
+import spaudiopy as spa
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import binaural_renderer, fft_backend
+from asmr_gen_adk.tools.hrtf_compact import compact_hrirs
+from asmr_gen_adk.tools.fft_backend import get_backend
+
+
+# --- Test Case 1: plans ---
+
+@pytest.mark.parametrize("dtype, tolerance", [("float64", 1e-12), ("float32", 1e-5)])
+def test_plan_round_trip_and_dtype(dtype, tolerance):
+    backend = get_backend("scipy", workers=2, dtype=dtype)
+    plan = backend.plan(64, channels=2)
+    x = np.random.default_rng(0).normal(size=(40, 2))
+
+    spectrum = plan.forward(x)
+    assert spectrum.shape == (33, 2)
+    assert spectrum.dtype == backend.complex_dtype
+    np.testing.assert_allclose(spectrum, np.fft.rfft(x, 64, axis=0), atol=tolerance * 10)
+    restored = plan.inverse(spectrum)
+    assert restored.dtype == np.dtype(dtype)
+    np.testing.assert_allclose(restored[:40], x, atol=tolerance)
+    np.testing.assert_allclose(restored[40:], 0, atol=tolerance)
+
+
+def test_plan_zero_pads_shorter_inputs_after_longer_ones():
+    plan = get_backend("scipy").plan(32)
+    plan.forward(np.ones(30))
+    np.testing.assert_allclose(plan.forward(np.ones(4)), np.fft.rfft(np.ones(4), 32), atol=1e-12)
+
+
+def test_backend_selection(monkeypatch):
+    assert get_backend("scipy", 1, "float32") is get_backend("scipy", 1, "float32")
+    with pytest.raises(ValueError):
+        get_backend("fftpack")
+    with pytest.raises(ValueError):
+        get_backend("scipy", dtype="int16")
+    monkeypatch.setattr(fft_backend, "pyfftw", None)
+    monkeypatch.setattr(fft_backend, "_backends", {})
+    assert get_backend("pyfftw").name == "scipy"
+
+
+@pytest.mark.skipif(fft_backend.pyfftw is None, reason="pyFFTW is not installed")
+def test_pyfftw_matches_scipy():
+    x = np.random.default_rng(1).normal(size=(100, 2))
+    fftw_plan = get_backend("pyfftw", workers=2).plan(128, channels=2)
+    scipy_plan = get_backend("scipy").plan(128, channels=2)
+    first = fftw_plan.forward(x)
+    second = fftw_plan.forward(x[:50])
+    np.testing.assert_allclose(first, scipy_plan.forward(x), atol=1e-10)
+    np.testing.assert_allclose(second, scipy_plan.forward(x[:50]), atol=1e-10)
+    np.testing.assert_allclose(fftw_plan.inverse(first), scipy_plan.inverse(first), atol=1e-10)
+
+
+# --- Test Case 2: renderer on the backend ---
+
+@pytest.fixture
+def hrtf():
+    # コンパクト化したセット（耳ごとの整数遅延あり）で確かめる
+    return compact_hrirs(spa.io.load_hrirs(binaural_renderer.TARGET_FS, filename="dummy"))
+
+
+def _render_static(hrtf, audio):
+    plan = [{"time": 0.0, "azimuth": 70, "elevation": 20, "distance": 0.4, "reverb_mix": 0.0}]
+    interpolators = binaural_renderer._create_interpolators(binaural_renderer.compile_plan(plan), 1.0)
+    output, _ = binaural_renderer._render_binaural_dynamic_crossfade(audio, hrtf, interpolators)
+    return output
+
+
+def test_static_render_matches_direct_convolution(hrtf):
+    audio = np.random.default_rng(2).uniform(-0.3, 0.3, 10000)
+    output = _render_static(hrtf, audio)
+
+    initial_jitter, _ = binaural_renderer._block_jitters(1)
+    idx, _, attenuation = binaural_renderer._lookup_hrir(hrtf, 70 + initial_jitter, 20, 0.4)
+    offsets = binaural_renderer._ear_offsets(hrtf, idx)
+    hrir = np.zeros((binaural_renderer._hrir_span(hrtf), 2))
+    for ear, irs in enumerate((hrtf.left, hrtf.right)):
+        hrir[offsets[ear]:offsets[ear] + irs.shape[1], ear] = irs[idx]
+    expected = scipy.signal.fftconvolve(audio[:, None], hrir, axes=0) * attenuation
+    np.testing.assert_allclose(output[:len(expected)], expected, atol=1e-12)
+
+
+def test_float32_render_stays_within_single_precision(hrtf, monkeypatch):
+    audio = np.random.default_rng(3).uniform(-0.3, 0.3, 10000)
+    reference = _render_static(hrtf, audio)
+    monkeypatch.setattr(fft_backend, "DTYPE", "float32")
+    single = _render_static(hrtf, audio)
+    assert np.max(np.abs(single - reference)) < 1e-5 * np.max(np.abs(reference))
@@ -0,0 +1,129 @@
+import pytest
+import json
+import os
+
+import numpy as np
+import spaudiopy as spa
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk import telemetry
+from asmr_gen_adk.tools import binaural_renderer, hrtf_cache
+from asmr_gen_adk.tools.binaural_renderer import TARGET_FS, make_asmr_audio
+from asmr_gen_adk.tools.hrtf_cache import HRTFCache, PreparedHRTF
+
+
+PLAN = [{"time": 0.0, "azimuth": -60, "elevation": 0, "distance": 0.5, "reverb_mix": 0.0},
+        {"time": 0.5, "azimuth": 60, "elevation": 10, "distance": 0.5, "reverb_mix": 0.0}]
+
+
+@pytest.fixture
+def counted_loads(monkeypatch):
+    """_load_hrtf_from の呼び出し（ディスクからの読み込み）を数える。"""
+    calls = []
+    load = binaural_renderer._load_hrtf_from
+    monkeypatch.setattr(binaural_renderer, "_load_hrtf_from", lambda source, fs: calls.append(source) or load(source, fs))
+    return calls
+
+
+# --- Test Case 1: size-aware LRU ---
+
+def test_lru_evicts_least_recently_used_by_size():
+    cache = HRTFCache(max_bytes=3 * 800)
+    build = lambda: np.zeros(100)  # 800 bytes
+    for key in ("a", "b", "c"):
+        cache.get(key, build)
+    cache.get("a", lambda: pytest.fail("should be a hit"))
+    cache.get("d", build)  # evicts "b", the least recently used
+
+    assert cache.stats() == {"entries": 3, "bytes": 2400, "max_bytes": 2400, "hits": 1, "misses": 4, "evictions": 1}
+    rebuilt = []
+    cache.get("b", lambda: rebuilt.append(1) or np.zeros(100))
+    assert rebuilt == [1]
+    # An entry larger than the whole cache is still kept while it is the most recent one
+    big = cache.get("big", lambda: np.zeros(1000))
+    assert cache.stats()["entries"] == 1
+    assert cache.get("big", build) is big
+
+
+def test_lookup_measures_entries_once(monkeypatch):
+    cache = HRTFCache(max_bytes=10 * 800)
+    for key in ("a", "b"):
+        cache.get(key, lambda: np.zeros(100))
+    measured = []
+    array_bytes = hrtf_cache._array_bytes
+    monkeypatch.setattr(hrtf_cache, "_array_bytes", lambda obj: measured.append(1) or array_bytes(obj))
+    cache.get("a", lambda: pytest.fail("should be a hit"))
+    # One pass over the entries serves both the trim and the recorded stats
+    assert len(measured) == 2
+    assert cache.stats() == {"entries": 2, "bytes": 1600, "max_bytes": 8000, "hits": 1, "misses": 2, "evictions": 0}
+
+
+def test_prepared_hrtf_grows_with_spectra():
+    hrtf = spa.io.load_hrirs(TARGET_FS, filename="dummy")
+    prepared = PreparedHRTF(hrtf)
+    before = prepared.nbytes
+    assert before >= hrtf.left.nbytes + hrtf.right.nbytes
+    prepared.spectra((2048, "complex128"))[0] = np.zeros((1025, 2), dtype=np.complex128)
+    assert prepared.nbytes == before + 1025 * 2 * 16
+    # The direction index gives the same nearest direction as a full search
+    for azimuth, elevation in ((30.0, 0.0), (-135.0, 40.0), (0.0, -20.0)):
+        x, y, z = spa.utils.sph2cart(hrtf.azi, hrtf.zen)
+        tx, ty, tz = spa.utils.sph2cart(np.deg2rad(-azimuth), np.deg2rad(90 - elevation))
+        assert prepared.nearest(azimuth, elevation) == int(np.argmin((x - tx) ** 2 + (y - ty) ** 2 + (z - tz) ** 2))
+
+
+# --- Test Case 2: per-listener rendering ---
+
+def test_listeners_share_loaded_sets(counted_loads, monkeypatch):
+    monkeypatch.setattr(hrtf_cache, "_default_cache", HRTFCache())
+    audio = np.random.default_rng(0).uniform(-0.3, 0.3, 24000)
+    first, _ = make_asmr_audio(audio, 24000, PLAN, normalize=False, hrtf_source="dummy")
+    other, _ = make_asmr_audio(audio, 24000, PLAN, normalize=False, hrtf_source="synthetic")
+    again, _ = make_asmr_audio(audio, 24000, PLAN, normalize=False, hrtf_source="dummy")
+
+    assert counted_loads == ["dummy", "synthetic"]
+    np.testing.assert_array_equal(again, first)
+    assert not np.allclose(other, first)
+    stats = hrtf_cache.get_hrtf_cache().stats()
+    assert stats["hits"] >= 1 and stats["evictions"] == 0
+    # The spectra computed during the first render are kept with the set
+    assert binaural_renderer._prepared_hrtf(TARGET_FS, "dummy").spectra
+
+
+def test_small_cache_reloads_evicted_listener(counted_loads, monkeypatch):
+    monkeypatch.setattr(hrtf_cache, "_default_cache", HRTFCache(max_bytes=1))
+    audio = np.random.default_rng(1).uniform(-0.3, 0.3, 24000)
+    for source in ("dummy", "synthetic", "dummy"):
+        make_asmr_audio(audio, 24000, PLAN, normalize=False, hrtf_source=source)
+    assert counted_loads == ["dummy", "synthetic", "dummy"]
+    assert hrtf_cache.get_hrtf_cache().stats()["evictions"] > 0
+
+
+def test_unknown_hrtf_source():
+    with pytest.raises(ValueError):
+        make_asmr_audio(np.zeros(24000), 24000, PLAN, hrtf_source="nonexistent")
+
+
+# --- Test Case 3: metrics ---
+
+def test_cache_metrics_are_exported(tmp_path, monkeypatch):
+    jsonl_path, prom_path = tmp_path / "telemetry.jsonl", tmp_path / "metrics.prom"
+    monkeypatch.setattr(telemetry, "JSONL_PATH", str(jsonl_path))
+    monkeypatch.setattr(telemetry, "PROMETHEUS_PATH", str(prom_path))
+    monkeypatch.setattr(hrtf_cache, "_default_cache", HRTFCache())
+    audio = np.random.default_rng(2).uniform(-0.3, 0.3, 24000)
+    with telemetry.telemetry_run("cache-run"):
+        make_asmr_audio(audio, 24000, PLAN, hrtf_source="dummy")
+        make_asmr_audio(audio, 24000, PLAN, hrtf_source="dummy")
+
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        lookups = [r for r in map(json.loads, f) if r["kind"] == "hrtf_cache"]
+    # Every set the first render loads is a hit for the second one
+    hits = [r["hit"] for r in lookups]
+    assert hits == [False] * (len(hits) // 2) + [True] * (len(hits) // 2)
+    prom = prom_path.read_text()
+    assert 'asmr_hrtf_cache_lookups_total{result="hit"}' in prom
+    assert "asmr_hrtf_cache_evictions_total 0" in prom
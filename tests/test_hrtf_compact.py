@@ -0,0 +1,116 @@
+import pytest
+import os
+
+import numpy as np
+import spaudiopy as spa
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import binaural_renderer, hrtf_compact
+from asmr_gen_adk.tools.binaural_renderer import BLOCK_SIZE, _fft_length, _filter_length, _hrir_span
+from asmr_gen_adk.tools.hrtf_compact import compact_hrirs, load_compact_hrirs, minimum_phase
+
+
+def synthetic_hrirs(fs=48000, length=512, onset=20.0, itd_max=30.0):
+    """Minimum-phase decaying responses behind a fractional onset delay, with an azimuth-dependent ITD."""
+    dummy = spa.io.load_hrirs(fs, filename="dummy")
+    rng = np.random.default_rng(0)
+    n_dirs = len(dummy.azi)
+    taps = np.arange(length)
+    decay = np.exp(-taps / 12.0)
+    itd = itd_max * np.sin(dummy.azi) * np.sin(dummy.zen)  # samples, left - right
+    left, right = np.zeros((n_dirs, length)), np.zeros((n_dirs, length))
+    for out, delays in ((left, onset + np.maximum(itd, 0)), (right, onset + np.maximum(-itd, 0))):
+        body = minimum_phase(rng.normal(size=(n_dirs, 64)) * decay[:64])
+        spectrum = np.fft.rfft(body, 2 * length)
+        shift = np.exp(-2j * np.pi * np.fft.rfftfreq(2 * length)[None, :] * delays[:, None])
+        out[:] = np.fft.irfft(spectrum * shift, 2 * length)[:, :length]
+    return spa.sig.HRIRs(left, right, dummy.azi, dummy.zen, fs), itd
+
+
+# --- Test Case 1: compaction ---
+
+def test_compaction_shortens_hrirs_within_error_bound():
+    hrtf, itd = synthetic_hrirs()
+    compact = compact_hrirs(hrtf, max_spectral_error_db=1.0)
+    summary = compact.summary()
+    assert summary["compact_length"] <= hrtf.left.shape[1] // 4
+    assert summary["max_spectral_error_db"] <= 1.0
+    # The separated delays carry the ITD
+    # within 0.6 samples (12 µs, around the ITD just-noticeable difference)
+    np.testing.assert_allclose(compact.itd * hrtf.fs, itd, atol=0.6)
+
+
+def test_filters_reconstruct_the_original_magnitude_and_timing():
+    hrtf, _ = synthetic_hrirs()
+    compact = compact_hrirs(hrtf)
+    for idx in (0, 100, 300):
+        for original, filters, ear in ((hrtf.left, compact.left, 0), (hrtf.right, compact.right, 1)):
+            rebuilt = np.zeros(1024)
+            offset = compact.offsets[idx, ear]
+            rebuilt[offset:offset + filters.shape[1]] = filters[idx]
+            ref = np.abs(np.fft.rfft(original[idx], 1024))
+            got = np.abs(np.fft.rfft(rebuilt))
+            freqs = np.fft.rfftfreq(1024, 1 / hrtf.fs)
+            band = (freqs >= 100) & (freqs <= 16000)
+            assert np.sqrt(np.mean((20 * np.log10(got[band] / ref[band])) ** 2)) < 1.0
+            # Energy arrives at the same time
+            assert abs(np.argmax(np.abs(rebuilt)) - np.argmax(np.abs(original[idx]))) <= 1
+
+
+# --- Test Case 2: cache ---
+
+def test_compacted_set_is_cached_on_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(hrtf_compact, "_memory_cache", {})
+    hrtf = spa.io.load_hrirs(48000, filename="dummy")
+    first = load_compact_hrirs(hrtf, cache_dir=str(tmp_path))
+    assert len(list(tmp_path.glob("compact_*.npz"))) == 1
+
+    monkeypatch.setattr(hrtf_compact, "_memory_cache", {})
+    monkeypatch.setattr(hrtf_compact, "compact_hrirs", lambda *args, **kwargs: pytest.fail("cache miss"))
+    second = load_compact_hrirs(hrtf, cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(first.left, second.left)
+    np.testing.assert_array_equal(first.offsets, second.offsets)
+
+
+# --- Test Case 3: rendering with the fractional delay ---
+
+def test_compact_render_matches_original_render(tmp_path, monkeypatch):
+    hrtf, _ = synthetic_hrirs()
+    monkeypatch.setattr(hrtf_compact, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(binaural_renderer, "_load_hrtf", lambda fs, source=None: hrtf)
+    audio = np.random.default_rng(1).uniform(-0.5, 0.5, size=48000).astype(np.float32)
+    plan = [{"time": 0.0, "azimuth": -60, "elevation": 0, "distance": 0.2, "reverb_mix": 0.0},
+            {"time": 1.0, "azimuth": 60, "elevation": 0, "distance": 0.2, "reverb_mix": 0.0}]
+
+    monkeypatch.setattr(binaural_renderer, "COMPACT_ENABLED", False)
+    original, _ = binaural_renderer.make_asmr_audio(audio, 48000, plan, normalize=False)
+    monkeypatch.setattr(binaural_renderer, "COMPACT_ENABLED", True)
+    compact, _ = binaural_renderer.make_asmr_audio(audio, 48000, plan, normalize=False)
+
+    for ear in (0, 1):
+        level_db = 10 * np.log10(np.sum(compact[:, ear] ** 2) / np.sum(original[:, ear] ** 2))
+        assert abs(level_db) < 0.5
+        # Same interaural timing: the outputs line up without a lag
+        xcorr = np.correlate(compact[2000:10000, ear], original[2000:10000, ear], mode="full")
+        assert abs(np.argmax(xcorr) - (8000 - 1)) <= 1
+
+
+def test_delays_stay_out_of_the_fft_length():
+    hrtf, _ = synthetic_hrirs(length=256)
+    compact = compact_hrirs(hrtf)
+    n_original = _fft_length(BLOCK_SIZE, _filter_length(hrtf))
+    n_compact = _fft_length(BLOCK_SIZE, _filter_length(compact))
+    assert n_compact < n_original
+    # The per-ear delays are an output shift, not zeros in front of the filter
+    assert n_compact < _fft_length(BLOCK_SIZE, _hrir_span(compact))
+
+    # The renderer convolves at that length
+    audio = np.random.default_rng(2).uniform(-0.5, 0.5, size=4 * BLOCK_SIZE)
+    plan = [{"time": 0.0, "azimuth": 40, "elevation": 0, "distance": 0.5, "reverb_mix": 0.0}]
+    interpolators = binaural_renderer._create_interpolators(binaural_renderer.compile_plan(plan), 1.0)
+    binaural_renderer._render_binaural_dynamic_crossfade(
+        audio, compact, interpolators, fs=hrtf.fs,
+        input_spectra=binaural_renderer.BlockSpectra(audio, BLOCK_SIZE, n_compact))
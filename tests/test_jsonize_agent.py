@@ -39,3 +39,35 @@ async def test_build_instruction_jsonize():
         assert "scene_elements" in prompt
         assert "start_time" in prompt
         assert "end_time" in prompt
+
+def test_local_alignment_sets_state(tmp_path):
+    """
+    Tests that the before_agent_callback aligns locally and skips the LLM.
+    """
+    import numpy as np
+    import soundfile as sf
+    from types import SimpleNamespace
+    from asmr_gen_adk.agents.jsonize_agent import _local_alignment
+
+    sample_rate = 24000
+    audio = np.zeros(sample_rate * 4, dtype=np.float32)
+    audio[sample_rate // 2:sample_rate * 3 // 2] = 0.2
+    audio[sample_rate * 5 // 2:sample_rate * 7 // 2] = 0.2
+    wav_path = tmp_path / "tts.wav"
+    sf.write(wav_path, audio, sample_rate)
+
+    state = {"script_text": "ねえ。\nおやすみ。", "wav_path": f"`{wav_path}`"}
+    content = _local_alignment(SimpleNamespace(state=state))
+
+    assert content is not None
+    assert "timed_script_json" in state
+    assert content.parts[0].text == state["timed_script_json"]
+
+
+def test_local_alignment_falls_back_without_audio():
+    from types import SimpleNamespace
+    from asmr_gen_adk.agents.jsonize_agent import _local_alignment
+
+    state = {"script_text": "ねえ。", "wav_path": "/nonexistent/tts.wav"}
+    assert _local_alignment(SimpleNamespace(state=state)) is None
+    assert "timed_script_json" not in state
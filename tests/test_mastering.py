@@ -0,0 +1,91 @@
+import pytest
+import os
+
+import numpy as np
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import mastering
+from asmr_gen_adk.tools.mastering import master, preroll_samples, tilt_gains
+
+FS = 48000
+
+
+def _band_energy(audio, low, high):
+    spectrum = np.abs(np.fft.rfft(audio, axis=0)) ** 2
+    freqs = np.fft.rfftfreq(len(audio), 1 / FS)
+    return np.sum(spectrum[(freqs >= low) & (freqs < high)])
+
+
+# --- Test Case 1: reconstruction ---
+
+def test_unity_gains_reconstruct_input():
+    x = np.random.default_rng(0).normal(scale=0.1, size=(3 * FS + 123, 2))
+    y = master(x, FS, deesser=False, tilt=False, noise_floor=False)
+    assert y.shape == x.shape
+    np.testing.assert_allclose(y, x, atol=1e-12)
+
+
+def test_window_matches_full_pass(monkeypatch):
+    monkeypatch.setattr(mastering, "CHUNK_FRAMES", 7)
+    x = np.random.default_rng(1).normal(scale=0.1, size=(4 * FS, 2))
+    full = master(x, FS, noise_floor=True)
+    w0 = 2 * FS
+    s0 = w0 - preroll_samples(FS)
+    window = master(x[s0:], FS, offset=s0, noise_floor=True)
+    np.testing.assert_allclose(window[w0 - s0:], full[w0:], atol=1e-9)
+
+
+def test_n_fft_must_be_a_multiple_of_hop(monkeypatch):
+    monkeypatch.setattr(mastering, "HOP", 500)
+    with pytest.raises(ValueError):
+        master(np.zeros((FS, 2)), FS)
+
+
+# --- Test Case 2: spectral processing ---
+
+def test_tilt_is_zero_at_pivot_and_clipped():
+    gains_db = 20 * np.log10(tilt_gains(np.array([1000.0, 2000.0, 500.0, 20000.0]), 0.5, 1000.0, 1.0))
+    np.testing.assert_allclose(gains_db, [0.0, 0.5, -0.5, 1.0], atol=1e-12)
+
+
+def test_deesser_reduces_sibilant_band_only():
+    rng = np.random.default_rng(2)
+    t = np.arange(2 * FS) / FS
+    voice = 0.1 * np.sin(2 * np.pi * 300 * t)
+    # 6.5 kHz bursts as loud as the voice
+    hiss = np.convolve(rng.normal(size=len(t)), np.sinc(np.arange(-64, 65) / 20), mode="same")
+    hiss = hiss * np.cos(2 * np.pi * 6500 * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+    hiss *= 0.1 / np.std(hiss)
+    x = np.stack([voice + hiss, voice + hiss], axis=1)
+
+    y = master(x, FS, deesser=True, tilt=False, noise_floor=False)
+    reduction_db = 10 * np.log10(_band_energy(y, 5000, 8000) / _band_energy(x, 5000, 8000))
+    assert -mastering.DEESSER_MAX_REDUCTION_DB - 0.5 < reduction_db < -1.0
+    np.testing.assert_allclose(_band_energy(y, 200, 400), _band_energy(x, 200, 400), rtol=1e-3)
+
+    # Without sibilance nothing changes
+    plain = np.stack([voice, voice], axis=1)
+    np.testing.assert_allclose(master(plain, FS, deesser=True, tilt=False, noise_floor=False), plain, atol=1e-9)
+
+
+# --- Test Case 3: noise floor ---
+
+@pytest.mark.parametrize("color", ["white", "pink", "brown"])
+def test_noise_floor_level_and_decorrelation(monkeypatch, color):
+    monkeypatch.setattr(mastering, "NOISE_COLOR", color)
+    monkeypatch.setattr(mastering, "NOISE_FLOOR_DBFS", -50.0)
+    noise = master(np.zeros((5 * FS, 2)), FS, deesser=False, tilt=False, noise_floor=True)
+    level_db = 20 * np.log10(np.sqrt(np.mean(noise[FS:-FS] ** 2)))
+    assert level_db == pytest.approx(-50.0, abs=0.5)
+    assert abs(np.corrcoef(noise[:, 0], noise[:, 1])[0, 1]) < 0.05
+    if color == "brown":
+        assert _band_energy(noise, 50, 200) > 10 * _band_energy(noise, 5000, 20000)
+
+
+def test_unknown_noise_color(monkeypatch):
+    monkeypatch.setattr(mastering, "NOISE_COLOR", "purple")
+    with pytest.raises(ValueError):
+        master(np.zeros((FS, 2)), FS, noise_floor=True)
@@ -0,0 +1,99 @@
+import pytest
+import json
+import os
+
+import numpy as np
+import spaudiopy as spa
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import binaural_renderer
+from asmr_gen_adk.tools.plan_compiler import (
+    PLAN_DTYPE, SpatialPlanError, clamp_plan, compile_plan, parse_plan, simplify_plan, to_keyframes,
+)
+from asmr_gen_adk.tools.render_trace import RenderTrace
+
+
+def _kf(time, azimuth=0.0, elevation=0.0, distance=0.2, reverb_mix=0.0):
+    return {"time": time, "azimuth": azimuth, "elevation": elevation, "distance": distance, "reverb_mix": reverb_mix}
+
+
+# --- Test Case 1: parsing and validation ---
+
+def test_parse_sorts_and_deduplicates():
+    plan = parse_plan(json.dumps([_kf(1.0, 10), _kf(0.0, 0), _kf(1.0, 20)]))
+    assert plan.dtype == PLAN_DTYPE
+    assert plan["time"].tolist() == [0.0, 1.0]
+    assert plan["azimuth"].tolist() == [0.0, 20.0]
+
+
+@pytest.mark.parametrize("plan", [
+    "not json",
+    {"time": 0},
+    [{"time": 0.0, "azimuth": 0}],
+    [_kf(0.0, azimuth="left")],
+    [_kf(-1.0)],
+    [_kf(0.0, distance=float("nan"))],
+])
+def test_parse_rejects_invalid_plans(plan):
+    with pytest.raises(SpatialPlanError):
+        parse_plan(plan)
+
+
+def test_clamp_limits_ranges_and_unwraps_azimuth():
+    plan = clamp_plan(parse_plan([_kf(0.0, 170, elevation=120, distance=0.0, reverb_mix=2.0), _kf(1.0, -170)]))
+    assert plan["elevation"][0] == 90
+    assert plan["distance"][0] == pytest.approx(0.1)
+    assert plan["reverb_mix"][0] == 1.0
+    # Crossing the ±180° seam goes the short way round
+    assert plan["azimuth"][1] == pytest.approx(190)
+
+
+# --- Test Case 2: simplification ---
+
+def test_jitter_within_tolerance_becomes_static():
+    rng = np.random.default_rng(1)
+    keyframes = [_kf(t, 30 + rng.uniform(-0.9, 0.9), distance=0.2 + rng.uniform(-0.004, 0.004))
+                 for t in np.arange(0, 30, 0.25)]
+    plan = compile_plan(keyframes)
+    assert len(plan) == 2
+    assert np.ptp(plan["azimuth"]) == 0
+    assert np.ptp(plan["distance"]) == 0
+
+
+def test_linear_sweep_collapses_and_corners_are_kept():
+    sweep = [_kf(t, -60 + 12 * t) for t in np.arange(0, 10.5, 0.5)]  # -60 -> 60 in 10 s
+    plan = compile_plan(sweep + [_kf(12.0, 0)])
+    assert plan["time"].tolist() == [0.0, 10.0, 12.0]
+
+
+def test_simplified_plan_stays_within_tolerance():
+    rng = np.random.default_rng(2)
+    times = np.arange(0, 20, 0.1)
+    keyframes = [_kf(t, 45 * np.sin(t / 3) + rng.normal(0, 0.5), distance=0.2 + 0.05 * np.cos(t / 5)) for t in times]
+    original = parse_plan(keyframes)
+    plan = simplify_plan(original, {"azimuth": 2.0, "distance": 0.01})
+    assert len(plan) < len(original) / 3
+    for param, tolerance in (("azimuth", 2.0), ("distance", 0.01)):
+        approx = np.interp(original["time"], plan["time"], plan[param])
+        assert np.max(np.abs(approx - original[param])) <= tolerance + 1e-5
+
+
+def test_to_keyframes_round_trip():
+    keyframes = [_kf(0.0, 30), _kf(2.0, -30, distance=0.3, reverb_mix=0.02)]
+    assert to_keyframes(compile_plan(keyframes)) == keyframes
+
+
+# --- Test Case 3: fewer crossfades in the renderer ---
+
+def test_compiled_plan_removes_crossfades_from_jittery_plan(monkeypatch):
+    monkeypatch.setattr(binaural_renderer, "_load_hrtf", lambda fs, source=None: spa.io.load_hrirs(fs, filename="dummy"))
+    rng = np.random.default_rng(3)
+    keyframes = [_kf(t, 30 + rng.uniform(-0.5, 0.5)) for t in np.arange(0, 2, 0.1)]
+    audio = np.random.uniform(-0.5, 0.5, size=24000 * 2).astype(np.float32)
+
+    trace = RenderTrace()
+    binaural_renderer.make_asmr_audio(audio, 24000, keyframes, trace=trace)
+    assert trace.summary()["crossfades"] == 0
@@ -0,0 +1,112 @@
+import pytest
+import os
+import threading
+
+import numpy as np
+import scipy.signal
+import spaudiopy as spa
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import binaural_renderer
+from asmr_gen_adk.tools.hrtf_compact import compact_hrirs
+from asmr_gen_adk.tools.realtime import CallbackStats, RealtimeEngine, simulate_callback_loop
+
+
+@pytest.fixture
+def hrtf():
+    # コンパクト化したセット（耳ごとの整数遅延あり）で確かめる
+    return compact_hrirs(spa.io.load_hrirs(binaural_renderer.TARGET_FS, filename="dummy"))
+
+
+def _placed_hrir(hrtf, idx):
+    """耳ごとの遅延を含めた、方向 idx の2chのHRIR。"""
+    offsets = binaural_renderer._ear_offsets(hrtf, idx)
+    out = np.zeros((binaural_renderer._hrir_span(hrtf), 2))
+    for ear, irs in enumerate((hrtf.left, hrtf.right)):
+        shift = 0 if offsets is None else offsets[ear]
+        out[shift:shift + irs.shape[1], ear] = irs[idx]
+    return out
+
+
+def _run(engine, audio):
+    B = engine.buffer_size
+    return np.concatenate([engine.process(audio[i:i + B]) for i in range(0, len(audio), B)])
+
+
+# --- Test Case 1: partitioned convolution ---
+
+@pytest.mark.parametrize("buffer_size", [128, 256, 512])
+def test_static_output_matches_full_convolution(hrtf, buffer_size):
+    engine = RealtimeEngine(hrtf, buffer_size=buffer_size, reverb=False,
+                            params={"azimuth": 50.0, "elevation": 10.0, "distance": 0.5})
+    audio = np.random.default_rng(0).uniform(-0.3, 0.3, 20 * buffer_size)
+
+    output = _run(engine, audio)
+
+    idx = engine._nearest(50.0, 10.0)
+    expected = scipy.signal.fftconvolve(audio[:, None], _placed_hrir(hrtf, idx), axes=0)[:len(audio)] / 0.5
+    np.testing.assert_allclose(output, expected, atol=1e-10)
+
+
+def test_rejects_wrong_buffer_size_and_unknown_params(hrtf):
+    engine = RealtimeEngine(hrtf, buffer_size=128, reverb=False)
+    with pytest.raises(ValueError):
+        engine.process(np.zeros(100))
+    with pytest.raises(ValueError):
+        engine.set_params(pan=0.5)
+
+
+# --- Test Case 2: live control updates ---
+
+def test_update_from_another_thread_crossfades_into_new_direction(hrtf):
+    B = 256
+    engine = RealtimeEngine(hrtf, buffer_size=B, reverb=False)
+    audio = np.random.default_rng(1).uniform(-0.3, 0.3, 12 * B)
+    old_idx = engine._idx
+    first = _run(engine, audio[:6 * B])
+
+    controller = threading.Thread(target=engine.set_params, kwargs={"azimuth": -90.0, "distance": 2.0})
+    controller.start()
+    controller.join()
+    second = _run(engine, audio[6 * B:])
+
+    new_idx = engine._nearest(-90.0, 0.0)
+    assert new_idx != old_idx
+    old = scipy.signal.fftconvolve(audio[:, None], _placed_hrir(hrtf, old_idx), axes=0)[:len(audio)]
+    new = scipy.signal.fftconvolve(audio[:, None], _placed_hrir(hrtf, new_idx), axes=0)[:len(audio)] / 2.0
+    np.testing.assert_allclose(first, old[:6 * B], atol=1e-10)
+    # The switching buffer fades from the old to the new filter; later buffers use the new filter only
+    fade_in = np.linspace(0, 1, B)[:, None]
+    np.testing.assert_allclose(second[:B], old[6 * B:7 * B] * (1 - fade_in) + new[6 * B:7 * B] * fade_in, atol=1e-10)
+    np.testing.assert_allclose(second[B:], new[7 * B:], atol=1e-10)
+
+
+# --- Test Case 3: simulated callback loop and deadline reporting ---
+
+def test_simulated_loop_reports_against_deadline(hrtf):
+    engine = RealtimeEngine(hrtf, buffer_size=256)
+    audio = np.random.default_rng(2).uniform(-0.3, 0.3, 48000)
+    plan = [{"time": 0.0, "azimuth": -90, "elevation": 0, "distance": 0.3, "reverb_mix": 0.0},
+            {"time": 1.0, "azimuth": 90, "elevation": 0, "distance": 0.3, "reverb_mix": 0.05}]
+
+    output, report = simulate_callback_loop(engine, audio, plan)
+
+    assert output.shape == (48000, 2)
+    assert np.all(np.isfinite(output))
+    assert report["callbacks"] == -(-48000 // 256)
+    assert report["deadline_ms"] == pytest.approx(256 / 48000 * 1000)
+    assert 0 <= report["overruns"] <= report["callbacks"]
+    assert report["max_ms"] >= report["p99_ms"] >= 0
+    assert engine.params["azimuth"] > 80
+
+
+def test_overruns_are_counted():
+    stats = CallbackStats(deadline_sec=0.005)
+    for duration in (0.001, 0.004, 0.006, 0.010):
+        stats.add(duration)
+    report = stats.report()
+    assert report["overruns"] == 2
+    assert report["max_load"] == pytest.approx(2.0)
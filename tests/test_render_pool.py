@@ -0,0 +1,124 @@
+import pytest
+import asyncio
+import json
+import os
+import time
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk import telemetry
+from asmr_gen_adk.tools import render_pool
+from asmr_gen_adk.tools.render_pool import BinauralRendererAsync, RenderPool, _render_binaural, cancel_requested
+
+
+@pytest.fixture(autouse=True)
+def isolated_telemetry(tmp_path, monkeypatch):
+    """ワーカーを含め、テレメトリは tmp_path にだけ書き出す。"""
+    monkeypatch.setattr(telemetry, "JSONL_PATH", str(tmp_path / "telemetry" / "telemetry.jsonl"))
+    monkeypatch.setattr(telemetry, "PROMETHEUS_PATH", str(tmp_path / "telemetry" / "metrics.prom"))
+    monkeypatch.setattr(render_pool, "_default_pool", None)
+    yield tmp_path / "telemetry"
+    if render_pool._default_pool is not None:
+        render_pool._default_pool.shutdown()
+
+
+def busy_render(duration_sec):
+    """CPU-bound stand-in for make_asmr_audio."""
+    end = time.perf_counter() + duration_sec
+    x = 0
+    while time.perf_counter() < end:
+        x += 1
+    return os.getpid()
+
+
+def cancellable_render(marker_path):
+    """Spins until the pool signals cancellation, then leaves a marker file."""
+    end = time.perf_counter() + 10.0
+    while time.perf_counter() < end:
+        if cancel_requested():
+            with open(marker_path, "w") as f:
+                f.write("cancelled")
+            return "cancelled"
+    return "timeout"
+
+
+# --- Test Case 1: the event loop keeps running during a render ---
+
+@pytest.mark.asyncio
+async def test_other_coroutines_progress_during_render():
+    pool = RenderPool(workers=1, preload_hrtf=False)
+    ticks = 0
+
+    async def heartbeat():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        worker_pid = await pool.run(busy_render, 0.5)
+    finally:
+        beat.cancel()
+        pool.shutdown()
+
+    assert worker_pid != os.getpid()
+    # A blocking render would leave the heartbeat with ~0 ticks
+    assert ticks >= 20
+
+
+# --- Test Case 2: cancellation reaches a running render ---
+
+@pytest.mark.asyncio
+async def test_cancel_stops_running_render(tmp_path):
+    pool = RenderPool(workers=1, preload_hrtf=False)
+    marker = tmp_path / "cancelled.txt"
+    try:
+        task = asyncio.create_task(pool.run(cancellable_render, str(marker)))
+        await asyncio.sleep(0.5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # The worker observes the flag and stops well before its 10 s timeout
+        for _ in range(100):
+            if marker.exists():
+                break
+            await asyncio.sleep(0.05)
+        assert marker.exists()
+        # The slot is released and the pool keeps working
+        assert await pool.run(busy_render, 0.0) > 0
+    finally:
+        pool.shutdown()
+
+
+# --- Test Case 3: async tool wrapper ---
+
+@pytest.mark.asyncio
+async def test_binaural_renderer_async_reports_errors(tmp_path):
+    result = await BinauralRendererAsync(
+        mono_audio_path=str(tmp_path / "missing.wav"),
+        spatial_plan_json="[]",
+        output_path=str(tmp_path / "out.wav"),
+    )
+    assert "error" in result
+
+
+# --- Test Case 4: worker telemetry goes where the caller's does ---
+
+@pytest.mark.asyncio
+async def test_worker_telemetry_follows_caller_paths(tmp_path, isolated_telemetry):
+    pool = RenderPool(workers=1, preload_hrtf=False)
+    try:
+        # No run on the caller's side: the worker records nothing
+        await pool.run(_render_binaural, str(tmp_path / "missing.wav"), "[]", str(tmp_path / "out.wav"))
+        assert not isolated_telemetry.exists()
+        await pool.run(_render_binaural, str(tmp_path / "missing.wav"), "[]", str(tmp_path / "out.wav"), "run-x")
+    finally:
+        pool.shutdown()
+
+    with open(isolated_telemetry / "telemetry.jsonl", "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert records and all(r["run_id"] == "run-x" for r in records)
+    assert (isolated_telemetry / "metrics.prom").exists()
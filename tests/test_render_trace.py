@@ -0,0 +1,75 @@
+import pytest
+import json
+import os
+
+import numpy as np
+import soundfile as sf
+import spaudiopy as spa
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import binaural_renderer
+from asmr_gen_adk.tools.render_trace import TRACE_DTYPE, RenderTrace
+
+
+@pytest.fixture(autouse=True)
+def dummy_hrtf(monkeypatch):
+    monkeypatch.setattr(binaural_renderer, "_load_hrtf", lambda fs, source=None: spa.io.load_hrirs(fs, filename="dummy"))
+
+
+def _moving_plan():
+    return [
+        {"time": 0.0, "azimuth": -60, "elevation": 0, "distance": 0.5, "reverb_mix": 0.0},
+        {"time": 1.0, "azimuth": -60, "elevation": 0, "distance": 0.5, "reverb_mix": 0.0},
+        {"time": 2.0, "azimuth": 60, "elevation": 0, "distance": 0.5, "reverb_mix": 0.0},
+    ]
+
+
+# --- Test Case 1: per-block records ---
+
+def test_trace_records_every_block():
+    audio = np.random.uniform(-0.5, 0.5, size=24000 * 2).astype(np.float32)
+    trace = RenderTrace(capacity=8)  # forces the buffer to grow
+    binaural_renderer.make_asmr_audio(audio, 24000, _moving_plan(), trace=trace)
+
+    records = trace.records
+    assert records.dtype == TRACE_DTYPE
+    # 2 s at 48 kHz in 1024-sample blocks
+    assert len(records) == int(np.ceil(96000 / 1024))
+    assert np.all(np.diff(records["start"]) == 1024)
+    assert np.all(records["cpu_sec"] >= 0)
+
+    # Static during the first second, then the source sweeps from -60 to 60 degrees
+    first_second = records["start"] < 48000 - 1024
+    assert not records["crossfade"][first_second].any()
+    assert records["crossfade"][~first_second].any()
+    assert records["azimuth"][-1] == pytest.approx(60, abs=2)
+    assert np.all(records["ffts"][records["crossfade"]] == 4)
+    assert np.all(records["ffts"][~records["crossfade"]] == 3)
+
+    summary = trace.summary()
+    assert summary["blocks"] == len(records)
+    assert summary["crossfades"] == summary["hrir_lookups"] == int(records["crossfade"].sum())
+    assert summary["hrir_switches"] > 0
+    assert summary["cpu_sec_max"] >= summary["cpu_sec_p95"] >= 0
+
+
+# --- Test Case 2: save / load through render_file ---
+
+def test_render_file_saves_trace(tmp_path):
+    mono_path = tmp_path / "mono.wav"
+    sf.write(mono_path, np.random.uniform(-0.5, 0.5, size=24000).astype(np.float32), 24000)
+    trace_path = tmp_path / "trace.npy"
+
+    binaural_renderer.render_file(
+        str(mono_path), json.dumps(_moving_plan()), str(tmp_path / "out.wav"), trace_path=str(trace_path)
+    )
+
+    loaded = RenderTrace.load(str(trace_path))
+    assert loaded.summary()["blocks"] == int(np.ceil(48000 / 1024))
+
+
+def test_empty_trace_summary():
+    assert RenderTrace().summary() == {"blocks": 0}
@@ -0,0 +1,188 @@
+import pytest
+import asyncio
+import os
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import numpy as np
+from google.adk.models.google_llm import Gemini
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from asmr_gen_adk import checkpoint, telemetry
+from asmr_gen_adk.agents import asmr_agent
+from asmr_gen_adk.server import DONE, FAILED, JobServer, QueueFullError, create_app
+from asmr_gen_adk.tools import tts
+
+# Two cued lines, so the local alignment and the procedural spatial plan take their fast paths
+SCRIPT = "[右耳元で囁く]ねえ。\n[左耳のすぐ近くで]おやすみ。"
+SAMPLE_RATE = 24000
+
+
+def _speech_pcm():
+    """16-bit mono PCM with one noise burst per script line, as the TTS model would return."""
+    audio = np.zeros(4 * SAMPLE_RATE)
+    rng = np.random.default_rng(0)
+    for start, end in ((0.5, 1.5), (2.5, 3.5)):
+        audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] = rng.uniform(-0.3, 0.3, SAMPLE_RATE)
+    return (audio * 32767).astype("<i2").tobytes()
+
+
+class FakeTTSClient:
+    """Stands in for genai.Client in the TTS tool."""
+
+    def __init__(self, *args, **kwargs):
+        self.models = self
+
+    def generate_content(self, model, contents, config):
+        part = types.Part(inline_data=types.Blob(data=_speech_pcm(), mime_type="audio/pcm"))
+        return types.GenerateContentResponse(candidates=[types.Candidate(content=types.Content(parts=[part]))])
+
+
+@pytest.fixture
+def stub_models(tmp_path, monkeypatch):
+    """
+    Stubs the model clients only: the LLM agents get canned responses (with the script agent's latency),
+    the TTS tool gets canned audio, and the real root_agent runs everything else.
+    Returns the settings: the script model's latency, the instructions of the model calls made and
+    the most script model calls that were waiting at once.
+    """
+    settings = {"delay_sec": 0.05, "calls": [], "in_flight": 0, "max_in_flight": 0}
+
+    async def generate_content_async(self, llm_request, stream=False):
+        instruction = str(llm_request.config.system_instruction or "")
+        settings["calls"].append(instruction)
+        if "scenario writer" in instruction:
+            settings["in_flight"] += 1
+            settings["max_in_flight"] = max(settings["max_in_flight"], settings["in_flight"])
+            await asyncio.sleep(settings["delay_sec"])
+            settings["in_flight"] -= 1
+            yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=SCRIPT)]))
+        elif "TTS controller" in instruction:
+            results = [part.function_response for part in llm_request.contents[-1].parts if part.function_response]
+            if results:
+                text = results[0].response["wav_path"]
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+            else:
+                call = types.FunctionCall(name="synthesize_tts", args={"text": SCRIPT})
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(function_call=call)]))
+        else:
+            # Alignment and spatial planning take their local fast paths, rendering is deferred to the server
+            raise AssertionError(f"Unexpected model call: {instruction[:60]}")
+
+    monkeypatch.setattr(Gemini, "generate_content_async", generate_content_async)
+    monkeypatch.setattr(tts.genai, "Client", FakeTTSClient)
+    monkeypatch.setattr(tts, "AUDIO_DIR", str(tmp_path / "audio"))
+    os.makedirs(tmp_path / "audio")
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_DIR", str(tmp_path / "runs"))
+    monkeypatch.setattr(asmr_agent, "BINAURAL_OUTPUT_DIR", str(tmp_path / "binaural"))
+    monkeypatch.setattr(telemetry, "JSONL_PATH", str(tmp_path / "telemetry" / "telemetry.jsonl"))
+    monkeypatch.setattr(telemetry, "PROMETHEUS_PATH", str(tmp_path / "telemetry" / "metrics.prom"))
+    # Runs cancelled by server.stop() never finish; keep them out of the other tests
+    monkeypatch.setattr(telemetry, "_runs", {})
+    monkeypatch.setattr(telemetry, "_started", {})
+    return settings
+
+
+def _server(**kwargs):
+    from asmr_gen_adk.agent import root_agent
+    return JobServer(agent=root_agent, **kwargs)
+
+
+def stub_render(mono_audio_path, spatial_plan_json, output_path):
+    """Picklable render stand-in that runs in the worker process."""
+    if spatial_plan_json.startswith("```"):
+        return {"error": "spatial plan was not cleaned"}
+    return {"binaural_output_path": output_path, "pid": os.getpid()}
+
+
+def failing_render(mono_audio_path, spatial_plan_json, output_path):
+    return {"error": "render failed"}
+
+
+# --- Test Case 1: end-to-end job flow through root_agent ---
+
+@pytest.mark.asyncio
+async def test_jobs_run_concurrently_and_render(stub_models):
+    stub_models["delay_sec"] = 0.3
+    server = _server(render_fn=stub_render, max_sessions=8, render_workers=2)
+    await server.start()
+    try:
+        jobs = [server.submit(f"situation {i}") for i in range(8)]
+        done = await asyncio.gather(*(server.wait(job.job_id) for job in jobs))
+    finally:
+        await server.stop()
+
+    assert all(job.status == DONE for job in done), [job.error for job in done]
+    assert all(job.binaural_output_path.endswith(".wav") for job in done)
+    # Each job ran the script and TTS models (a tool call and its result); the other stages took their fast paths
+    assert sum("scenario writer" in call for call in stub_models["calls"]) == 8
+    assert len(stub_models["calls"]) == 8 * 3
+    # Every job synthesized and checkpointed its own take
+    assert len({job.run_id for job in done}) == 8
+    # Sessions overlap: the script model calls of all 8 jobs were waiting at the same time
+    assert stub_models["max_in_flight"] == 8
+    stats = server.stats()
+    assert stats["jobs"][DONE] == 8
+    assert stats["throughput_jobs_per_min"] > 0
+
+
+@pytest.mark.asyncio
+async def test_render_errors_mark_job_failed(stub_models):
+    server = _server(render_fn=failing_render, render_workers=1)
+    await server.start()
+    try:
+        job = await server.wait(server.submit("situation").job_id)
+    finally:
+        await server.stop()
+    assert job.status == FAILED
+    assert job.error == "render failed"
+
+
+# --- Test Case 2: backpressure and bounded history ---
+
+@pytest.mark.asyncio
+async def test_submit_rejects_when_pending_limit_reached(stub_models):
+    stub_models["delay_sec"] = 1.0
+    server = _server(render_fn=stub_render, max_pending_jobs=2)
+    await server.start()
+    try:
+        server.submit("a")
+        server.submit("b")
+        with pytest.raises(QueueFullError):
+            server.submit("c")
+    finally:
+        await server.stop()
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_are_bounded(stub_models):
+    server = _server(render_fn=stub_render, render_workers=1, max_finished_jobs=2)
+    await server.start()
+    try:
+        jobs = [await server.wait(server.submit(f"situation {i}").job_id) for i in range(4)]
+    finally:
+        await server.stop()
+    # Only the newest finished jobs are kept; the counters still cover every job
+    assert list(server.jobs) == [job.job_id for job in jobs[2:]]
+    stats = server.stats()
+    assert stats["jobs"][DONE] == 4 and stats["retained_jobs"] == 2
+    assert stats["mean_latency_sec"] > 0
+    assert server.pending_jobs() == 0
+
+
+# --- Test Case 3: HTTP interface ---
+
+def test_http_api(stub_models):
+    from fastapi.testclient import TestClient
+
+    server = _server(render_fn=stub_render, render_workers=1)
+    with TestClient(create_app(server)) as client:
+        response = client.post("/jobs", json={"situation": "床屋さんで"})
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+        assert client.get(f"/jobs/{job_id}").status_code == 200
+        assert client.get("/jobs/unknown").status_code == 404
+        assert "render_queue_depth" in client.get("/stats").json()
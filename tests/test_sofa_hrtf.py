@@ -0,0 +1,119 @@
+import pytest
+import os
+
+import numpy as np
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+h5py = pytest.importorskip("h5py")
+
+from asmr_gen_adk.tools import binaural_renderer
+from asmr_gen_adk.tools.hrtf_cache import HRTFCache, PreparedHRTF
+from asmr_gen_adk.tools.binaural_renderer import TARGET_FS, make_asmr_audio
+from asmr_gen_adk.tools.sofa_hrtf import SofaHRIRs, is_sofa
+from asmr_gen_adk.tools.synthetic_hrtf import spherical_head_hrirs
+
+
+def _write_sofa(path, hrtf, cartesian=False, delays=None):
+    """hrtf（spa.sig.HRIRs）を SimpleFreeFieldHRIR 形式で書き出す。"""
+    azi_deg = np.rad2deg(hrtf.azi)
+    ele_deg = 90 - np.rad2deg(hrtf.zen)
+    with h5py.File(path, "w") as f:
+        f.attrs["SOFAConventions"] = "SimpleFreeFieldHRIR"
+        f["Data.IR"] = np.stack([hrtf.left, hrtf.right], axis=1)
+        f["Data.SamplingRate"] = np.array([float(hrtf.fs)])
+        if delays is not None:
+            f["Data.Delay"] = np.asarray(delays, dtype=np.float64)
+        if cartesian:
+            positions = np.stack([np.cos(hrtf.azi) * np.sin(hrtf.zen), np.sin(hrtf.azi) * np.sin(hrtf.zen),
+                                  np.cos(hrtf.zen)], axis=1)
+            f["SourcePosition"] = positions
+            f["SourcePosition"].attrs["Type"] = b"cartesian"
+            f["SourcePosition"].attrs["Units"] = b"metre"
+        else:
+            f["SourcePosition"] = np.stack([azi_deg, ele_deg, np.ones_like(azi_deg)], axis=1)
+            f["SourcePosition"].attrs["Type"] = b"spherical"
+            f["SourcePosition"].attrs["Units"] = b"degree, degree, metre"
+    return str(path)
+
+
+@pytest.fixture
+def reference():
+    return spherical_head_hrirs(TARGET_FS, num_directions=128)
+
+
+# --- Test Case 1: lazy access ---
+
+@pytest.mark.parametrize("cartesian", [False, True])
+def test_opening_reads_directions_only(tmp_path, reference, cartesian):
+    path = _write_sofa(tmp_path / "set.sofa", reference, cartesian=cartesian)
+    assert is_sofa(path) and not is_sofa("synthetic")
+    hrtf = SofaHRIRs(path, TARGET_FS)
+    assert hrtf.cached_directions == 0
+    np.testing.assert_allclose(hrtf.azi, np.asarray(reference.azi), atol=1e-9)
+    np.testing.assert_allclose(hrtf.zen, np.asarray(reference.zen), atol=1e-9)
+    assert hrtf.left.shape == reference.left.shape
+
+    np.testing.assert_array_equal(hrtf.left[5], reference.left[5])
+    np.testing.assert_array_equal(hrtf.right[5, :], reference.right[5, :])
+    assert hrtf.cached_directions == 1
+    # Reading every direction (ambisonic decoder, real-time engine) still works
+    np.testing.assert_array_equal(np.asarray(hrtf.right), reference.right)
+    assert hrtf.cached_directions == len(reference.azi)
+    hrtf.close()
+
+
+def test_resampled_on_read(tmp_path, reference):
+    path = _write_sofa(tmp_path / "set.sofa", reference)
+    hrtf = SofaHRIRs(path, 24000)
+    expected = binaural_renderer._resample_hrtf(reference, 24000)
+    assert hrtf.fs == 24000 and hrtf.left.shape == expected.left.shape
+    np.testing.assert_allclose(hrtf.left[7], expected.left[7], atol=1e-9)
+    np.testing.assert_allclose(hrtf.right[7], expected.right[7], atol=1e-9)
+
+
+def test_delays_are_prepended(tmp_path, reference):
+    path = _write_sofa(tmp_path / "set.sofa", reference, delays=[[3, 10]])
+    hrtf = SofaHRIRs(path, TARGET_FS)
+    length = reference.left.shape[1]
+    assert hrtf.left.shape[1] == length + 10
+    np.testing.assert_array_equal(hrtf.left[0][3:3 + length], reference.left[0])
+    np.testing.assert_array_equal(hrtf.right[0][10:], reference.right[0])
+    assert not np.any(hrtf.right[0][:10])
+
+
+# --- Test Case 2: rendering ---
+
+def test_render_visits_few_directions(tmp_path, reference, monkeypatch):
+    monkeypatch.setattr(binaural_renderer, "COMPACT_ENABLED", False)
+    audio = np.random.default_rng(0).uniform(-0.3, 0.3, TARGET_FS)
+    plan = [{"time": 0.0, "azimuth": 45, "elevation": 0, "distance": 1.0, "reverb_mix": 0.0},
+            {"time": 1.0, "azimuth": 60, "elevation": 0, "distance": 1.0, "reverb_mix": 0.0}]
+    expected, _ = make_asmr_audio(audio, TARGET_FS, plan, normalize=False)
+
+    path = _write_sofa(tmp_path / "set.sofa", spherical_head_hrirs(TARGET_FS))
+    monkeypatch.setattr(binaural_renderer, "HRTF_SOURCE", path)
+    rendered, _ = make_asmr_audio(audio, TARGET_FS, plan, normalize=False)
+    np.testing.assert_allclose(rendered, expected, atol=1e-6)
+
+    hrtf = binaural_renderer._get_hrtf(TARGET_FS)
+    assert isinstance(hrtf, SofaHRIRs)
+    assert 0 < hrtf.cached_directions < len(hrtf.azi) // 10
+
+
+# --- Test Case 3: cache eviction ---
+
+def test_evicted_sets_are_closed(tmp_path, reference):
+    path = _write_sofa(tmp_path / "set.sofa", reference)
+    cache = HRTFCache(max_bytes=1)
+    prepared = cache.get("sofa", lambda: PreparedHRTF(SofaHRIRs(path, TARGET_FS)))
+    prepared.hrtf.pair(0)
+    cache.get("dummy", lambda: np.zeros(10))  # evicts the SOFA set
+
+    assert cache.stats()["evictions"] == 1
+    assert not prepared.hrtf._file
+    # A render still holding the evicted set can read further directions
+    np.testing.assert_array_equal(prepared.hrtf.left[9], reference.left[9])
+    prepared.hrtf.close()
@@ -48,3 +48,28 @@ async def test_build_instruction_spatial_plan():
         assert "keyframes" in prompt
         assert "azimuth" in prompt
         assert "elevation" in prompt
+
+def test_procedural_plan_sets_state():
+    """
+    Tests that the before_agent_callback builds the plan locally when cues exist.
+    """
+    from types import SimpleNamespace
+    from asmr_gen_adk.agents.spatial_plan_agent import _procedural_plan
+
+    timed_script = {"scene_elements": [{"script": "[右耳元で囁く]ねえ。", "start_time": 1.0, "end_time": 2.0}]}
+    state = {"timed_script_json": json.dumps(timed_script, ensure_ascii=False)}
+    content = _procedural_plan(SimpleNamespace(state=state))
+
+    assert content is not None
+    plan = json.loads(state["spatial_plan_json"])
+    assert plan[-1]["azimuth"] == 80.0
+
+
+def test_procedural_plan_falls_back_without_cues():
+    from types import SimpleNamespace
+    from asmr_gen_adk.agents.spatial_plan_agent import _procedural_plan
+
+    timed_script = {"scene_elements": [{"script": "こんばんは。", "start_time": 1.0, "end_time": 2.0}]}
+    state = {"timed_script_json": json.dumps(timed_script, ensure_ascii=False)}
+    assert _procedural_plan(SimpleNamespace(state=state)) is None
+    assert "spatial_plan_json" not in state
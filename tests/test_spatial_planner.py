@@ -0,0 +1,67 @@
+import pytest
+import json
+import os
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools.spatial_planner import (
+    MAX_AZIMUTH_SPEED,
+    build_spatial_plan,
+    build_spatial_plan_json,
+    parse_cue,
+)
+
+TIMED_SCRIPT = {
+    "scene_elements": [
+        {"speaker": "main character", "script": "こんばんは…", "start_time": 0.5, "end_time": 2.0},
+        {"speaker": "main character", "script": "[右耳元で囁く]ねえ…", "start_time": 4.0, "end_time": 6.0},
+        {"speaker": "main character", "script": "[左耳のすぐ近くで]おやすみ。", "start_time": 7.0, "end_time": 9.0},
+    ]
+}
+
+
+# --- Test Case 1: parse_cue ---
+
+def test_parse_cue():
+    assert parse_cue("右耳元で囁く") == {"azimuth": 80.0, "distance": 0.1, "reverb_mix": 0.0}
+    assert parse_cue("左耳のすぐ近くで") == {"azimuth": -80.0, "distance": 0.12, "reverb_mix": 0.0}
+    assert parse_cue("小さく笑う") == {}
+
+
+# --- Test Case 2: build_spatial_plan ---
+
+def test_build_spatial_plan_respects_constraints():
+    plan = build_spatial_plan(TIMED_SCRIPT)
+
+    assert plan[0]["time"] == 0.0
+    assert plan[-1]["azimuth"] == -80.0
+    for kf in plan:
+        assert set(kf) == {"time", "azimuth", "elevation", "distance", "reverb_mix"}
+        assert 0.1 <= kf["distance"] <= 0.3
+        assert 0.0 <= kf["reverb_mix"] <= 0.03
+        assert kf["elevation"] == 0.0
+    for a, b in zip(plan, plan[1:]):
+        assert b["time"] > a["time"]
+        speed = abs(b["azimuth"] - a["azimuth"]) / (b["time"] - a["time"])
+        assert speed <= MAX_AZIMUTH_SPEED + 1e-9
+
+
+def test_build_spatial_plan_holds_until_cue():
+    plan = build_spatial_plan(TIMED_SCRIPT)
+
+    # Position is held from 0 s until the first cue at 4.0 s
+    assert plan[1]["time"] == pytest.approx(4.0)
+    assert plan[1]["azimuth"] == plan[0]["azimuth"]
+
+
+def test_build_spatial_plan_without_cues_returns_none():
+    timed_script = {"scene_elements": [{"script": "(吐息)こんばんは。", "start_time": 0.0, "end_time": 1.0}]}
+    assert build_spatial_plan(timed_script) is None
+
+
+def test_build_spatial_plan_json_strips_markdown():
+    timed_script_json = f"```json\n{json.dumps(TIMED_SCRIPT, ensure_ascii=False)}\n```"
+    plan = json.loads(build_spatial_plan_json(timed_script_json))
+    assert plan == build_spatial_plan(TIMED_SCRIPT)
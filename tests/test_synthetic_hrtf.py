@@ -0,0 +1,92 @@
+import pytest
+import os
+
+import numpy as np
+import spaudiopy as spa
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk.tools import binaural_renderer, synthetic_hrtf
+from asmr_gen_adk.tools.binaural_renderer import TARGET_FS, make_asmr_audio
+from asmr_gen_adk.tools.synthetic_hrtf import fibonacci_grid, spherical_head_hrirs
+
+
+def _nearest(hrtf, azimuth_deg, elevation_deg=0.0):
+    directions = np.stack(spa.utils.sph2cart(hrtf.azi, hrtf.zen), axis=1)
+    target = np.array(spa.utils.sph2cart(np.deg2rad(azimuth_deg), np.deg2rad(90 - elevation_deg))).ravel()
+    return int(np.argmax(directions @ target))
+
+
+def _onset(ir):
+    return int(np.argmax(np.abs(ir) > 0.1 * np.max(np.abs(ir))))
+
+
+# --- Test Case 1: interface and determinism ---
+
+def test_same_interface_as_spaudiopy():
+    hrtf = spherical_head_hrirs(TARGET_FS)
+    assert isinstance(hrtf, spa.sig.HRIRs)
+    assert hrtf.left.shape == hrtf.right.shape == (synthetic_hrtf.NUM_DIRECTIONS, synthetic_hrtf.HRIR_LENGTH)
+    assert hrtf.fs == TARGET_FS
+    assert len(hrtf.azi) == len(hrtf.zen) == synthetic_hrtf.NUM_DIRECTIONS
+    # Generated once per argument set
+    assert spherical_head_hrirs(TARGET_FS) is hrtf
+
+
+def test_generation_is_deterministic():
+    a = spherical_head_hrirs.__wrapped__(44100, 64, 128)
+    b = spherical_head_hrirs.__wrapped__(44100, 64, 128)
+    np.testing.assert_array_equal(a.left, b.left)
+    np.testing.assert_array_equal(a.right, b.right)
+
+
+def test_fibonacci_grid_covers_the_sphere():
+    azi, zen = fibonacci_grid(512)
+    directions = np.stack(spa.utils.sph2cart(azi, zen), axis=1)
+    assert np.linalg.norm(directions.mean(axis=0)) < 0.01
+    assert zen.min() < 0.1 and zen.max() > np.pi - 0.1
+
+
+# --- Test Case 2: binaural cues ---
+
+@pytest.mark.parametrize("azimuth, near", [(90, "left"), (-90, "right")])
+def test_lateral_source_is_earlier_and_louder_at_near_ear(azimuth, near):
+    hrtf = spherical_head_hrirs(TARGET_FS)
+    idx = _nearest(hrtf, azimuth)
+    near_ir, far_ir = (hrtf.left[idx], hrtf.right[idx]) if near == "left" else (hrtf.right[idx], hrtf.left[idx])
+    itd_sec = (_onset(far_ir) - _onset(near_ir)) / TARGET_FS
+    # Woodworth: (a / c) (1 + pi / 2) ~ 0.66 ms for a side source
+    assert 0.5e-3 < itd_sec < 0.8e-3
+    assert 10 * np.log10(np.sum(near_ir ** 2) / np.sum(far_ir ** 2)) > 6
+
+
+def test_front_source_is_nearly_symmetric():
+    hrtf = spherical_head_hrirs(TARGET_FS)
+    idx = _nearest(hrtf, 0)
+    lag = np.argmax(np.correlate(hrtf.left[idx], hrtf.right[idx], mode="full")) - (hrtf.left.shape[1] - 1)
+    assert abs(lag) <= 2
+    assert abs(10 * np.log10(np.sum(hrtf.left[idx] ** 2) / np.sum(hrtf.right[idx] ** 2))) < 2
+
+
+# --- Test Case 3: selecting the source ---
+
+def test_renderer_uses_configured_source(monkeypatch):
+    monkeypatch.setattr(binaural_renderer, "HRTF_SOURCE", "synthetic")
+    assert binaural_renderer._load_hrtf(TARGET_FS) is spherical_head_hrirs(TARGET_FS)
+    # Other rates are resampled from TARGET_FS like the downloaded set
+    assert binaural_renderer._hrtf_at_rate(24000).fs == 24000
+
+    voice = np.random.default_rng(0).uniform(-0.3, 0.3, 24000)
+    plan = [{"time": 0.0, "azimuth": 60, "elevation": 0, "distance": 0.5, "reverb_mix": 0.02}]
+    output, output_sr = make_asmr_audio(voice, 24000, plan)
+    assert output_sr == TARGET_FS
+    # Source on the right is louder in the right channel
+    assert np.sum(output[:, 1] ** 2) > np.sum(output[:, 0] ** 2)
+
+
+def test_unknown_source(monkeypatch):
+    monkeypatch.setattr(binaural_renderer, "HRTF_SOURCE", "measured")
+    with pytest.raises(ValueError):
+        binaural_renderer._load_hrtf(TARGET_FS)
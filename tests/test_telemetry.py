@@ -0,0 +1,157 @@
+import pytest
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import spaudiopy as spa
+from google.adk.agents import BaseAgent
+from google.genai import types
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk import telemetry
+from asmr_gen_adk.telemetry import Telemetry, current_telemetry, telemetry_run
+from asmr_gen_adk.tools import binaural_renderer
+
+
+@pytest.fixture
+def sink(tmp_path, monkeypatch):
+    jsonl_path = tmp_path / "telemetry.jsonl"
+    prom_path = tmp_path / "metrics.prom"
+    monkeypatch.setattr(telemetry, "JSONL_PATH", str(jsonl_path))
+    monkeypatch.setattr(telemetry, "PROMETHEUS_PATH", str(prom_path))
+    return jsonl_path, prom_path
+
+
+def _read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+# --- Test Case 1: Telemetry recorder ---
+
+def test_span_and_flush_write_jsonl_and_prometheus(sink):
+    jsonl_path, prom_path = sink
+    t = Telemetry("run-1")
+    with t.span("render.reverb"):
+        pass
+    t.record("llm.script_agent", kind="llm", duration_sec=0.5, tokens_in=100, tokens_out=20)
+    t.flush(audio_sec=10.0)
+
+    records = _read_jsonl(jsonl_path)
+    assert [r["stage"] for r in records] == ["render.reverb", "llm.script_agent", "run"]
+    assert records[-1]["audio_sec"] == 10.0
+    assert records[-1]["real_time_factor"] > 0
+    assert records[-1]["peak_rss_bytes"] > 0
+
+    prom = prom_path.read_text()
+    assert 'asmr_stage_duration_seconds_count{stage="render.reverb"} 1' in prom
+    assert 'asmr_llm_tokens_total{stage="llm.script_agent",direction="in"} 100' in prom
+    assert "asmr_runs_total 1" in prom
+
+
+def test_prometheus_is_updated_incrementally(sink):
+    jsonl_path, prom_path = sink
+    first = Telemetry("run-1")
+    first.record("render", duration_sec=1.0)
+    first.flush()
+    # The history is not read again: only the new records are added to the saved aggregates
+    with open(jsonl_path, "a", encoding="utf-8") as f:
+        f.write("not json\n")
+    second = Telemetry("run-2")
+    second.record("render", duration_sec=2.0)
+    second.flush()
+    prom = prom_path.read_text()
+    assert 'asmr_stage_duration_seconds_sum{stage="render"} 3.000000' in prom
+    assert "asmr_runs_total 2" in prom
+    assert not [p for p in os.listdir(prom_path.parent) if ".tmp" in p]
+
+
+def test_prometheus_aggregates_rebuilt_from_jsonl(sink):
+    jsonl_path, prom_path = sink
+    Telemetry("run-1").flush()
+    os.remove(telemetry._state_path(str(prom_path)))
+    Telemetry("run-2").flush()
+    assert "asmr_runs_total 2" in prom_path.read_text()
+
+
+def test_disabled_telemetry_records_nothing():
+    t = current_telemetry()
+    assert not t.enabled
+    with t.span("render.convolution"):
+        pass
+    assert t.records == []
+
+
+# --- Test Case 2: ADK callbacks ---
+
+def test_agent_and_model_callbacks(sink):
+    jsonl_path, _ = sink
+    ctx = SimpleNamespace(invocation_id="inv-1", agent_name="jsonize_agent")
+    usage = SimpleNamespace(prompt_token_count=1200, candidates_token_count=300)
+
+    telemetry._run_started(ctx)
+    telemetry._stage_started(ctx)
+    telemetry._model_started(ctx, llm_request=None)
+    telemetry._model_finished(ctx, llm_response=SimpleNamespace(partial=False, usage_metadata=usage))
+    telemetry._stage_finished(ctx)
+    telemetry._run_finished(ctx)
+
+    records = {r["stage"]: r for r in _read_jsonl(jsonl_path)}
+    assert records["llm.jsonize_agent"]["tokens_in"] == 1200
+    assert records["llm.jsonize_agent"]["tokens_out"] == 300
+    assert records["agent.jsonize_agent"]["duration_sec"] >= 0
+    assert records["run"]["run_id"] == "inv-1"
+
+
+@pytest.mark.asyncio
+async def test_skipped_stage_is_closed(sink):
+    jsonl_path, _ = sink
+    restored = types.Content(role="model", parts=[types.Part(text="restored")])
+    agent = telemetry.with_telemetry(BaseAgent(name="tts_agent", before_agent_callback=lambda callback_context: restored))
+    ctx = SimpleNamespace(invocation_id="inv-2", agent_name="tts_agent")
+
+    telemetry._run_started(ctx)
+    # A checkpoint restore returns content: ADK skips the agent and its after callbacks
+    assert await agent.before_agent_callback(callback_context=ctx) is restored
+    assert not telemetry._started
+    telemetry._run_finished(ctx)
+    assert "agent.tts_agent" in [r["stage"] for r in _read_jsonl(jsonl_path)]
+
+
+def test_abandoned_runs_are_flushed(sink, monkeypatch):
+    jsonl_path, prom_path = sink
+    monkeypatch.setattr(telemetry, "STALE_RUN_SEC", 0.0)
+    failed = SimpleNamespace(invocation_id="inv-failed", agent_name="script_agent")
+    telemetry._run_started(failed)
+    telemetry._stage_started(failed)
+    telemetry._model_started(failed, llm_request=None)
+    # The run raised: no finishing callbacks. The next run flushes and drops it.
+    telemetry._run_started(SimpleNamespace(invocation_id="inv-next", agent_name="script_agent"))
+    assert list(telemetry._runs) == ["inv-next"] and not telemetry._started
+    run = [r for r in _read_jsonl(jsonl_path) if r["stage"] == "run"][0]
+    assert run["run_id"] == "inv-failed" and run["status"] == "abandoned"
+    assert "asmr_runs_abandoned_total 1" in prom_path.read_text()
+    telemetry._runs.clear()
+
+
+# --- Test Case 3: render steps ---
+
+def test_make_asmr_audio_records_every_step(sink, monkeypatch):
+    jsonl_path, _ = sink
+    monkeypatch.setattr(binaural_renderer, "_load_hrtf", lambda fs, source=None: spa.io.load_hrirs(fs, filename="dummy"))
+    audio = np.random.uniform(-0.5, 0.5, size=24000).astype(np.float32)
+    plan = [{"time": 0.0, "azimuth": 30, "elevation": 0, "distance": 0.2, "reverb_mix": 0.0}]
+
+    with telemetry_run("render-run"):
+        binaural_renderer.make_asmr_audio(audio, 24000, plan)
+
+    stages = [r["stage"] for r in _read_jsonl(jsonl_path)]
+    for step in ("preprocess", "hrtf_load", "convolution", "proximity", "reverb"):
+        assert f"render.{step}" in stages
+    render = next(r for r in _read_jsonl(jsonl_path) if r["stage"] == "render")
+    assert render["audio_sec"] == pytest.approx(1.0)
+    assert render["real_time_factor"] > 0
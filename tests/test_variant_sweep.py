@@ -0,0 +1,118 @@
+import pytest
+import json
+import os
+
+import numpy as np
+import soundfile as sf
+
+# `asmr_gen_adk`がPythonパスに含まれるように、プロジェクトルートからの相対パスを追加
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from asmr_gen_adk import telemetry
+from asmr_gen_adk.tools import binaural_renderer, variant_sweep
+from asmr_gen_adk.tools.binaural_renderer import make_asmr_audio
+from asmr_gen_adk.tools.variant_sweep import render_variants
+
+
+VARIANTS = [
+    {"name": "left", "spatial_plan": [{"time": 0.0, "azimuth": -60, "elevation": 0, "distance": 0.3, "reverb_mix": 0.0},
+                                      {"time": 1.0, "azimuth": 60, "elevation": 10, "distance": 0.3, "reverb_mix": 0.0}]},
+    {"name": "far_reverb", "reverb": {"room_size": 0.4, "wet_level": 0.1},
+     "spatial_plan": [{"time": 0.0, "azimuth": 20, "elevation": 0, "distance": 1.0, "reverb_mix": 0.05}]},
+    {"name": "dummy_hrtf", "hrtf_source": "dummy",
+     "spatial_plan": [{"time": 0.0, "azimuth": 90, "elevation": 0, "distance": 0.5, "reverb_mix": 0.02},
+                      {"time": 1.5, "azimuth": 180, "elevation": 0, "distance": 0.5, "reverb_mix": 0.02}]},
+]
+
+
+@pytest.fixture(autouse=True)
+def float_master(monkeypatch):
+    """書き出しはマスターWAV（float）だけにし、結果を量子化せずに比べる。"""
+    monkeypatch.setattr(variant_sweep, "export_audio", lambda audio, fs, path, extras=False: sf.write(path, audio, fs, subtype="FLOAT")
+                        or {"master": path})
+
+
+@pytest.fixture
+def voice():
+    rng = np.random.default_rng(0)
+    audio = rng.uniform(-0.3, 0.3, 2 * 24000)
+    audio[12000:24000] = 0.0  # a pause, skipped by the silence gate in every variant
+    return audio
+
+
+# --- Test Case 1: same result as rendering each variant on its own ---
+
+def test_matches_individual_renders(tmp_path, voice):
+    outputs = render_variants(voice, 24000, VARIANTS, str(tmp_path), workers=3)
+    assert list(outputs) == ["left", "far_reverb", "dummy_hrtf"]
+
+    for variant in VARIANTS:
+        expected, fs = make_asmr_audio(voice, 24000, variant["spatial_plan"], mode="direct",
+                                       hrtf_source=variant.get("hrtf_source"))
+        if "reverb" in variant:
+            # make_asmr_audio has no reverb override; check it against the default room instead
+            assert not np.allclose(sf.read(outputs[variant["name"]]["master"])[0], expected, atol=1e-3)
+            continue
+        rendered, rendered_fs = sf.read(outputs[variant["name"]]["master"])
+        assert rendered_fs == fs
+        np.testing.assert_array_equal(rendered, expected.astype(np.float32))
+
+
+def test_reverb_override(tmp_path, voice, monkeypatch):
+    boards = []
+    board = binaural_renderer._reverb_board
+    monkeypatch.setattr(binaural_renderer, "_reverb_board", lambda **kw: boards.append(kw) or board(**kw))
+    render_variants(voice, 24000, VARIANTS[:2], str(tmp_path), workers=1)
+    assert sorted(boards, key=len) == [{}, {"room_size": 0.4, "wet_level": 0.1}]
+
+
+# --- Test Case 2: preprocessing is shared ---
+
+def test_preprocessing_runs_once(tmp_path, voice, monkeypatch):
+    calls = {"preprocess": 0, "precomputed": []}
+    preprocess = binaural_renderer._preprocess_audio
+    init = binaural_renderer.BlockSpectra.__init__
+
+    def counted_preprocess(*args, **kwargs):
+        calls["preprocess"] += 1
+        return preprocess(*args, **kwargs)
+
+    def counted_init(self, audio, block_size, n_fft, precompute=False):
+        if precompute:
+            calls["precomputed"].append(n_fft)
+        init(self, audio, block_size, n_fft, precompute)
+
+    monkeypatch.setattr(variant_sweep, "_preprocess_audio", counted_preprocess)
+    monkeypatch.setattr(binaural_renderer.BlockSpectra, "__init__", counted_init)
+    variants = [dict(VARIANTS[0], name=f"v{i}") for i in range(5)] + [VARIANTS[2]]
+    render_variants(voice, 24000, variants, str(tmp_path))
+
+    assert calls["preprocess"] == 1
+    # One set of block spectra per FFT length (HRTF sets with the same HRIR length share one)
+    fs, block_size = binaural_renderer._render_rate(24000, None)
+    lengths = {binaural_renderer._fft_length(block_size, binaural_renderer._filter_length(
+        binaural_renderer._get_hrtf(fs, variant.get("hrtf_source")))) for variant in variants}
+    assert sorted(calls["precomputed"]) == sorted(lengths)
+
+
+def test_sweep_telemetry(tmp_path, voice, monkeypatch):
+    jsonl_path = tmp_path / "telemetry.jsonl"
+    monkeypatch.setattr(telemetry, "JSONL_PATH", str(jsonl_path))
+    monkeypatch.setattr(telemetry, "PROMETHEUS_PATH", str(tmp_path / "metrics.prom"))
+    with telemetry.telemetry_run("sweep-run"):
+        render_variants(voice, 24000, VARIANTS[:2], str(tmp_path / "out"), workers=2)
+
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    # Records made in the worker threads belong to the same run
+    assert sorted(r["variant"] for r in records if r["stage"] == "sweep.variant") == ["far_reverb", "left"]
+    summary = [r for r in records if r["kind"] == "sweep"][0]
+    assert summary["variants"] == 2 and summary["shared_spectra_bytes"] > 0
+
+
+def test_invalid_names(tmp_path, voice):
+    with pytest.raises(ValueError):
+        render_variants(voice, 24000, [VARIANTS[0], VARIANTS[0]], str(tmp_path))
+    with pytest.raises(ValueError):
+        render_variants(voice, 24000, [dict(VARIANTS[0], name="../escape")], str(tmp_path))